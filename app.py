@@ -1,14 +1,79 @@
-from flask import Flask, render_template_string, request
+from flask import Flask, Response, abort, redirect, request, send_file, stream_with_context
 import requests
 from urllib.parse import urlencode
 from datetime import datetime
 import time
 import random
+import threading
+import asyncio
+import sys
+import os
+import sqlite3
+import json
+import itertools
+import queue
+import hashlib
+import secrets
+import gzip
+import mimetypes
+import io
+import tempfile
+import shutil
+import atexit
+import re
+import brotli
+import httpx
+from PIL import Image, ImageOps
+import numpy as np
+import heapq
+import bisect
+from collections import OrderedDict, deque
+from functools import lru_cache
+from sys import intern
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: un seul process, pas d'élection
+    fcntl = None
 
 app = Flask(__name__)
 
 # ---------- CONFIG ----------
-DOMAIN = "www.vinted.fr"
+# Marchés Vinted surveillés en parallèle (VINTED_DOMAINS=www.vinted.fr,www.vinted.de,...);
+# le premier est le marché principal: il l'emporte sur les doublons entre marchés
+DOMAINS = [
+    d.strip() for d in os.environ.get("VINTED_DOMAINS", "www.vinted.fr").split(",") if d.strip()
+]
+DOMAIN = DOMAINS[0]
+# Base des requêtes vers Vinted (surchargeable pour tester contre un serveur local,
+# qui sert alors tous les marchés)
+UPSTREAM_OVERRIDE = os.environ.get("VINTED_UPSTREAM_BASE")
+UPSTREAM_BASE = UPSTREAM_OVERRIDE or f"https://{DOMAIN}"
+
+# Devise par défaut de chaque marché (quand l'API ne la précise pas)
+DOMAIN_CURRENCIES = {
+    **{
+        f"www.vinted.{tld}": "EUR"
+        for tld in (
+            "fr", "de", "it", "es", "nl", "be", "at", "lu", "pt", "fi", "gr", "ie",
+            "sk", "lt", "lv", "ee", "si", "hr",
+        )
+    },
+    "www.vinted.co.uk": "GBP",
+    "www.vinted.com": "USD",
+    "www.vinted.pl": "PLN",
+    "www.vinted.cz": "CZK",
+    "www.vinted.se": "SEK",
+    "www.vinted.dk": "DKK",
+    "www.vinted.hu": "HUF",
+    "www.vinted.ro": "RON",
+}
+CURRENCY_SYMBOLS = {
+    "EUR": "€", "GBP": "£", "USD": "$", "PLN": "zł", "CZK": "Kč",
+    "SEK": "kr", "DKK": "kr", "HUF": "Ft", "RON": "lei",
+}
 
 # Dictionnaire des marques
 AVAILABLE_BRANDS = {
@@ -50,14 +115,189 @@ AVAILABLE_BRANDS = {
 PER_PAGE = 50
 ORDER = "newest_first"
 
+# Filtres d'une sélection (?price_from=10&status_ids=6,1...): ceux que l'API
+# catalogue accepte lui sont envoyés, exclude_text (inconnu de Vinted) et les
+# bornes de prix (revérifiées) sont appliqués aux items bruts avant normalisation
+FILTER_PRICES = ("price_from", "price_to")
+FILTER_ID_LISTS = ("size_ids", "catalog_ids", "status_ids")
+FILTER_TEXTS = ("search_text", "exclude_text")
+FILTER_LOCAL_ONLY = ("exclude_text",)
+STATUS_CHOICES = {
+    "6": "Neuf avec étiquette",
+    "1": "Neuf sans étiquette",
+    "2": "Très bon état",
+    "3": "Bon état",
+    "4": "Satisfaisant",
+}
+
+# Mode de récupération: "single" (une requête pour toutes les marques) ou
+# "sharded" (une requête par groupe de SHARD_SIZE marques, en parallèle),
+# pour que les marques peu actives ne soient pas noyées par Supreme/Stussy
+FETCH_MODE = "sharded"
+SHARD_SIZE = 6
+# Nombre max d'items conservés après fusion des shards
+MERGED_LIMIT = 200
+# Polling incrémental: nombre max de pages parcourues pour rejoindre le
+# high-water mark lors d'une rafale de nouvelles annonces
+MAX_DELTA_PAGES = 5
+
+# Moteur HTTP asyncio: connexions keep-alive max et requêtes simultanées max par hôte
+HTTP_MAX_CONNECTIONS = 10
+HTTP_MAX_PER_HOST = 3
+HTTP_TIMEOUT = 18
+
+# Limiteur sortant par hôte: token bucket adaptatif (requêtes/s), backoff et disjoncteur
+RATE_INITIAL = 0.5
+RATE_MIN = 0.05
+RATE_MAX = 2.0
+RATE_INCREASE = 0.02
+RATE_DECREASE = 0.5
+BUCKET_CAPACITY = 3
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 120
+BREAKER_PROBE_TIMEOUT = 2 * HTTP_TIMEOUT
+# Pause au-delà de laquelle on n'attend plus dans acquire(): le disjoncteur s'ouvre
+THROTTLE_MAX_WAIT = 30
+# Attente max d'un rafraîchissement complet d'une sélection (shards, pages, retries)
+REFRESH_TIMEOUT = 90
+
+# Pool de sessions chaudes par hôte: taille, renouvellement des cookies et santé
+SESSION_POOL_SIZE = 2
+SESSION_MAX_AGE = 30 * 60
+SESSION_MIN_AGE = 60
+SESSION_REFRESH_MARGIN = 5 * 60
+SESSION_SLOW_LATENCY = 3.0
+SESSION_MIN_HEALTH = 0.4
+SESSION_MIN_SAMPLES = 3
+SESSION_MAINTENANCE_INTERVAL = 30
+SESSION_CLOSE_GRACE = 30
+
+# Normalisation: nombre d'items examinés pour résoudre le schéma d'une réponse
+NORMALIZE_SAMPLE = 8
+
+# Vendeurs: champs normalisés mis en cache par ID Vinted (secondes, entrées, octets)
+SELLER_CACHE_TTL = 6 * 3600
+SELLER_CACHE_MAX_ENTRIES = 20000
+SELLER_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Enrichissement optionnel (profil /api/v2/users/<id>) des vendeurs sans note
+SELLER_ENRICH = os.environ.get("VINTED_SELLER_ENRICH", "") == "1"
+SELLER_ENRICH_BATCH = 5
+SELLER_ENRICH_INTERVAL = 10
+SELLER_ENRICH_MAX_PENDING = 500
+
 # Cache: on évite d'interroger Vinted trop souvent (TTL en secondes)
 CACHE_TTL = 25 
-
-# Session globale (créée une seule fois)
-SESSION = None
-LAST_FETCH = None
-LAST_ITEMS = []
-LAST_BRANDS = None
+# Bornes du cache par sélection de marques (nombre d'entrées et mémoire)
+CACHE_MAX_ENTRIES = 32
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Poller: rafraîchit chaque sélection active en tâche de fond (secondes)
+POLL_INTERVAL = CACHE_TTL
+# Une sélection sans visiteur depuis ce délai n'est plus interrogée
+SELECTION_IDLE_TTL = 600
+# Sélections interrogées au plus (la moins récemment consultée sort en premier)
+WATCHED_MAX_SELECTIONS = CACHE_MAX_ENTRIES
+# Attente max du premier snapshot quand une nouvelle sélection est demandée
+FIRST_SNAPSHOT_WAIT = 2.0
+
+# Recherches enregistrées (/api/rules): une seule récupération de l'union des
+# marques de toutes les règles par cycle, puis un index de règles par item
+RULES_MAX_PER_WATCHER = 50
+RULE_MATCHES_MAX_AGE = 7 * 24 * 3600
+RULE_MATCHES_PURGE_INTERVAL = 600
+FEED_MAX_LIMIT = 200
+
+# Recherche plein texte (/search, /api/search) dans l'historique local, classée
+# par bm25 avec ces poids: titre, marque, taille, vendeur
+SEARCH_PER_PAGE = 24
+SEARCH_MAX_PER_PAGE = 100
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+# Analyse des prix (/analytics): fenêtre glissante par marque et par taille,
+# recalculée en entier (glissement de la fenêtre) au plus toutes les N secondes
+ANALYTICS_WINDOW = 7 * 24 * 3600
+ANALYTICS_REFRESH_INTERVAL = 300
+ANALYTICS_QUANTILES = (0.10, 0.25, 0.50, 0.75, 0.90)
+ANALYTICS_QUANTILE_NAMES = ("p10", "p25", "median", "p75", "p90")
+# Groupes avec moins d'annonces masqués sur la page (quantiles peu fiables)
+ANALYTICS_MIN_COUNT = 3
+
+# Compression à la volée des réponses HTML/JSON (les assets sont précompressés)
+COMPRESSIBLE_MIMETYPES = {"text/html", "application/json"}
+COMPRESS_MIN_SIZE = 1024
+
+# Proxy d'images (/img/<hash>): vignettes redimensionnées, cache disque LRU
+IMAGE_CACHE_DIR = os.environ.get("VINTED_IMAGE_CACHE", "image_cache")
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Parcours du répertoire par le poller élu (budget commun à tous les workers)
+IMAGE_SWEEP_INTERVAL = 300
+# Largeurs servies, par groupe: une seule requête CDN produit tout le groupe
+IMAGE_WIDTH_GROUPS = ((240, 480), (48, 96))
+IMAGE_QUALITY = 78
+# Revalidation conditionnelle (ETag/Last-Modified) auprès du CDN au-delà de ce délai
+IMAGE_REVALIDATE_AFTER = 24 * 3600
+IMAGE_MAX_AGE = 7 * 24 * 3600
+
+# Cache des cartes HTML rendues (clé: ID + hash du contenu de l'item)
+CARD_CACHE_MAX_ENTRIES = 2000
+CARD_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Flux SSE (/stream): intervalle des pings et file max par client
+STREAM_HEARTBEAT = 15
+STREAM_QUEUE_SIZE = 32
+# Connexions SSE simultanées par worker: chacune occupe un thread gthread pour
+# toute sa durée, on en garde la moitié (Procfile: --threads 8) pour les pages
+STREAM_MAX_CLIENTS = 4
+
+# Items déjà montrés à chaque navigateur (cookie anonyme): le badge "NOUVEAU"
+# est posé par le serveur, par tranches d'une heure gardées 24 h
+CLIENT_COOKIE = "vw_client"
+CLIENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+SEEN_BUCKET_SECONDS = 3600
+SEEN_BUCKETS = 24
+SEEN_MAX_CLIENTS = 5000
+SEEN_PURGE_INTERVAL = 600
+
+# Stockage local SQLite de toutes les annonces vues (historique au-delà des 50 dernières)
+DB_PATH = os.environ.get("VINTED_DB_PATH", "vinted_watch.db")
+# ":memory:" (process unique, benchmarks) donnerait une base vide par thread, chacun
+# ayant sa connexion: on utilise un fichier temporaire propre au process
+PRIVATE_DB = DB_PATH == ":memory:"
+if PRIVATE_DB:
+    DB_PATH = os.path.join(tempfile.mkdtemp(prefix="vinted-watch-"), "vinted_watch.db")
+    atexit.register(shutil.rmtree, os.path.dirname(DB_PATH), True)
+
+# Plusieurs workers gunicorn: un seul process (celui qui détient ce verrou) interroge
+# Vinted; les autres relisent ses snapshots dans la base SQLite partagée
+SHARED_SNAPSHOTS = not PRIVATE_DB and fcntl is not None
+POLLER_LOCK_PATH = os.environ.get("VINTED_POLLER_LOCK", DB_PATH + ".poller.lock")
+# Relecture des snapshots par les autres workers, et tentative d'élection (secondes)
+SHARED_SYNC_INTERVAL = 1.0
+# Rythme max auquel un worker signale qu'une sélection est toujours consultée
+WATCH_SHARE_INTERVAL = 5
+
+# Snapshots produits par le poller: clé de sélection ->
+# {"items", "fetched_at", "updated_at", "version"}
+SNAPSHOTS = {}
+# Version globale des snapshots (incrémentée à chaque changement de contenu);
+# l'epoch distingue les versions d'un redémarrage à l'autre (ETag)
+SNAPSHOT_EPOCH = format(int(time.time()), "x")
+SNAPSHOT_VERSIONS = itertools.count(1)
+# Sélections suivies: clé de sélection -> {"last_seen", "next_poll"}
+WATCHED = {}
+POLLER_LOCK = threading.Lock()
+POLLER_COND = threading.Condition(POLLER_LOCK)
+POLLER_WAKE = threading.Event()
+POLLER_THREAD = None
+# Fichier verrouillé tant que ce process est le poller élu
+LEADER_FILE = None
+
+# Clients SSE abonnés: clé de sélection -> ensemble de queue.Queue
+STREAMS = {}
+STREAMS_LOCK = threading.Lock()
+STREAM_SLOTS = threading.BoundedSemaphore(STREAM_MAX_CLIENTS)
 
 HTML_TEMPLATE = """
 <!doctype html>
@@ -65,719 +305,22 @@ HTML_TEMPLATE = """
 <head>
     <meta charset="utf-8">
     <title>Vinted Watch - Mode & Style</title>
-    <meta http-equiv="refresh" content="25" id="auto-refresh">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <link rel="preconnect" href="https://fonts.googleapis.com">
     <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        :root {
-            --primary-color: #09b6a2;
-            --primary-hover: #089286;
-            --text-primary: #1a1a1a;
-            --text-secondary: #6b7280;
-            --text-muted: #9ca3af;
-            --bg-primary: #ffffff;
-            --bg-secondary: #f8fafc;
-            --border-color: #e5e7eb;
-            --shadow-sm: 0 1px 2px 0 rgb(0 0 0 / 0.05);
-            --shadow-md: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1);
-            --shadow-lg: 0 10px 15px -3px rgb(0 0 0 / 0.1), 0 4px 6px -4px rgb(0 0 0 / 0.1);
-            --radius: 12px;
-            --radius-lg: 16px;
-        }
-
-        [data-theme="dark"] {
-            --text-primary: #f5f5f5;
-            --text-secondary: #d1d5db;
-            --text-muted: #9ca3af;
-            --bg-primary: #2a2a2a;
-            --bg-secondary: #3a3a3a;
-            --border-color: #525252;
-            --shadow-sm: 0 1px 2px 0 rgb(0 0 0 / 0.3);
-            --shadow-md: 0 4px 6px -1px rgb(0 0 0 / 0.3), 0 2px 4px -2px rgb(0 0 0 / 0.3);
-            --shadow-lg: 0 10px 15px -3px rgb(0 0 0 / 0.3), 0 4px 6px -4px rgb(0 0 0 / 0.3);
-        }
-
-        [data-theme="dark"] body {
-            background: linear-gradient(135deg, #1f1f1f 0%, #0d0d0d 100%);
-        }
-
-        body {
-            font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-            background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%);
-            min-height: 100vh;
-            line-height: 1.6;
-            color: var(--text-primary);
-            transition: background 0.3s ease;
-        }
-
-        .header {
-            background: var(--bg-primary);
-            border-bottom: 1px solid var(--border-color);
-            box-shadow: var(--shadow-sm);
-            position: sticky;
-            top: 0;
-            z-index: 100;
-            backdrop-filter: blur(10px);
-            transition: all 0.3s ease;
-        }
-
-        .header-content {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 1rem 2rem;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            flex-wrap: wrap;
-            gap: 1rem;
-        }
-
-        .logo {
-            display: flex;
-            align-items: center;
-            gap: 0.75rem;
-        }
-
-        .logo-icon {
-            width: 40px;
-            height: 40px;
-            background: linear-gradient(135deg, var(--primary-color), var(--primary-hover));
-            border-radius: 10px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-            font-weight: bold;
-            font-size: 1.2rem;
-        }
-
-        .logo-text {
-            font-size: 1.5rem;
-            font-weight: 700;
-            color: var(--text-primary);
-        }
-
-        .header-right {
-            display: flex;
-            align-items: center;
-            gap: 1rem;
-        }
-
-        .theme-toggle, .fullscreen-toggle {
-            background: var(--bg-secondary);
-            border: 1px solid var(--border-color);
-            border-radius: 50px;
-            padding: 0.5rem;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            width: 44px;
-            height: 44px;
-        }
-
-        .theme-toggle:hover, .fullscreen-toggle:hover {
-            transform: scale(1.05);
-            box-shadow: var(--shadow-sm);
-        }
-
-        .theme-toggle svg, .fullscreen-toggle svg {
-            width: 20px;
-            height: 20px;
-            color: var(--text-primary);
-            transition: all 0.3s ease;
-        }
-
-        .status-badge {
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-            padding: 0.5rem 1rem;
-            background: #dcfdf7;
-            color: #059669;
-            border-radius: 50px;
-            font-size: 0.875rem;
-            font-weight: 500;
-        }
-
-        [data-theme="dark"] .status-badge {
-            background: rgba(34, 197, 94, 0.2);
-            color: #22c55e;
-        }
-
-        .status-dot {
-            width: 6px;
-            height: 6px;
-            background: #10b981;
-            border-radius: 50%;
-            animation: pulse 2s infinite;
-        }
-
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.5; }
-        }
-
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 2rem;
-        }
-
-        /* Styles pour la popup de filtres */
-        .modal {
-            display: none;
-            position: fixed;
-            z-index: 1000;
-            left: 0;
-            top: 0;
-            width: 100%;
-            height: 100%;
-            background-color: rgba(0, 0, 0, 0.5);
-            backdrop-filter: blur(5px);
-        }
-
-        .modal.show {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-
-        .modal-content {
-            background: var(--bg-primary);
-            border-radius: var(--radius-lg);
-            padding: 2rem;
-            margin: 1rem;
-            max-width: 800px;
-            width: 90%;
-            max-height: 80vh;
-            overflow-y: auto;
-            box-shadow: var(--shadow-lg);
-            border: 1px solid var(--border-color);
-            position: relative;
-        }
-
-        .modal-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 1.5rem;
-            padding-bottom: 1rem;
-            border-bottom: 1px solid var(--border-color);
-        }
-
-        .modal-title {
-            font-size: 1.5rem;
-            font-weight: 600;
-            color: var(--text-primary);
-        }
-
-        .close-btn {
-            background: none;
-            border: none;
-            font-size: 1.5rem;
-            cursor: pointer;
-            color: var(--text-secondary);
-            padding: 0.5rem;
-            border-radius: 50%;
-            transition: all 0.2s ease;
-        }
-
-        .close-btn:hover {
-            background: var(--bg-secondary);
-            color: var(--text-primary);
-        }
-
-        .filter-actions {
-            display: flex;
-            gap: 0.5rem;
-            margin-bottom: 1.5rem;
-        }
-
-        .filter-btn {
-            padding: 0.5rem 1rem;
-            border: 1px solid var(--border-color);
-            background: var(--bg-secondary);
-            color: var(--text-secondary);
-            border-radius: var(--radius);
-            font-size: 0.875rem;
-            cursor: pointer;
-            transition: all 0.2s ease;
-        }
-
-        .filter-btn:hover {
-            background: var(--primary-color);
-            color: white;
-            border-color: var(--primary-color);
-        }
-
-        .brands-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(250px, 1fr));
-            gap: 0.75rem;
-            margin-bottom: 2rem;
-        }
-
-        .brand-checkbox {
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-            padding: 0.75rem;
-            background: var(--bg-secondary);
-            border-radius: var(--radius);
-            cursor: pointer;
-            transition: all 0.2s ease;
-            border: 1px solid transparent;
-        }
-
-        .brand-checkbox:hover {
-            background: #e0f7f4;
-            border-color: var(--primary-color);
-        }
-
-        [data-theme="dark"] .brand-checkbox:hover {
-            background: rgba(9, 182, 162, 0.1);
-        }
-
-        .brand-checkbox input[type="checkbox"] {
-            width: 18px;
-            height: 18px;
-            accent-color: var(--primary-color);
-        }
-
-        .brand-checkbox.checked {
-            background: #dcfdf7;
-            border-color: var(--primary-color);
-            color: var(--primary-color);
-            font-weight: 500;
-        }
-
-        [data-theme="dark"] .brand-checkbox.checked {
-            background: rgba(9, 182, 162, 0.2);
-            color: #22c55e;
-        }
-
-        .modal-actions {
-            display: flex;
-            justify-content: flex-end;
-            gap: 1rem;
-            padding-top: 1rem;
-            border-top: 1px solid var(--border-color);
-        }
-
-        .apply-filter {
-            padding: 0.75rem 2rem;
-            background: var(--primary-color);
-            color: white;
-            border: none;
-            border-radius: var(--radius);
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.2s ease;
-            font-size: 0.875rem;
-        }
-
-        .apply-filter:hover {
-            background: var(--primary-hover);
-            transform: translateY(-1px);
-        }
-
-        .apply-filter:disabled {
-            background: var(--text-muted);
-            cursor: not-allowed;
-            transform: none;
-        }
-
-        .cancel-btn {
-            padding: 0.75rem 2rem;
-            background: transparent;
-            color: var(--text-secondary);
-            border: 1px solid var(--border-color);
-            border-radius: var(--radius);
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.2s ease;
-            font-size: 0.875rem;
-        }
-
-        .cancel-btn:hover {
-            background: var(--bg-secondary);
-            color: var(--text-primary);
-        }
-
-        .stats-bar {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 1rem;
-            margin-bottom: 2rem;
-        }
-
-        .stat-card {
-            background: var(--bg-primary);
-            border-radius: var(--radius);
-            padding: 1.5rem;
-            text-align: center;
-            box-shadow: var(--shadow-sm);
-            border: 1px solid var(--border-color);
-            transition: all 0.3s ease;
-        }
-
-        .stat-card.clickable {
-            cursor: pointer;
-        }
-
-        .stat-card.clickable:hover {
-            transform: translateY(-2px);
-            box-shadow: var(--shadow-md);
-        }
-
-        .stat-value {
-            font-size: 2rem;
-            font-weight: 700;
-            color: var(--primary-color);
-            margin-bottom: 0.5rem;
-        }
-
-        .stat-label {
-            color: var(--text-secondary);
-            font-size: 0.875rem;
-            font-weight: 500;
-        }
-
-        .stat-action {
-            color: var(--text-muted);
-            font-size: 0.75rem;
-            margin-top: 0.5rem;
-        }
-
-        .items-grid {
-            display: grid;
-            gap: 1.5rem;
-        }
-
-        .item-card {
-            background: var(--bg-primary);
-            border-radius: var(--radius-lg);
-            overflow: hidden;
-            box-shadow: var(--shadow-md);
-            transition: all 0.3s ease;
-            border: 1px solid var(--border-color);
-            position: relative;
-        }
-
-        .item-card:hover {
-            transform: translateY(-4px);
-            box-shadow: var(--shadow-lg);
-        }
-
-        .item-content {
-            display: flex;
-            align-items: stretch;
-        }
-
-        .item-image-container {
-            flex: 0 0 210px;
-            position: relative;
-            overflow: hidden;
-        }
-
-        .item-image {
-            width: 100%;
-            height: 100%;
-            object-fit: cover;
-            transition: transform 0.3s ease;
-        }
-
-        .item-card:hover .item-image {
-            transform: scale(1.05);
-        }
-
-        .price-badge {
-            position: absolute;
-            top: 1rem;
-            right: 1rem;
-            background: rgba(0, 0, 0, 0.8);
-            color: white;
-            padding: 0.5rem 1rem;
-            border-radius: 50px;
-            font-weight: 700;
-            font-size: 1.1rem;
-            backdrop-filter: blur(10px);
-        }
-
-        [data-theme="dark"] .price-badge {
-            background: rgba(255, 255, 255, 0.9);
-            color: #1a1a1a;
-        }
-
-        .item-details {
-            flex: 1;
-            padding: 1.5rem;
-            display: flex;
-            flex-direction: column;
-            justify-content: space-between;
-        }
-
-        .item-header {
-            margin-bottom: 1rem;
-        }
-
-        .item-title {
-            font-size: 1.25rem;
-            font-weight: 600;
-            color: var(--text-primary);
-            margin-bottom: 0.5rem;
-            line-height: 1.4;
-            display: -webkit-box;
-            -webkit-line-clamp: 2;
-            -webkit-box-orient: vertical;
-            overflow: hidden;
-        }
-
-        .item-size {
-            display: inline-flex;
-            align-items: center;
-            gap: 0.5rem;
-            padding: 0.25rem 0.75rem;
-            background: #f3f4f6;
-            color: var(--text-secondary);
-            border-radius: 50px;
-            font-size: 0.875rem;
-            font-weight: 500;
-        }
-
-        [data-theme="dark"] .item-size {
-            background: var(--bg-secondary);
-        }
-
-        .seller-info {
-            display: flex;
-            align-items: center;
-            gap: 1rem;
-            margin: 1rem 0;
-            padding: 1rem;
-            background: #f8fafc;
-            border-radius: var(--radius);
-            transition: all 0.3s ease;
-        }
-
-        [data-theme="dark"] .seller-info {
-            background: var(--bg-secondary);
-        }
-
-        .seller-avatar {
-            width: 48px;
-            height: 48px;
-            border-radius: 50%;
-            object-fit: cover;
-            border: 2px solid var(--primary-color);
-        }
-
-        .seller-details {
-            flex: 1;
-        }
-
-        .seller-name {
-            font-weight: 600;
-            color: var(--text-primary);
-            margin-bottom: 0.25rem;
-        }
-
-        .seller-rating {
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-            font-size: 0.875rem;
-        }
-
-        .stars {
-            color: #fbbf24;
-            font-size: 1rem;
-        }
-
-        .rating-text {
-            color: var(--text-secondary);
-            font-weight: 500;
-        }
-
-        .item-actions {
-            display: flex;
-            gap: 0.75rem;
-        }
-
-        .btn {
-            padding: 0.75rem 1.5rem;
-            border-radius: var(--radius);
-            font-weight: 600;
-            text-decoration: none;
-            transition: all 0.2s ease;
-            border: none;
-            cursor: pointer;
-            display: inline-flex;
-            align-items: center;
-            gap: 0.5rem;
-            font-size: 0.875rem;
-        }
-
-        .btn-primary {
-            background: var(--primary-color);
-            color: white;
-        }
-
-        .btn-primary:hover {
-            background: var(--primary-hover);
-            transform: translateY(-1px);
-        }
-
-        .btn-secondary {
-            background: transparent;
-            color: var(--text-secondary);
-            border: 1px solid var(--border-color);
-        }
-
-        .btn-secondary:hover {
-            background: var(--bg-secondary);
-            color: var(--text-primary);
-        }
-
-        .footer-note {
-            text-align: center;
-            color: var(--text-muted);
-            font-size: 0.875rem;
-            margin-top: 3rem;
-            padding: 2rem;
-            background: var(--bg-primary);
-            border-radius: var(--radius-lg);
-            border: 1px solid var(--border-color);
-            transition: all 0.3s ease;
-        }
-
-        .loading-screen {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            min-height: 50vh;
-            gap: 2rem;
-        }
-
-        .spinner {
-            width: 50px;
-            height: 50px;
-            border: 4px solid var(--border-color);
-            border-top: 4px solid var(--primary-color);
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-        }
-
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-
-        @media (max-width: 768px) {
-            .container {
-                padding: 1rem;
-            }
-
-            .header-content {
-                padding: 1rem;
-            }
-
-            .item-content {
-                flex-direction: column;
-            }
-
-            .item-image-container {
-                flex: none;
-                height: 250px;
-            }
-
-            .item-image {
-                height: 100%;
-            }
-
-            .stats-bar {
-                grid-template-columns: repeat(2, 1fr);
-            }
-
-            .item-actions {
-                flex-direction: column;
-            }
-
-            .brands-grid {
-                grid-template-columns: 1fr;
-            }
-
-            .modal-content {
-                margin: 0.5rem;
-                width: calc(100% - 1rem);
-                max-height: 90vh;
-            }
-        }
-
-        .loading-shimmer {
-            background: linear-gradient(90deg, #f0f0f0 25%, #e0e0e0 50%, #f0f0f0 75%);
-            background-size: 200% 100%;
-            animation: shimmer 1.5s infinite;
-        }
-
-        @keyframes shimmer {
-            0% { background-position: -200% 0; }
-            100% { background-position: 200% 0; }
-        }
-
-        .star.empty {
-            color: #d1d5db;
-        }
-
-        .star.filled {
-            color: #fbbf24;
-        }
-
-        .star.half {
-            position: relative;
-            display: inline-block;
-            color: #d1d5db;
-        }
-
-        .star.half::before {
-            content: '★';
-            position: absolute;
-            left: 0;
-            width: 50%;
-            overflow: hidden;
-            color: #fbbf24;
-        }
-
-        [data-theme="dark"] .star.empty {
-            color: #6b7280;
-        }
-
-        [data-theme="dark"] .star.filled {
-            color: #fbbf24;
-        }
-
-        [data-theme="dark"] .star.half {
-            color: #6b7280;
-        }
-
-        [data-theme="dark"] .star.half::before {
-            color: #fbbf24;
-        }
-
-    </style>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+    <script>
+        // Prévenir le flash blanc en appliquant le thème AVANT le chargement
+        (function() {
+            const savedTheme = localStorage.getItem('theme');
+            const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+            const theme = savedTheme || (prefersDark ? 'dark' : 'light');
+            document.documentElement.setAttribute('data-theme', theme);
+        })();
+    </script>
 </head>
-<body>
+<body{% if not search %} data-refresh="{{ cache_ttl }}"{% endif %}>
     <header class="header">
         <div class="header-content">
             <div class="logo">
@@ -801,24 +344,64 @@ HTML_TEMPLATE = """
                         <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 9l6 6m0-6l-6 6M21 3l-6 6m0 0V4m0 5h5M3 21l6-6m0 0h-5m5 0v5"/>
                     </svg>
                 </button>
+                <form class="search-form" action="/search" method="GET" role="search">
+                    <input type="search" name="q" value="{{ search.query if search else '' }}"
+                           placeholder="Rechercher une annonce vue…" aria-label="Rechercher dans les annonces vues">
+                </form>
+                {% if not search %}
                 <div class="status-badge">
                     <div class="status-dot"></div>
-                    Mis à jour à {{ refresh_time }}
+                    Mis à jour à <span id="refresh-time">{{ refresh_time }}</span>
                 </div>
+                {% endif %}
             </div>
         </div>
     </header>
 
     <div class="container">
-        {% if items %}
+        {% if search %}
+        <div class="search-summary">
+            <p>
+                {% if search.query %}
+                Page {{ search.page }} · {{ cards|length }} résultat(s) pour « {{ search.query }} »
+                {% else %}
+                Saisissez des mots du titre, de la marque, de la taille ou du vendeur.
+                {% endif %}
+            </p>
+            <div class="search-periods">
+                {% for hours, label in ((24, "24 h"), (168, "7 jours"), (None, "Tout")) %}
+                <a href="{{ url_for('search_page', q=search.query, hours=hours) }}"
+                   class="filter-btn{% if search.hours == hours %} active{% endif %}">{{ label }}</a>
+                {% endfor %}
+                <a href="{{ url_for('index') }}" class="filter-btn">Retour au flux</a>
+            </div>
+        </div>
+        {% if cards %}
+        <div class="items-grid">
+            {% for card in cards %}
+            {{ card|safe }}
+            {% endfor %}
+        </div>
+        {% elif search.query %}
+        <p class="search-empty">Aucune annonce ne correspond.</p>
+        {% endif %}
+        <div class="pagination">
+            {% if search.page > 1 %}
+            <a href="{{ url_for('search_page', q=search.query, hours=search.hours, page=search.page - 1) }}" class="filter-btn">← Précédents</a>
+            {% endif %}
+            {% if search.has_more %}
+            <a href="{{ url_for('search_page', q=search.query, hours=search.hours, page=search.page + 1) }}" class="filter-btn">Suivants →</a>
+            {% endif %}
+        </div>
+        {% else %}
         <div class="stats-bar">
             <div class="stat-card">
-                <div class="stat-value">{{ items|length }}</div>
+                <div class="stat-value" id="items-count">{{ items|length }}</div>
                 <div class="stat-label">Articles affichés</div>
             </div>
             <div class="stat-card clickable" onclick="openBrandModal()">
                 <div class="stat-value">{{ selected_brands|length }}</div>
-                <div class="stat-label">Marques sélectionnées</div>
+                <div class="stat-label">Marques sélectionnées{% if filters %} · {{ filters|length }} filtre{{ 's' if filters|length > 1 }}{% endif %}</div>
                 <div class="stat-action">Cliquer pour modifier</div>
             </div>
             <div class="stat-card">
@@ -853,6 +436,51 @@ HTML_TEMPLATE = """
                         </label>
                         {% endfor %}
                     </div>
+
+                    <h4 class="filter-section-title">Prix, état et mots-clés</h4>
+                    <div class="filter-fields">
+                        <label class="filter-field">
+                            <span>Prix min</span>
+                            <input type="number" name="price_from" min="0" step="any"
+                                   value="{% if 'price_from' in filters %}{{ '%g'|format(filters.price_from) }}{% endif %}">
+                        </label>
+                        <label class="filter-field">
+                            <span>Prix max</span>
+                            <input type="number" name="price_to" min="0" step="any"
+                                   value="{% if 'price_to' in filters %}{{ '%g'|format(filters.price_to) }}{% endif %}">
+                        </label>
+                        <label class="filter-field">
+                            <span>Mots-clés</span>
+                            <input type="text" name="search_text" value="{{ filters.get('search_text', '') }}">
+                        </label>
+                        <label class="filter-field">
+                            <span>Exclure (titre)</span>
+                            <input type="text" name="exclude_text" value="{{ filters.get('exclude_text', '') }}">
+                        </label>
+                        <label class="filter-field">
+                            <span>IDs de tailles</span>
+                            <input type="text" name="size_ids" inputmode="numeric" placeholder="206,207"
+                                   value="{{ filters.get('size_ids', ())|join(',') }}">
+                        </label>
+                        <label class="filter-field">
+                            <span>IDs de catégories</span>
+                            <input type="text" name="catalog_ids" inputmode="numeric" placeholder="1206"
+                                   value="{{ filters.get('catalog_ids', ())|join(',') }}">
+                        </label>
+                    </div>
+                    <div class="brands-grid">
+                        {% for status_id, status_name in status_choices.items() %}
+                        {% set checked = status_id in filters.get('status_ids', ()) %}
+                        <label class="brand-checkbox {% if checked %}checked{% endif %}">
+                            <input type="checkbox"
+                                   name="status_ids"
+                                   value="{{ status_id }}"
+                                   {% if checked %}checked{% endif %}
+                                   onchange="updateBrandSelection(this)">
+                            <span>{{ status_name }}</span>
+                        </label>
+                        {% endfor %}
+                    </div>
                     
                     <div class="modal-actions">
                         <button type="button" class="cancel-btn" onclick="closeBrandModal()">Annuler</button>
@@ -862,413 +490,1094 @@ HTML_TEMPLATE = """
             </div>
         </div>
 
-        <div class="items-grid">
-            {% for it in items %}
-            <article class="item-card">
-                <div class="item-content">
-                    <div class="item-image-container">
-                        <img src="{{ it.photo }}" 
-                             alt="Photo de {{ it.title }}" 
-                             class="item-image"
-                             onerror="">
-                    </div>
-                    <div class="item-details">
-                        <div class="item-header">
-                            <h2 class="item-title">{{ it.title }}</h2>
-                            {% if it.size %}
-                            <div class="item-size">
-                                <span>👕</span> {{ it.size }}
-                                <div class="price-badge">{{ it.price }}</div>
-                            </div>
-                            {% endif %}
-                        </div>
-
-                        <div class="seller-info">
-                            <img src="{{ it.seller_avatar }}" 
-                                 alt="Avatar de {{ it.seller_name }}" 
-                                 class="seller-avatar"
-                                 onerror="">
-                            <div class="seller-details">
-                                <div class="seller-name">{{ it.seller_name }}</div>
-                                <div class="seller-rating">
-                                    <span class="stars">{{ it.seller_stars|safe }}</span>
-                                    <span class="rating-text">{{ it.seller_rating_display }}</span>
-                                </div>
-                            </div>
-                        </div>
-
-                        <div class="item-actions">
-                            <a href="{{ it.url }}" target="_blank" class="btn btn-primary">
-                                Voir l'article
-                            </a>
-                            <button class="btn btn-secondary" onclick="navigator.share ? navigator.share({title: '{{ it.title }}', url: '{{ it.url }}'}) : navigator.clipboard.writeText('{{ it.url }}')">
-                                Partager
-                            </button>
-                        </div>
-                    </div>
-                </div>
-            </article>
+        {% if ready %}
+        <div class="items-grid" data-limit="{{ feed_limit }}"{% if first_visit %} data-first-visit="1"{% endif %}>
+            {% for card in cards %}
+            {{ card|safe }}
             {% endfor %}
         </div>
+        {% if not items %}
+        <p class="search-empty feed-empty">Aucune annonce ne correspond à ces filtres pour le moment.</p>
+        {% endif %}
+        {% else %}
+        <div class="loading-screen">
+            <div class="spinner"></div>
+            <p>Chargement des annonces…</p>
+        </div>
+        {% endif %}
+        {% endif %}
 
         <div class="footer-note">
             <p><strong>🤖 Vinted Watch</strong> - Surveillance automatique des nouvelles annonces</p>
             <p>Cache mis à jour toutes les {{ cache_ttl }} secondes pour éviter les limitations</p>
+            <p><a href="{{ url_for('analytics_page') }}">Analyse des prix par marque et par taille</a></p>
+            {% if not search %}
             <p>{{ selected_brands|length }} marque(s) sélectionnée(s) sur {{ available_brands|length }} disponibles</p>
+            {% endif %}
         </div>
     </div>
 
-    <script>
-        // Prévenir le flash blanc en appliquant le thème AVANT le chargement
-        (function() {
-            const savedTheme = localStorage.getItem('theme');
-            const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
-            const theme = savedTheme || (prefersDark ? 'dark' : 'light');
-            document.documentElement.setAttribute('data-theme', theme);
-        })();
+    <script src="{{ asset_url('app.js') }}"></script>
+</body>
+</html>
+"""
 
-        // Gestion du thème
-        function toggleTheme() {
-            const html = document.documentElement;
-            const sunIcon = document.querySelector('.sun-icon');
-            const moonIcon = document.querySelector('.moon-icon');
-            
-            const currentTheme = html.getAttribute('data-theme');
-            const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-            
-            html.setAttribute('data-theme', newTheme);
-            localStorage.setItem('theme', newTheme);
-            
-            if (newTheme === 'dark') {
-                sunIcon.style.display = 'none';
-                moonIcon.style.display = 'block';
-            } else {
-                sunIcon.style.display = 'block';
-                moonIcon.style.display = 'none';
-            }
-        }
 
-        // Gestion du plein écran
-        function toggleFullscreen() {
-            const expandIcon = document.querySelector('.expand-icon');
-            const compressIcon = document.querySelector('.compress-icon');
-            
-            if (!document.fullscreenElement) {
-                // Entrer en plein écran
-                document.documentElement.requestFullscreen().then(() => {
-                    expandIcon.style.display = 'none';
-                    compressIcon.style.display = 'block';
-                    // Sauvegarder l'état plein écran
-                    localStorage.setItem('fullscreenMode', 'true');
-                }).catch(err => {
-                    console.log('Erreur plein écran:', err);
-                });
-            } else {
-                // Quitter le plein écran
-                document.exitFullscreen().then(() => {
-                    expandIcon.style.display = 'block';
-                    compressIcon.style.display = 'none';
-                    // Supprimer l'état plein écran
-                    localStorage.removeItem('fullscreenMode');
-                }).catch(err => {
-                    console.log('Erreur sortie plein écran:', err);
-                });
-            }
-        }
+# ---------- METRICS ----------
+class Counter:
+    """Compteur Prometheus (avec labels optionnels), incrémenté sous verrou."""
+
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+
+class Histogram:
+    """Histogramme Prometheus à seaux fixes (bornes supérieures, en secondes)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, doc, buckets, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        # labels -> [comptes par seau (+Inf en dernier), somme]
+        self._values = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        out = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((self.name + "_bucket", labels + (format_bound(bound),), cumulative))
+            out.append((self.name + "_sum", labels, total))
+            out.append((self.name + "_count", labels, cumulative))
+        return out
+
+
+class Sampled:
+    """Valeurs lues à la collecte (compteurs déjà tenus ailleurs): rien sur le chemin chaud."""
+
+    def __init__(self, name, doc, labelnames, collect, kind="counter"):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.collect = collect
+        self.kind = kind
+        METRICS.append(self)
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.collect()]
+
+
+def format_bound(bound) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def format_labels(names, values) -> str:
+    if not values:
+        return ""
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_metrics() -> str:
+    """Toutes les métriques au format texte Prometheus (version 0.0.4)."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            names = metric.labelnames + ("le",) if name.endswith("_bucket") else metric.labelnames
+            lines.append(f"{name}{format_labels(names, labels)} {float(value)!r}")
+    return "\n".join(lines) + "\n"
+
+
+METRICS = []
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+CPU_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+UPSTREAM_SECONDS = Histogram(
+    "vinted_upstream_request_seconds", "Durée des requêtes vers Vinted.", LATENCY_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter(
+    "vinted_upstream_responses_total",
+    "Réponses de Vinted par code HTTP (error: échec réseau).",
+    ("status",),
+)
+UPSTREAM_INVALID = Counter(
+    "vinted_upstream_invalid_json_total", "Réponses illisibles (page HTML, captcha...)."
+)
+UPSTREAM_RETRIES = Counter("vinted_upstream_retries_total", "Nouvelles tentatives après un échec.")
+UPSTREAM_REJECTED = Counter(
+    "vinted_upstream_rejected_total", "Requêtes refusées par le disjoncteur ouvert."
+)
+UPSTREAM_BACKOFF = Counter(
+    "vinted_upstream_backoff_seconds_total", "Pauses imposées (Retry-After, backoff), en secondes."
+)
+NORMALIZE_SECONDS = Histogram(
+    "vinted_normalize_seconds", "Durée de normalisation d'un lot d'items.", CPU_BUCKETS,
+)
+RENDER_SECONDS = Histogram(
+    "vinted_render_seconds", "Durée de rendu des templates.", CPU_BUCKETS, ("template",),
+)
+ANALYTICS_SECONDS = Histogram(
+    "vinted_analytics_seconds", "Durée de recalcul des statistiques de prix.", CPU_BUCKETS, ("scope",),
+)
+ITEMS_FETCHED = Counter("vinted_items_fetched_total", "Items reçus de Vinted.")
+ITEMS_NEW = Counter("vinted_items_new_total", "Items jamais vus, normalisés et publiés.")
+RULE_CANDIDATES = Counter(
+    "vinted_rule_candidates_total", "Règles candidates retenues par les index (avant mots-clés)."
+)
+RULE_MATCHES = Counter("vinted_rule_matches_total", "Items envoyés dans le flux d'une recherche enregistrée.")
+STREAMS_REJECTED = Counter(
+    "vinted_stream_rejected_total", "Connexions SSE refusées (worker plein), repli sur le rechargement."
+)
+ITEMS_FILTERED = Counter(
+    "vinted_items_filtered_total", "Items bruts écartés par le filtre résiduel, avant normalisation."
+)
+
+
+def cache_samples(field):
+    caches = (
+        ("items", ITEM_CACHE), ("cards", CARD_CACHE),
+        ("sellers", SELLER_CACHE), ("images", IMAGE_SOURCES),
+    )
+    return [((name,), cache.stats()[field]) for name, cache in caches]
+
+
+Sampled("vinted_cache_hits_total", "Lectures servies par le cache.", ("cache",),
+        lambda: cache_samples("hits"))
+Sampled("vinted_cache_misses_total", "Lectures absentes ou expirées du cache.", ("cache",),
+        lambda: cache_samples("misses"))
+Sampled("vinted_cache_evictions_total", "Entrées évincées (LRU).", ("cache",),
+        lambda: cache_samples("evictions"))
+Sampled("vinted_cache_bytes", "Mémoire estimée occupée par le cache.", ("cache",),
+        lambda: cache_samples("bytes"), kind="gauge")
+Sampled("vinted_poller_leader", "1 si ce worker est le poller élu.", (),
+        lambda: [((), int(LEADER_FILE is not None or not SHARED_SNAPSHOTS))], kind="gauge")
+Sampled("vinted_fetch_coalesced_total", "Récupérations fusionnées avec un appel déjà en cours.", (),
+        lambda: [((), FETCH_FLIGHTS.stats()["coalesced"])])
+
+
+# ---------- CACHE ----------
+def selection_key(selected_brands, filters=()):
+    """Clé canonique d'une sélection: (marques, filtres) (snapshots, cache).
+
+    L'ordre et les doublons n'ont pas d'importance: ["441", "14969"] et
+    ["14969", "441"] partagent la même entrée. `filters` est le tuple de
+    paires (nom, valeur) de parse_filters.
+    """
+    return tuple(sorted(set(selected_brands))), tuple(sorted(filters))
 
-        // Écouter les changements de plein écran (pour gérer les raccourcis clavier)
-        document.addEventListener('fullscreenchange', function() {
-            const expandIcon = document.querySelector('.expand-icon');
-            const compressIcon = document.querySelector('.compress-icon');
-            
-            if (document.fullscreenElement) {
-                expandIcon.style.display = 'none';
-                compressIcon.style.display = 'block';
-                localStorage.setItem('fullscreenMode', 'true');
-            } else {
-                expandIcon.style.display = 'block';
-                compressIcon.style.display = 'none';
-                localStorage.removeItem('fullscreenMode');
-            }
-        });
-
-        // Restaurer le plein écran au chargement de la page
-        function initFullscreen() {
-            const fullscreenSaved = localStorage.getItem('fullscreenMode');
-            if (fullscreenSaved === 'true' && !document.fullscreenElement) {
-                // Petit délai pour éviter les problèmes de timing
-                setTimeout(() => {
-                    document.documentElement.requestFullscreen().catch(err => {
-                        console.log('Impossible de restaurer le plein écran:', err);
-                        localStorage.removeItem('fullscreenMode');
-                    });
-                }, 100);
-            }
-        }
 
-        // Initialisation du thème au chargement
-        function initTheme() {
-            const savedTheme = localStorage.getItem('theme');
-            const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
-            const theme = savedTheme || (prefersDark ? 'dark' : 'light');
-            
-            const html = document.documentElement;
-            const sunIcon = document.querySelector('.sun-icon');
-            const moonIcon = document.querySelector('.moon-icon');
-            
-            html.setAttribute('data-theme', theme);
-            
-            if (theme === 'dark') {
-                sunIcon.style.display = 'none';
-                moonIcon.style.display = 'block';
-            } else {
-                sunIcon.style.display = 'block';
-                moonIcon.style.display = 'none';
-            }
-        }
+def estimate_size(obj) -> int:
+    """Estimation (octets) de l'empreinte mémoire d'une liste d'items normalisés."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += estimate_size(v)
+    elif isinstance(obj, Item):
+        for name in Item.__slots__:
+            size += estimate_size(getattr(obj, name))
+    return size
 
-        // Gestion de la modal
-        function openBrandModal() {
-            document.getElementById('brandModal').classList.add('show');
-            document.body.style.overflow = 'hidden';
-            // Désactiver le refresh automatique pendant que la modal est ouverte
-            disableAutoRefresh();
-        }
 
-        function closeBrandModal() {
-            document.getElementById('brandModal').classList.remove('show');
-            document.body.style.overflow = 'auto';
-            // Réactiver le refresh automatique
-            enableAutoRefresh();
-        }
+class SelectionCache:
+    """Cache LRU borné en entrées et en mémoire, avec TTL.
 
-        // Gestion du refresh automatique
-        function disableAutoRefresh() {
-            const refreshMeta = document.getElementById('auto-refresh');
-            if (refreshMeta) {
-                refreshMeta.setAttribute('data-content', refreshMeta.getAttribute('content'));
-                refreshMeta.removeAttribute('content');
-            }
-        }
+    Sert pour les items par sélection de marques et pour les cartes HTML rendues.
+    """
 
-        function enableAutoRefresh() {
-            const refreshMeta = document.getElementById('auto-refresh');
-            if (refreshMeta && refreshMeta.hasAttribute('data-content')) {
-                refreshMeta.setAttribute('content', refreshMeta.getAttribute('data-content'));
-                refreshMeta.removeAttribute('data-content');
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_used = 0
+        # clé -> (stocké à (monotonic), valeur, taille estimée)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne la valeur si elle est encore fraîche, sinon None (miss)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        """Retourne la dernière valeur connue, même expirée (sans toucher aux compteurs)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes_used -= previous[2]
+            self._entries[key] = (time.monotonic(), value, size)
+            self.bytes_used += size
+            # Éviction LRU; on garde toujours l'entrée qui vient d'être ajoutée
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes_used -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes_used,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
             }
-        }
 
-        // Fermer la modal en cliquant à l'extérieur
-        window.onclick = function(event) {
-            const modal = document.getElementById('brandModal');
-            if (event.target === modal) {
-                closeBrandModal();
-            }
-        }
 
-        // Fermer avec Escape
-        document.addEventListener('keydown', function(event) {
-            if (event.key === 'Escape') {
-                const modal = document.getElementById('brandModal');
-                if (modal && modal.classList.contains('show')) {
-                    closeBrandModal();
-                }
-            }
-        });
-
-        // Gestion des filtres de marques
-        function updateBrandSelection(checkbox) {
-            const label = checkbox.closest('.brand-checkbox');
-            if (checkbox.checked) {
-                label.classList.add('checked');
-            } else {
-                label.classList.remove('checked');
-            }
-        }
+ITEM_CACHE = SelectionCache()
+CARD_CACHE = SelectionCache(
+    max_entries=CARD_CACHE_MAX_ENTRIES, max_bytes=CARD_CACHE_MAX_BYTES, ttl=float("inf")
+)
 
-        function selectAllBrands() {
-            const checkboxes = document.querySelectorAll('input[name="brands"]');
-            checkboxes.forEach(checkbox => {
-                checkbox.checked = true;
-                checkbox.closest('.brand-checkbox').classList.add('checked');
-            });
-        }
 
-        function clearAllBrands() {
-            const checkboxes = document.querySelectorAll('input[name="brands"]');
-            checkboxes.forEach(checkbox => {
-                checkbox.checked = false;
-                checkbox.closest('.brand-checkbox').classList.remove('checked');
-            });
-        }
+class _FlightCall:
+    __slots__ = ("done", "result", "error")
 
-        // Variables globales pour gérer les nouveaux items (stockage persistant)
-        let previousItemIds = JSON.parse(localStorage.getItem('vintedWatchItemIds') || '[]');
-        let isFirstLoad = localStorage.getItem('vintedWatchFirstLoad') !== 'false';
-
-        // Amélioration de l'expérience utilisateur
-        document.addEventListener('DOMContentLoaded', function() {
-            // Initialiser le thème
-            initTheme();
-            
-            // Initialiser le plein écran
-            initFullscreen();
-            
-            // Récupérer les IDs des items actuels
-            const currentItems = Array.from(document.querySelectorAll('.item-card'));
-            const currentItemIds = currentItems.map(card => {
-                const url = card.querySelector('.btn-primary').href;
-                return url.split('/').pop(); // Extraire l'ID de l'URL
-            });
-            
-            if (isFirstLoad) {
-                // Animation d'apparition normale au premier chargement
-                currentItems.forEach((card, index) => {
-                    card.style.animationDelay = `${index * 0.1}s`;
-                    card.style.animation = 'fadeInUp 0.6s ease forwards';
-                });
-                localStorage.setItem('vintedWatchFirstLoad', 'false');
-            } else {
-                // Détecter les nouveaux items
-                const newItemIds = currentItemIds.filter(id => !previousItemIds.includes(id));
-                
-                if (newItemIds.length > 0) {
-                    // Il y a de nouveaux items
-                    currentItems.forEach((card, index) => {
-                        const url = card.querySelector('.btn-primary').href;
-                        const itemId = url.split('/').pop();
-                        
-                        if (newItemIds.includes(itemId)) {
-                            // Nouveau item - animation depuis le haut
-                            card.classList.add('new-item');
-                            card.style.animation = 'slideInFromTop 0.8s ease forwards';
-                        } else {
-                            // Item existant - animation de glissement vers le bas
-                            card.classList.add('existing-item');
-                            card.style.animation = 'slideDown 0.8s ease forwards';
-                        }
-                    });
-                }
-            }
-            
-            // Sauvegarder les IDs actuels
-            localStorage.setItem('vintedWatchItemIds', JSON.stringify(currentItemIds));
-
-            // Gestion des erreurs d'images avec retry
-            const images = document.querySelectorAll('img');
-            images.forEach(img => {
-                img.addEventListener('error', function() {
-                    if (!this.hasAttribute('data-retry')) {
-                        this.setAttribute('data-retry', 'true');
-                        setTimeout(() => {
-                            this.src = this.src;
-                        }, 2000);
-                    }
-                });
-            });
-        });
-
-        // Animation CSS pour l'apparition
-        const style = document.createElement('style');
-        style.textContent = `
-            @keyframes fadeInUp {
-                from {
-                    opacity: 0;
-                    transform: translateY(30px);
-                }
-                to {
-                    opacity: 1;
-                    transform: translateY(0);
-                }
-            }
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
 
-            @keyframes slideInFromTop {
-                from {
-                    opacity: 0;
-                    transform: translateY(-100px);
-                }
-                to {
-                    opacity: 1;
-                    transform: translateY(0);
-                }
-            }
 
-            @keyframes slideDown {
-                from {
-                    transform: translateY(0);
-                }
-                to {
-                    transform: translateY(0);
-                }
-            }
+class SingleFlight:
+    """Coalescence des appels concurrents: un seul appel en vol par clé.
 
-            .new-item {
-                position: relative;
-                z-index: 10;
-                box-shadow: 0 0 20px rgba(9, 182, 162, 0.3) !important;
-                border: 2px solid var(--primary-color) !important;
-            }
+    Les appelants qui arrivent pendant qu'un appel est en cours pour la même
+    clé attendent et reçoivent le même résultat (ou la même exception).
+    """
 
-            .existing-item {
-                transition: transform 0.8s ease;
-            }
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0  # appels amont économisés
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _FlightCall()
+                self._in_flight[key] = call
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
 
-            /* Effet de surbrillance pour les nouveaux items */
-            .new-item::before {
-                content: 'NOUVEAU';
-                position: absolute;
-                top: -5px;
-                left: 20px;
-                background: var(--primary-color);
-                color: white;
-                padding: 4px 12px;
-                border-radius: 50px;
-                font-size: 0.75rem;
-                font-weight: 700;
-                z-index: 20;
-                animation: pulse 2s infinite;
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
             }
-        `;
-        document.head.appendChild(style);
+
+
+FETCH_FLIGHTS = SingleFlight()
+
+
+# Carte d'un item, rendue seule pour la page et pour le flux SSE
+ITEM_CARD_TEMPLATE = """
+<article class="item-card" data-item-id="{{ it.id }}">
+    <div class="item-content">
+        <div class="item-image-container">
+            <img src="{{ image_url(it.photo, 240) }}" 
+                 srcset="{{ image_url(it.photo, 240) }} 240w, {{ image_url(it.photo, 480) }} 480w"
+                 sizes="(max-width: 768px) 100vw, 210px"
+                 alt="Photo de {{ it.title }}" 
+                 class="item-image"
+                 loading="lazy"
+                 decoding="async">
+        </div>
+        <div class="item-details">
+            <div class="item-header">
+                <h2 class="item-title">{{ it.title }}</h2>
+                {% if it.size %}
+                <div class="item-size">
+                    <span>👕</span> {{ it.size }}
+                    <div class="price-badge">{{ it.price }}</div>
+                </div>
+                {% endif %}
+            </div>
+
+            <div class="seller-info">
+                <img src="{{ image_url(it.seller_avatar, 48) }}" 
+                     srcset="{{ image_url(it.seller_avatar, 48) }} 1x, {{ image_url(it.seller_avatar, 96) }} 2x"
+                     alt="Avatar de {{ it.seller_name }}" 
+                     class="seller-avatar"
+                     loading="lazy"
+                     decoding="async">
+                <div class="seller-details">
+                    <div class="seller-name">{{ it.seller_name }}</div>
+                    <div class="seller-rating">
+                        <span class="stars">{{ it.seller_stars|safe }}</span>
+                        <span class="rating-text">{{ it.seller_rating_display }}</span>
+                    </div>
+                </div>
+            </div>
+
+            <div class="item-actions">
+                <a href="{{ it.url }}" target="_blank" class="btn btn-primary">
+                    Voir l'article
+                </a>
+                <button class="btn btn-secondary" onclick="navigator.share ? navigator.share({title: '{{ it.title }}', url: '{{ it.url }}'}) : navigator.clipboard.writeText('{{ it.url }}')">
+                    Partager
+                </button>
+            </div>
+        </div>
+    </div>
+</article>
+"""
+
+
+ANALYTICS_TEMPLATE = """
+<!doctype html>
+<html lang="fr">
+<head>
+    <meta charset="utf-8">
+    <title>Vinted Watch - Analyse des prix</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+    <script>
+        (function() {
+            const savedTheme = localStorage.getItem('theme');
+            const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+            document.documentElement.setAttribute('data-theme', savedTheme || (prefersDark ? 'dark' : 'light'));
+        })();
     </script>
+</head>
+<body>
+    <header class="header">
+        <div class="header-content">
+            <div class="logo">
+                <div class="logo-icon">V</div>
+                <div class="logo-text">Analyse des prix</div>
+            </div>
+            <div class="header-right">
+                <a href="{{ url_for('index') }}" class="filter-btn">Retour au flux</a>
+            </div>
+        </div>
+    </header>
+
+    <div class="container">
+        <p class="search-summary">
+            Annonces observées sur les {{ window_days }} derniers jours, par marque et par taille
+            (groupes d'au moins {{ min_count }} annonces). Prix dans la devise du marché.
+        </p>
+        {% for title, rows in (("Par marque", brands), ("Par taille", sizes)) %}
+        <h2 class="analytics-title">{{ title }}</h2>
+        {% if rows %}
+        <div class="analytics-scroll">
+        <table class="analytics-table">
+            <thead>
+                <tr>
+                    <th></th><th>Annonces</th><th>Par jour</th><th>24 h</th>
+                    <th>P10</th><th>P25</th><th>Médiane</th><th>P75</th><th>P90</th>
+                </tr>
+            </thead>
+            <tbody>
+                {% for r in rows %}
+                <tr>
+                    <td>{{ r.label }}</td>
+                    <td>{{ r.count }}</td>
+                    <td>{{ r.per_day }}</td>
+                    <td>{{ r.last_24h }}</td>
+                    <td>{{ format_amount(r.p10, r.currency) }}</td>
+                    <td>{{ format_amount(r.p25, r.currency) }}</td>
+                    <td><strong>{{ format_amount(r.median, r.currency) }}</strong></td>
+                    <td>{{ format_amount(r.p75, r.currency) }}</td>
+                    <td>{{ format_amount(r.p90, r.currency) }}</td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+        </div>
+        {% else %}
+        <p class="search-empty">Pas encore assez d'annonces observées.</p>
+        {% endif %}
+        {% endfor %}
+    </div>
 </body>
 </html>
 """
 
 
-def build_url(selected_brands):
-    base = f"https://{DOMAIN}/api/v2/catalog/items"
+# Champs de l'item affichés dans la carte (invalident le fragment en cache)
+CARD_FIELDS = (
+    "title", "size", "price", "url", "photo", "seller_name", "seller_avatar",
+    "seller_stars", "seller_rating_display",
+)
+
+# ---------- ASSETS ----------
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+def load_assets():
+    """Charge les assets statiques (CSS/JS) avec une empreinte de contenu.
+
+    Les variantes gzip et brotli sont calculées une fois au démarrage.
+    """
+    assets = {}
+    for name in sorted(os.listdir(STATIC_DIR)):
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        assets[name] = {
+            "filename": f"{stem}.{digest}{ext}",
+            "etag": digest,
+            "mimetype": mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "identity": body,
+            "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+            "br": brotli.compress(body, quality=11),
+        }
+    return assets
+
+
+ASSETS = load_assets()
+ASSETS_BY_FILENAME = {asset["filename"]: asset for asset in ASSETS.values()}
+
+
+def asset_url(name: str) -> str:
+    """URL versionnée d'un asset (ex: /assets/app.3f2a9c1b7d4e.css)."""
+    return f"/assets/{ASSETS[name]['filename']}"
+
+
+app.jinja_env.globals["asset_url"] = asset_url
+
+
+def negotiate_encoding():
+    """Meilleur encodage accepté par le client: "br", "gzip" ou None."""
+    for encoding in ("br", "gzip"):
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+# Templates compilés une seule fois au démarrage
+PAGE_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+CARD_TEMPLATE = app.jinja_env.from_string(ITEM_CARD_TEMPLATE)
+ANALYTICS_PAGE_TEMPLATE = app.jinja_env.from_string(ANALYTICS_TEMPLATE)
+
+
+def upstream_base(domain=DOMAIN) -> str:
+    """Base des requêtes vers un marché Vinted."""
+    return UPSTREAM_OVERRIDE or f"https://{domain}"
+
+
+def build_url(selected_brands, page=1, domain=DOMAIN, filters=()):
+    base = f"{upstream_base(domain)}/api/v2/catalog/items"
     params = {"order": ORDER, "per_page": str(PER_PAGE)}
     if selected_brands:
         params["brand_ids"] = ",".join(selected_brands)
+    params.update(filter_params(filters))
+    if page > 1:
+        params["page"] = str(page)
     return base + "?" + urlencode(params)
 
 
-def make_session():
-    """Crée une session requests avec headers réalistes et charge la page d'accueil."""
-    s = requests.Session()
-    s.headers.update({
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/124.0.0.0 Safari/537.36"
+# ---------- FILTRES ----------
+def parse_filters(args):
+    """Filtres canoniques d'une requête: tuple trié de paires (nom, valeur).
+
+    `args` est un MultiDict (request.args). Les champs vides ou invalides sont
+    ignorés; les listes d'IDs acceptent ?size_ids=a&size_ids=b ou ?size_ids=a,b.
+    """
+    filters = {}
+    for name in FILTER_PRICES:
+        try:
+            value = float(args.get(name, "").replace(",", "."))
+        except ValueError:
+            continue
+        if value >= 0:
+            filters[name] = value
+    for name in FILTER_ID_LISTS:
+        ids = {i for value in args.getlist(name) for i in value.split(",") if i.strip().isdigit()}
+        if ids:
+            filters[name] = tuple(sorted(i.strip() for i in ids))
+    for name in FILTER_TEXTS:
+        text = " ".join(args.get(name, "").lower().split())
+        if text:
+            filters[name] = text
+    return tuple(sorted(filters.items()))
+
+
+def filter_params(filters) -> dict:
+    """Paramètres de l'API catalogue correspondant aux filtres qu'elle sait appliquer."""
+    params = {}
+    for name, value in filters:
+        if name in FILTER_LOCAL_ONLY:
+            continue
+        if name in FILTER_ID_LISTS:
+            value = ",".join(value)
+        elif name in FILTER_PRICES:
+            value = f"{value:g}"
+        params[name] = value
+    return params
+
+
+def raw_price_amount(it):
+    """Montant d'un item brut (avant normalisation), None si illisible."""
+    return parse_price(
+        it.get("price") or it.get("price_info"),
+        it.get("price_numeric") or it.get("price_amount"),
+    )[0]
+
+
+@lru_cache(maxsize=256)
+def residual_filter(filters):
+    """Prédicat sur les items bruts pour ce que Vinted ne filtre pas (ou pas sûrement).
+
+    Compilé une fois par jeu de filtres; None s'il n'y a rien à vérifier.
+    Les prix se lisent dans la devise du marché de l'item.
+    """
+    options = dict(filters)
+    checks = []
+    if "price_from" in options or "price_to" in options:
+        low = options.get("price_from", 0.0)
+        high = options.get("price_to", float("inf"))
+
+        def price_ok(it):
+            amount = raw_price_amount(it)
+            # Prix illisible: on fait confiance au filtre de Vinted
+            return amount is None or low <= amount <= high
+        checks.append(price_ok)
+    if "exclude_text" in options:
+        words = tuple(options["exclude_text"].split())
+
+        def text_ok(it):
+            title = str(it.get("title") or "").lower()
+            return not any(word in title for word in words)
+        checks.append(text_ok)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda it: all(check(it) for check in checks)
+
+
+# En-têtes "navigateur" envoyés avec chaque requête vers Vinted
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
+}
+
+# Contexte TLS partagé par tous les clients (reprise de session TLS)
+SSL_CONTEXT = httpx.create_ssl_context()
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+async def make_client(origin: str):
+    """Crée un client HTTP poolé (keep-alive, HTTP/2) et charge la page d'accueil."""
+    client = httpx.AsyncClient(
+        http2=True,
+        headers=BROWSER_HEADERS,
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        verify=SSL_CONTEXT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=120,
         ),
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
-        "Connection": "keep-alive",
-    })
+    )
     try:
         # Visite la page accueil pour récupérer des cookies anti-bot
-        s.get(f"https://{DOMAIN}/", timeout=12)
-        time.sleep(random.uniform(0.2, 0.6))
+        await client.get(f"{origin}/", timeout=12)
+        await asyncio.sleep(random.uniform(0.2, 0.6))
     except Exception:
         # On ignore les erreurs de chargement initial
         pass
-    return s
+    return client
+
+
+# ---------- SESSIONS ----------
+def cookies_expire_at(client):
+    """Première expiration (timestamp) parmi les cookies d'un client, None si aucune."""
+    expiries = [cookie.expires for cookie in client.cookies.jar if cookie.expires]
+    return min(expiries) if expiries else None
+
+
+class PooledSession:
+    """Client HTTP chaud (cookies anti-bot) avec un score de santé.
+
+    La santé combine le taux de succès récent (moyenne mobile exponentielle
+    des statuts) et la latence récente: 1.0 = parfait, 0.0 = inutilisable.
+    """
+
+    def __init__(self, origin: str, client):
+        self.origin = origin
+        self.client = client
+        self.created_at = time.time()
+        self.success = 1.0
+        self.latency = 0.0
+        self.samples = 0
+        # Renouvellement avant expiration des cookies (ou après SESSION_MAX_AGE)
+        self.refresh_at = self.created_at + SESSION_MAX_AGE
+        expires_at = cookies_expire_at(client)
+        if expires_at is not None:
+            self.refresh_at = max(
+                self.created_at + SESSION_MIN_AGE,
+                min(self.refresh_at, expires_at - SESSION_REFRESH_MARGIN),
+            )
+
+    @property
+    def health(self) -> float:
+        return self.success * min(1.0, SESSION_SLOW_LATENCY / max(self.latency, 1e-3))
+
+    @property
+    def unhealthy(self) -> bool:
+        return self.samples >= SESSION_MIN_SAMPLES and self.health < SESSION_MIN_HEALTH
+
+    async def get(self, url: str, **kwargs):
+        started = time.monotonic()
+        try:
+            r = await self.client.get(url, **kwargs)
+        except Exception:
+            self.record(False)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.latency = elapsed if not self.samples else 0.8 * self.latency + 0.2 * elapsed
+        r.extensions["vinted_session"] = self
+        return r
+
+    def record(self, ok: bool):
+        self.success = 0.8 * self.success + 0.2 * (1.0 if ok else 0.0)
+        self.samples += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "age": round(time.time() - self.created_at),
+            "refresh_in": round(max(0.0, self.refresh_at - time.time())),
+            "health": round(self.health, 3),
+            "success": round(self.success, 3),
+            "latency_ms": round(self.latency * 1000, 1),
+            "samples": self.samples,
+        }
+
+
+class SessionPool:
+    """Sessions chaudes d'un hôte, renouvelées en tâche de fond.
+
+    Les requêtes utilisent la session la plus saine; la maintenance (hors du
+    chemin des requêtes) remplace les sessions dont les cookies vont expirer
+    et celles dont la santé est tombée sous SESSION_MIN_HEALTH.
+    """
+
+    def __init__(self, origin: str, size=SESSION_POOL_SIZE):
+        self.origin = origin
+        self.size = size
+        self.sessions = []
+        self.created = 0
+        self.retired = 0
+        self._fill_lock = asyncio.Lock()
+
+    async def _new_session(self):
+        session = PooledSession(self.origin, await make_client(self.origin))
+        self.created += 1
+        return session
+
+    async def fill(self):
+        async with self._fill_lock:
+            while len(self.sessions) < self.size:
+                self.sessions.append(await self._new_session())
+
+    async def pick(self):
+        """Session la plus saine (démarrage à froid si le pool n'est pas encore chaud)."""
+        if not self.sessions:
+            async with self._fill_lock:
+                if not self.sessions:
+                    self.sessions.append(await self._new_session())
+        healthy = [session for session in self.sessions if not session.unhealthy] or self.sessions
+        return max(healthy, key=lambda session: session.health)
+
+    async def maintain(self):
+        now = time.time()
+        for session in list(self.sessions):
+            if not (session.unhealthy or now >= session.refresh_at):
+                continue
+            replacement = await self._new_session()
+            self.sessions[self.sessions.index(session)] = replacement
+            self.retired += 1
+            # Les requêtes en cours sur l'ancienne session se terminent avant fermeture
+            asyncio.get_running_loop().call_later(
+                SESSION_CLOSE_GRACE, lambda client=session.client: asyncio.ensure_future(client.aclose())
+            )
+        await self.fill()
+
+    async def aclose(self):
+        for session in self.sessions:
+            await session.client.aclose()
+        self.sessions.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "origin": self.origin,
+            "created": self.created,
+            "retired": self.retired,
+            "sessions": [session.snapshot() for session in list(self.sessions)],
+        }
+
+
+# ---------- LIMITEUR ----------
+class CircuitOpenError(Exception):
+    """Le disjoncteur de l'hôte est ouvert: on n'appelle pas Vinted."""
+
 
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponentiel avec jitter ("equal jitter": entre d/2 et d)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
 
-def normalize_photo_url(photo_url: str) -> str:
+
+def parse_retry_after(value):
+    """Délai (secondes) d'un en-tête Retry-After (secondes ou date HTTP), None sinon."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HostLimiter:
+    """Limiteur sortant d'un hôte: token bucket adaptatif et disjoncteur.
+
+    Le débit augmente de RATE_INCREASE après chaque succès et est multiplié
+    par RATE_DECREASE sur 403/429 (AIMD): il converge vers le plus haut débit
+    toléré par Vinted. Un blocage impose aussi une pause partagée (Retry-After
+    ou backoff exponentiel), et BREAKER_THRESHOLD blocages consécutifs ouvrent
+    le disjoncteur pendant BREAKER_COOLDOWN secondes avant une requête d'essai.
+    Un essai resté sans réponse après BREAKER_PROBE_TIMEOUT secondes rouvre le
+    disjoncteur pour un nouveau refroidissement. Un Retry-After est borné à
+    BACKOFF_MAX; au-delà de THROTTLE_MAX_WAIT, la pause ouvre le disjoncteur
+    pour toute sa durée au lieu de faire attendre acquire() (et son verrou).
+    Utilisé uniquement depuis la boucle du moteur asyncio.
+    """
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self.rate = RATE_INITIAL
+        self.tokens = float(BUCKET_CAPACITY)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probe_deadline = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.rejected = 0
+        self.backoff_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(float(BUCKET_CAPACITY), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Attend un jeton (et la fin d'une pause en cours). Lève CircuitOpenError."""
+        async with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.origin)
+                # Fin du refroidissement: une seule requête d'essai
+                self.state = "half-open"
+            elif self.state == "half-open":
+                if now >= self.probe_deadline:
+                    # Essai perdu (jamais rapporté): nouveau refroidissement
+                    self._open(now, BREAKER_COOLDOWN)
+                self.rejected += 1
+                raise CircuitOpenError(self.origin)
+
+            self._refill(now)
+            delay = max(0.0, self.blocked_until - now)
+            if self.tokens < 1:
+                delay = max(delay, (1 - self.tokens) / self.rate)
+            if delay > THROTTLE_MAX_WAIT:
+                # Pause trop longue pour bloquer l'hôte ici: on refuse jusqu'à sa fin
+                self._open(now, delay)
+                self.rejected += 1
+                raise CircuitOpenError(self.origin)
+            if delay:
+                await asyncio.sleep(delay)
+                self._refill(time.monotonic())
+            if self.state == "half-open":
+                self.probe_deadline = time.monotonic() + BREAKER_PROBE_TIMEOUT
+            self.tokens -= 1
+            self.requests += 1
+
+    def _open(self, now: float, cooldown: float):
+        self.state = "open"
+        self.opened_at = now
+        self.cooldown = cooldown
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self.rate = min(RATE_MAX, self.rate + RATE_INCREASE)
+
+    def record_throttle(self, retry_after=None) -> float:
+        """403/429: baisse du débit, pause partagée, ouverture éventuelle du disjoncteur."""
+        self.throttled += 1
+        self.failures += 1
+        self.rate = max(RATE_MIN, self.rate * RATE_DECREASE)
+        self.tokens = 0.0
+        if retry_after is not None:
+            delay = min(retry_after, BACKOFF_MAX)
+        else:
+            delay = backoff_delay(self.failures)
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.backoff_seconds += delay
+        if self.state == "half-open" or self.failures >= BREAKER_THRESHOLD:
+            self._open(now, max(BREAKER_COOLDOWN, delay))
+        elif delay > THROTTLE_MAX_WAIT:
+            self._open(now, delay)
+        return delay
+
+    def record_error(self, attempt: int) -> float:
+        """Erreur réseau ou réponse illisible: délai de retry pour cette requête seulement."""
+        self.errors += 1
+        if self.state == "half-open":
+            self._open(time.monotonic(), BREAKER_COOLDOWN)
+        delay = backoff_delay(attempt)
+        self.backoff_seconds += delay
+        return delay
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "origin": self.origin,
+            "state": self.state,
+            "rate_per_minute": round(self.rate * 60, 2),
+            "tokens": round(min(float(BUCKET_CAPACITY), self.tokens + (now - self.updated) * self.rate), 2),
+            "blocked_for": round(max(0.0, self.blocked_until - now), 1),
+            "consecutive_failures": self.failures,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "backoff_seconds": round(self.backoff_seconds, 1),
+        }
+
+
+class AsyncFetchEngine:
+    """Moteur de requêtes asyncio sur une boucle dédiée (thread de fond).
+
+    Un pool de sessions chaudes par hôte (connexions keep-alive: DNS et TLS
+    réutilisés, HTTP/2 si le serveur le propose), un sémaphore par hôte qui
+    borne les requêtes simultanées et un HostLimiter par hôte. Le code
+    synchrone (poller) passe par run().
+    """
+
+    def __init__(self, max_per_host=HTTP_MAX_PER_HOST):
+        self.max_per_host = max_per_host
+        self.loop = asyncio.new_event_loop()
+        self._pools = {}        # origine -> SessionPool
+        self._semaphores = {}   # origine -> asyncio.Semaphore
+        self._limiters = {}     # origine -> HostLimiter
+        self._maintenance = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name="vinted-fetch", daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """Exécute une coroutine sur la boucle du moteur et attend son résultat.
+
+        Au-delà de `timeout`, la coroutine est annulée et l'exception remonte.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def pool(self, url: str):
+        """Pool de sessions de l'hôte d'une URL (créé à la demande, sur la boucle du moteur)."""
+        origin = origin_of(url)
+        pool = self._pools.get(origin)
+        if pool is None:
+            pool = self._pools[origin] = SessionPool(origin)
+        return pool
+
+    def limiter(self, url: str):
+        """Limiteur de l'hôte d'une URL (créé à la demande, sur la boucle du moteur)."""
+        origin = origin_of(url)
+        limiter = self._limiters.get(origin)
+        if limiter is None:
+            limiter = self._limiters[origin] = HostLimiter(origin)
+        return limiter
+
+    def limiter_state(self):
+        """État de tous les limiteurs (lisible depuis n'importe quel thread)."""
+        return [limiter.snapshot() for limiter in list(self._limiters.values())]
+
+    def session_state(self):
+        """État de tous les pools de sessions (lisible depuis n'importe quel thread)."""
+        return [pool.snapshot() for pool in list(self._pools.values())]
+
+    async def get(self, url: str, **kwargs):
+        """GET via la session la plus saine de l'hôte, dans sa limite de concurrence.
+
+        L'appelant signale ensuite si la réponse est exploitable avec record().
+        """
+        origin = origin_of(url)
+        session = await self.pool(origin).pick()
+        semaphore = self._semaphores.get(origin)
+        if semaphore is None:
+            semaphore = self._semaphores[origin] = asyncio.Semaphore(self.max_per_host)
+        async with semaphore:
+            return await session.get(url, **kwargs)
+
+    def record(self, response, ok: bool):
+        """Met à jour la santé de la session qui a produit `response`."""
+        session = response.extensions.get("vinted_session")
+        if session is not None:
+            session.record(ok)
+
+    async def _prewarm(self, origins):
+        for origin in origins:
+            try:
+                await self.pool(origin).fill()
+            except Exception:
+                pass
+
+    def prewarm(self, origins):
+        """Chauffe en tâche de fond les sessions des hôtes donnés."""
+        asyncio.run_coroutine_threadsafe(self._prewarm(list(origins)), self.loop)
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_MAINTENANCE_INTERVAL)
+            for pool in list(self._pools.values()):
+                try:
+                    await pool.maintain()
+                except Exception:
+                    # Un renouvellement raté sera retenté au cycle suivant
+                    pass
+
+    def start_maintenance(self, prewarm=()):
+        """Lance la tâche de fond qui chauffe et renouvelle les sessions."""
+        if self._maintenance is None:
+            self._maintenance = asyncio.run_coroutine_threadsafe(
+                self._maintenance_loop(), self.loop
+            )
+        if prewarm:
+            self.prewarm(prewarm)
+
+    async def _aclose(self):
+        for pool in self._pools.values():
+            await pool.aclose()
+        self._pools.clear()
+
+    def close(self):
+        """Ferme les connexions et arrête la boucle (tests, arrêt propre)."""
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        self.run(self._aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+FETCH_ENGINE = AsyncFetchEngine()
+# Les sessions de l'hôte principal sont chauffées par le process élu poller
+FETCH_ENGINE.start_maintenance()
+
+
+def normalize_photo_url(photo_url: str, domain: str = DOMAIN) -> str:
     """Normalise l'URL d'image (préfixe https: si nécessaire)."""
     if not photo_url:
         return ""
@@ -1276,14 +1585,14 @@ def normalize_photo_url(photo_url: str) -> str:
     if photo_url.startswith("//"):
         return "https:" + photo_url
     if photo_url.startswith("/"):
-        return "https://" + DOMAIN + photo_url
+        return "https://" + domain + photo_url
     return photo_url
 
 
-def format_price(price_str: str = None, price_numeric=None, currency: str = None) -> str:
-    """Formate proprement le prix pour l'affichage (robuste).
+def parse_price(price_str=None, price_numeric=None, currency: str = None):
+    """Extrait (valeur numérique, devise) d'un prix Vinted (dict, str ou None).
 
-    Accepte dict, str, None. Retourne une chaîne prête pour affichage (ex: "25,00 €").
+    La valeur vaut None si le prix est illisible.
     """
     val = None
 
@@ -1310,20 +1619,44 @@ def format_price(price_str: str = None, price_numeric=None, currency: str = None
             except Exception:
                 val = None
 
-    if val is None:
-        return str(price_str or "").strip()
+    return val, currency
+
+
+def domain_currency(domain: str = DOMAIN) -> str:
+    """Devise par défaut d'un marché ("" si inconnue)."""
+    return DOMAIN_CURRENCIES.get(domain, "")
 
+
+def format_amount(val: float, currency: str = None, domain: str = DOMAIN) -> str:
+    """Formate une valeur numérique pour l'affichage (ex: "25,00 €").
+
+    Sans devise explicite, on prend celle du marché.
+    """
     s = f"{val:,.2f}"
     s = s.replace(',', ' ').replace('.', ',')
 
-    cur = (currency or "").upper()
-    if cur in ("EUR", "€", "EURO") or DOMAIN.endswith(".fr"):
+    cur = (currency or domain_currency(domain)).upper()
+    if cur in ("EUR", "€", "EURO"):
         return f"{s} €"
     if cur:
-        return f"{s} {cur}"
+        return f"{s} {CURRENCY_SYMBOLS.get(cur, cur)}"
     return s
 
 
+def format_price(price_str: str = None, price_numeric=None, currency: str = None,
+                 domain: str = DOMAIN) -> str:
+    """Formate proprement le prix pour l'affichage (robuste).
+
+    Accepte dict, str, None. Retourne une chaîne prête pour affichage (ex: "25,00 €").
+    """
+    val, currency = parse_price(price_str, price_numeric, currency)
+    if val is None:
+        if isinstance(price_str, dict):
+            return ""
+        return str(price_str or "").strip()
+    return format_amount(val, currency, domain)
+
+
 def build_star_string(rating, max_stars=5):
     try:
         r = float(rating)
@@ -1343,174 +1676,2613 @@ def build_star_string(rating, max_stars=5):
     return stars_html
 
 
-def fetch_items_from_vinted(session, url: str):
+async def fetch_json(engine, url: str, domain: str = DOMAIN):
+    """Réponse JSON d'une URL Vinted, via le limiteur de l'hôte (None si échec).
+
+    Les pauses (Retry-After, backoff) ont lieu sur la boucle asyncio: aucun
+    thread n'est bloqué, et le disjoncteur coupe court quand l'hôte nous bloque.
+    """
     headers = {
-        "Referer": f"https://{DOMAIN}/",
-        "Origin": f"https://{DOMAIN}",
+        "Referer": f"https://{domain}/",
+        "Origin": f"https://{domain}",
         "X-Requested-With": "XMLHttpRequest",
     }
+    limiter = engine.limiter(url)
     max_attempts = 3
     for attempt in range(1, max_attempts + 1):
+        if attempt > 1:
+            UPSTREAM_RETRIES.inc()
+        try:
+            await limiter.acquire()
+        except CircuitOpenError:
+            UPSTREAM_REJECTED.inc()
+            return None
+
+        started = time.perf_counter()
         try:
-            r = session.get(url, headers=headers, timeout=18)
+            r = await engine.get(url, headers=headers)
         except Exception as e:
-            # erreur réseau -> courte pause puis retry
-            time.sleep(random.uniform(2.0, 6.0))
+            # erreur réseau -> pause (backoff) puis retry
+            UPSTREAM_RESPONSES.inc("error")
+            app.logger.warning("Vinted injoignable (%s): %s", url, e)
+            delay = limiter.record_error(attempt)
+            UPSTREAM_BACKOFF.inc(amount=delay)
+            await asyncio.sleep(delay)
             continue
-
-        if r.status_code == 403:
-            # attendre un peu plus longtemps si 403 pour éviter blocage
-            time.sleep(random.randint(20, 60))
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started)
+        UPSTREAM_RESPONSES.inc(str(r.status_code))
+
+        if r.status_code == 404:
+            # ressource absente (profil supprimé...): inutile de réessayer, mais
+            # l'hôte a bien répondu (referme le disjoncteur en demi-ouverture)
+            engine.record(r, ok=True)
+            limiter.record_success()
+            return None
+
+        if r.status_code in (403, 429):
+            # blocage anti-bot: la pause est partagée par toutes les requêtes de l'hôte
+            engine.record(r, ok=False)
+            delay = limiter.record_throttle(parse_retry_after(r.headers.get("Retry-After")))
+            UPSTREAM_BACKOFF.inc(amount=delay)
+            app.logger.warning("Vinted bloque (HTTP %s), pause de %.1fs", r.status_code, delay)
             continue
 
         try:
             data = r.json()
-        except Exception as e:
+        except Exception:
             snippet = (r.text or "")[:500].replace("\n", " ")
-            # petite pause puis retry
-            time.sleep(random.uniform(5.0, 10.0))
+            # réponse illisible (page HTML, captcha...) -> pause puis retry
+            UPSTREAM_INVALID.inc()
+            app.logger.warning(
+                "Réponse non JSON de Vinted (HTTP %s, %s): %s", r.status_code, url, snippet
+            )
+            engine.record(r, ok=False)
+            delay = limiter.record_error(attempt)
+            UPSTREAM_BACKOFF.inc(amount=delay)
+            await asyncio.sleep(delay)
             continue
 
-        return data.get("items", [])
+        engine.record(r, ok=True)
+        limiter.record_success()
+        return data
 
     # si on échoue
-    return []
+    return None
 
 
-def fetch_items(selected_brands):
-    global SESSION, LAST_FETCH, LAST_ITEMS, LAST_BRANDS
-    if SESSION is None:
-        SESSION = make_session()
+async def fetch_items_from_vinted(engine, url: str, domain: str = DOMAIN):
+    """Items bruts d'une URL du catalogue ([] si échec)."""
+    data = await fetch_json(engine, url, domain)
+    if not isinstance(data, dict):
+        return []
+    return data.get("items", [])
 
-    now = datetime.now()
-    brands_changed = LAST_BRANDS != selected_brands
-    
-    if not brands_changed and LAST_FETCH and (now - LAST_FETCH).total_seconds() < CACHE_TTL:
-        return LAST_ITEMS
-
-    url = build_url(selected_brands)
-    items_raw = fetch_items_from_vinted(SESSION, url)
-
-    items = []
-    for it in items_raw:
-        photo_url = ""
-        if it.get("photo"):
-            p = it["photo"]
-            if isinstance(p, dict):
-                photo_url = p.get("url") or p.get("url_thumb") or ""
-            elif isinstance(p, str):
-                photo_url = p
-        elif it.get("photos"):
-            photos = it["photos"]
-            if isinstance(photos, list) and photos:
-                first = photos[0]
-                if isinstance(first, dict):
-                    photo_url = (
-                        first.get("url_fullxfull")
-                        or first.get("url")
-                        or first.get("url_300")
-                        or first.get("url_thumb")
-                        or ""
-                    )
-        photo_url = normalize_photo_url(photo_url)
-
-        title = it.get("title") or it.get("brand_title") or "Annonce"
-
-        price_numeric = it.get("price_numeric") or it.get("price_amount") or None
-        currency = it.get("currency") or it.get("price_currency") or None
-        price_raw = it.get("price") or it.get("price_info") or None
-        price = format_price(price_raw, price_numeric, currency)
-
-        size = it.get("size_title") or ""
-        url_item = f"https://{DOMAIN}/items/{it.get('id')}"
 
-        user_info = it.get("user") or it.get("seller") or it.get("owner") or {}
-        seller_name = (
-            (user_info.get("display_name") if isinstance(user_info, dict) else None)
-            or (user_info.get("login") if isinstance(user_info, dict) else None)
-            or (user_info.get("username") if isinstance(user_info, dict) else None)
-            or (user_info.get("nickname") if isinstance(user_info, dict) else None)
-            or (user_info.get("title") if isinstance(user_info, dict) else None)
-            or "Utilisateur"
+def fetch_items(selected_brands, filters=()):
+    cache_key = selection_key(selected_brands, filters)
+    cached = ITEM_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Un seul appel amont en vol par sélection: les appelants concurrents
+    # attendent le résultat de celui-ci au lieu de relancer Vinted
+    return FETCH_FLIGHTS.do(cache_key, lambda: refresh_selection(cache_key))
+
+
+def shard_brands(brands, size=SHARD_SIZE):
+    """Découpe une sélection de marques en groupes d'au plus `size` marques."""
+    return [brands[i:i + size] for i in range(0, len(brands), size)]
+
+
+def item_sort_id(it) -> int:
+    """Clé de tri "plus récent d'abord" d'un item brut (les IDs Vinted sont croissants)."""
+    try:
+        return int(it.get("id") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def merge_newest_first(shards, limit=MERGED_LIMIT):
+    """Fusion k-way (par tas) de listes triées du plus récent au plus ancien.
+
+    Les items présents dans plusieurs shards ne sont gardés qu'une fois (par ID).
+    """
+    merged = []
+    seen_ids = set()
+    for it in heapq.merge(*shards, key=item_sort_id, reverse=True):
+        item_id = it.get("id")
+        if item_id in seen_ids:
+            continue
+        seen_ids.add(item_id)
+        merged.append(it)
+        if len(merged) >= limit:
+            break
+    return merged
+
+
+def feed_limit(brands) -> int:
+    """Nombre max d'items gardés pour une sélection."""
+    if len(DOMAINS) > 1 or (FETCH_MODE == "sharded" and len(brands) > SHARD_SIZE):
+        return MERGED_LIMIT
+    return PER_PAGE
+
+
+async def fetch_pages_since(engine, brands, since_id=None, domain=DOMAIN, filters=()):
+    """Récupère les items bruts d'un groupe de marques.
+
+    Sans high-water mark, seule la première page est lue. Sinon on continue
+    de paginer tant que la page est pleine et entièrement plus récente que
+    `since_id`, pour ne pas sauter d'annonces lors d'une rafale.
+    """
+    collected = []
+    for page in range(1, MAX_DELTA_PAGES + 1):
+        items_raw = await fetch_items_from_vinted(
+            engine, build_url(brands, page=page, domain=domain, filters=filters), domain
         )
+        for it in items_raw:
+            # Le marché d'origine sert à la normalisation (URL, devise)
+            it["_domain"] = domain
+        collected.extend(items_raw)
+        if since_id is None or len(items_raw) < PER_PAGE:
+            break
+        if min(item_sort_id(it) for it in items_raw) <= since_id:
+            break
+    return collected
+
+
+async def fetch_raw_items(brands, since_id=None, engine=None, domains=None, filters=()):
+    """Récupère les items bruts d'une sélection sur tous les marchés.
+
+    Un appel par marché, ou par shard de marques; tout part en parallèle. Chaque
+    marché est un hôte distinct, avec ses sessions, son limiteur et sa limite de
+    concurrence: un cycle multi-marchés dure à peu près autant qu'un seul.
+    """
+    engine = engine or FETCH_ENGINE
+    domains = domains or DOMAINS
+    if FETCH_MODE == "sharded" and len(brands) > SHARD_SIZE:
+        groups = shard_brands(brands)
+    else:
+        groups = [brands]
+    if len(groups) == 1 and len(domains) == 1:
+        return await fetch_pages_since(engine, brands, since_id, domains[0], filters)
+
+    # Ordre des tâches = ordre des marchés: le merge garde l'item du marché principal
+    results = await asyncio.gather(
+        *(
+            fetch_pages_since(engine, group, since_id, domain, filters)
+            for domain in domains
+            for group in groups
+        ),
+        return_exceptions=True,
+    )
+    shards = []
+    for items_raw in results:
+        if isinstance(items_raw, BaseException):
+            continue
+        # Vinted trie déjà par date; on re-trie par ID pour garantir l'ordre du merge
+        shards.append(sorted(items_raw, key=item_sort_id, reverse=True))
+    return merge_newest_first(shards)
 
-        seller_avatar = ""
-        if isinstance(user_info, dict):
-            a = user_info.get("avatar") or user_info.get("photo") or user_info.get("thumb")
-            if isinstance(a, dict):
-                seller_avatar = a.get("url") or a.get("url_thumb") or a.get("thumb") or ""
-            elif isinstance(a, str):
-                seller_avatar = a
-        seller_avatar = normalize_photo_url(seller_avatar)
-
-        seller_rating = None
-        if isinstance(user_info, dict):
-            for key in ("rating_average", "avg_rating", "score", "rating", "rating_value"):
-                if key in user_info and user_info.get(key) is not None:
-                    seller_rating = user_info.get(key)
-                    break
-        if seller_rating is None and isinstance(it.get("user_stats"), dict):
-            us = it.get("user_stats")
-            for key in ("rating_average", "avg_rating", "rating"):
-                if key in us and us.get(key) is not None:
-                    seller_rating = us.get(key)
+
+def high_water_mark(items):
+    """ID le plus récent d'une liste d'items normalisés (None si vide)."""
+    ids = [item_sort_id(it) for it in items]
+    return max(ids) if ids else None
+
+
+def refresh_selection(cache_key):
+    """Interroge Vinted pour une sélection, normalise les items et les met en cache.
+
+    Polling incrémental: seuls les items au-dessus du high-water mark de la
+    sélection sont normalisés, puis ajoutés en tête de la liste existante.
+    """
+    brands, filters = list(cache_key[0]), cache_key[1]
+    previous = ITEM_CACHE.peek(cache_key)
+    mark = high_water_mark(previous) if previous else None
+
+    items_raw = FETCH_ENGINE.run(
+        fetch_raw_items(brands, since_id=mark, filters=filters), timeout=REFRESH_TIMEOUT
+    )
+    ITEMS_FETCHED.inc(amount=len(items_raw))
+    # Ce que Vinted n'a pas filtré est écarté avant toute normalisation
+    keep = residual_filter(filters)
+    if keep is not None:
+        kept = [it for it in items_raw if keep(it)]
+        ITEMS_FILTERED.inc(amount=len(items_raw) - len(kept))
+        items_raw = kept
+    if mark is None:
+        new_items = normalize_items(items_raw)
+        items = new_items
+    else:
+        fresh = [it for it in items_raw if item_sort_id(it) > mark]
+        fresh.sort(key=item_sort_id, reverse=True)
+        new_items = normalize_items(fresh)
+        items = (new_items + previous)[:feed_limit(brands)]
+
+    ITEMS_NEW.inc(amount=len(new_items))
+    store_items(new_items)
+    PRICE_ANALYTICS.ingest(new_items)
+    ITEM_CACHE.set(cache_key, items)
+    return items
+
+
+class Item:
+    """Item normalisé : attributs en __slots__ (pas de dict par instance)."""
+
+    __slots__ = (
+        "id", "title", "brand_id", "brand", "price", "price_amount", "currency",
+        "size", "url", "photo", "seller_id", "seller_name", "seller_avatar",
+        "seller_rating_display", "seller_stars", "domain",
+    )
+
+    def __init__(self, id, title, brand_id, brand, price, price_amount, currency, size,
+                 url, photo, seller_id, seller_name, seller_avatar, seller_rating_display,
+                 seller_stars, domain=DOMAIN):
+        self.id = id
+        self.title = title
+        self.brand_id = brand_id
+        self.brand = brand
+        self.price = price
+        self.price_amount = price_amount
+        self.currency = currency
+        self.size = size
+        self.url = url
+        self.photo = photo
+        self.seller_id = seller_id
+        self.seller_name = seller_name
+        self.seller_avatar = seller_avatar
+        self.seller_rating_display = seller_rating_display
+        self.seller_stars = seller_stars
+        self.domain = domain
+
+    def get(self, key, default=None):
+        """Accès façon dict, pour les consommateurs historiques (store, cache de cartes)."""
+        return getattr(self, key, default)
+
+    def as_dict(self) -> dict:
+        """Représentation JSON (API, flux)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Chemins candidats, dans l'ordre de priorité de l'ancienne boucle
+PHOTO_PATHS = (
+    ("photo", "url"), ("photo", "url_thumb"), ("photo",),
+    ("photos", 0, "url_fullxfull"), ("photos", 0, "url"),
+    ("photos", 0, "url_300"), ("photos", 0, "url_thumb"),
+)
+USER_KEYS = ("user", "seller", "owner")
+SELLER_NAME_KEYS = ("display_name", "login", "username", "nickname", "title")
+AVATAR_PATHS = (
+    ("avatar", "url"), ("avatar", "url_thumb"), ("avatar", "thumb"), ("avatar",),
+    ("photo", "url"), ("photo", "url_thumb"), ("photo", "thumb"), ("photo",),
+    ("thumb",),
+)
+USER_RATING_KEYS = ("rating_average", "avg_rating", "score", "rating", "rating_value")
+STATS_RATING_KEYS = ("rating_average", "avg_rating", "rating")
+
+
+def dig(obj, path):
+    """Suit un chemin de clés/indices ; None dès qu'un maillon manque."""
+    for step in path:
+        try:
+            obj = obj[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return obj
+
+
+def path_getter(path):
+    """Accesseur compilé pour un chemin résolu (les chemins courts évitent la boucle)."""
+    if path is None:
+        return None
+    if len(path) == 1:
+        key = path[0]
+        return lambda obj: obj.get(key)
+    if len(path) == 2 and isinstance(path[1], str):
+        outer, inner = path
+
+        def get(obj):
+            value = obj.get(outer)
+            return value.get(inner) if isinstance(value, dict) else None
+        return get
+    return lambda obj: dig(obj, path)
+
+
+def first_path(sample, paths):
+    """Premier chemin menant à une chaîne non vide dans l'échantillon."""
+    for path in paths:
+        for it in sample:
+            value = dig(it, path)
+            if value and isinstance(value, str):
+                return path
+    return None
+
+
+def first_key(sample, keys):
+    """Première clé présente (valeur non nulle) dans l'échantillon."""
+    for key in keys:
+        for it in sample:
+            if isinstance(it, dict) and it.get(key) is not None:
+                return key
+    return None
+
+
+def extract_photo_url(it) -> str:
+    """Chemin lent : photo principale d'un item brut, quel que soit son format."""
+    p = it.get("photo")
+    if p:
+        if isinstance(p, dict):
+            return p.get("url") or p.get("url_thumb") or ""
+        return p if isinstance(p, str) else ""
+    photos = it.get("photos")
+    if isinstance(photos, list) and photos and isinstance(photos[0], dict):
+        first = photos[0]
+        return (
+            first.get("url_fullxfull")
+            or first.get("url")
+            or first.get("url_300")
+            or first.get("url_thumb")
+            or ""
+        )
+    return ""
+
+
+def extract_avatar(user_info) -> str:
+    """Chemin lent : avatar du vendeur."""
+    a = user_info.get("avatar") or user_info.get("photo") or user_info.get("thumb")
+    if isinstance(a, dict):
+        return a.get("url") or a.get("url_thumb") or a.get("thumb") or ""
+    return a if isinstance(a, str) else ""
+
+
+def extract_rating(it, user_info):
+    """Chemin lent : note du vendeur (profil puis user_stats)."""
+    if isinstance(user_info, dict):
+        for key in USER_RATING_KEYS:
+            if user_info.get(key) is not None:
+                return user_info[key]
+    us = it.get("user_stats")
+    if isinstance(us, dict):
+        for key in STATS_RATING_KEYS:
+            if us.get(key) is not None:
+                return us[key]
+    return None
+
+
+def resolve_plan(items_raw) -> tuple:
+    """Résout une fois par lot les chemins de clés utilisés par la réponse.
+
+    Les réponses d'une même requête partagent le même schéma : on l'infère sur
+    quelques items, puis chaque item suit directement ces chemins.
+    """
+    sample = [it for it in items_raw[:NORMALIZE_SAMPLE] if isinstance(it, dict)]
+    user_key = first_key(sample, USER_KEYS)
+    users = [it[user_key] for it in sample if user_key and isinstance(it.get(user_key), dict)]
+    rating_key = first_key(users, USER_RATING_KEYS)
+    stats = [it["user_stats"] for it in sample if isinstance(it.get("user_stats"), dict)]
+    return (
+        path_getter(first_path(sample, PHOTO_PATHS)),
+        first_key(sample, ("price_numeric", "price_amount")),
+        first_key(sample, ("currency", "price_currency")),
+        first_key(sample, ("price", "price_info")),
+        user_key,
+        first_key(users, SELLER_NAME_KEYS),
+        path_getter(first_path(users, AVATAR_PATHS)),
+        rating_key,
+        None if rating_key else first_key(stats, STATS_RATING_KEYS),
+    )
+
+
+@lru_cache(maxsize=512)
+def rating_fields(seller_rating):
+    """(affichage, étoiles) d'une note ; mémoïsé, les notes se répètent beaucoup."""
+    if seller_rating is None:
+        return "—", "—"
+    try:
+        sr = float(seller_rating)
+    except Exception:
+        return intern(str(seller_rating)), "—"
+    return intern(f"{sr:.1f}/5"), intern(build_star_string(sr, max_stars=5))
+
+
+@lru_cache(maxsize=4096)
+def price_display(amount, currency, domain=DOMAIN):
+    """Prix formaté, interné : les mêmes montants reviennent d'un lot à l'autre."""
+    return intern(format_amount(amount, currency, domain))
+
+
+# ---------- VENDEURS ----------
+
+# ID vendeur -> (nom, avatar, note affichée, étoiles, note connue)
+SELLER_CACHE = SelectionCache(SELLER_CACHE_MAX_ENTRIES, SELLER_CACHE_MAX_BYTES, SELLER_CACHE_TTL)
+# Vendeurs sans note en attente d'enrichissement (ordre d'arrivée)
+SELLER_PENDING = OrderedDict()
+SELLER_LOCK = threading.Lock()
+SELLER_THREAD = None
+
+
+def item_rating(it, user_info, rating_key=None, stats_key=None):
+    """Note du vendeur d'un item brut: clés du plan d'abord, chemin lent sinon."""
+    rating = user_info.get(rating_key) if rating_key and isinstance(user_info, dict) else None
+    if rating is None and stats_key:
+        us = it.get("user_stats")
+        if isinstance(us, dict):
+            rating = us.get(stats_key)
+    if rating is None:
+        rating = extract_rating(it, user_info)
+    return rating
+
+
+def build_seller(it, user_info, name_key=None, avatar_get=None, rating_key=None, stats_key=None):
+    """Champs vendeur normalisés, au format de SELLER_CACHE."""
+    seller_name = seller_avatar = ""
+    if isinstance(user_info, dict):
+        seller_name = user_info.get(name_key) if name_key else None
+        if not seller_name:
+            for key in SELLER_NAME_KEYS:
+                seller_name = user_info.get(key)
+                if seller_name:
                     break
+        seller_avatar = avatar_get(user_info) if avatar_get else None
+        if not seller_avatar or not isinstance(seller_avatar, str):
+            seller_avatar = extract_avatar(user_info)
+    seller_rating = item_rating(it, user_info, rating_key, stats_key)
+    try:
+        rating_display, stars = rating_fields(seller_rating)
+    except TypeError:  # note non hachable (dict, liste…)
+        rating_display, stars = rating_fields.__wrapped__(seller_rating)
+    return (
+        intern(seller_name or "Utilisateur"),
+        normalize_photo_url(seller_avatar),
+        rating_display,
+        stars,
+        seller_rating is not None,
+    )
+
+
+def queue_seller_enrichment(seller_id):
+    """Demande (sans attendre) le profil complet d'un vendeur dont la note manque."""
+    with SELLER_LOCK:
+        if seller_id in SELLER_PENDING or len(SELLER_PENDING) >= SELLER_ENRICH_MAX_PENDING:
+            return
+        SELLER_PENDING[seller_id] = None
+    start_seller_enricher()
+
+
+def profile_rating(profile):
+    """Note sur 5 d'un profil /api/v2/users (feedback_reputation est sur 1)."""
+    rating = extract_rating(profile, profile)
+    if rating is None and profile.get("feedback_reputation") is not None:
+        try:
+            rating = round(float(profile["feedback_reputation"]) * 5, 1)
+        except (TypeError, ValueError):
+            rating = None
+    return rating
+
+
+async def fetch_seller_profiles(engine, seller_ids):
+    """Profils vendeurs d'un lot, en parallèle sous le limiteur de l'hôte."""
+    results = await asyncio.gather(*(
+        fetch_json(engine, f"{UPSTREAM_BASE}/api/v2/users/{seller_id}")
+        for seller_id in seller_ids
+    ))
+    return {
+        seller_id: data.get("user") if isinstance(data, dict) else None
+        for seller_id, data in zip(seller_ids, results)
+    }
+
+
+def enrich_sellers(seller_ids):
+    """Complète la note des vendeurs en cache à partir de leur profil."""
+    profiles = FETCH_ENGINE.run(fetch_seller_profiles(FETCH_ENGINE, seller_ids))
+    for seller_id, profile in profiles.items():
+        if not isinstance(profile, dict):
+            continue
+        rating = profile_rating(profile)
+        if rating is None:
+            continue
+        cached = SELLER_CACHE.peek(seller_id) or build_seller(profile, profile)
+        rating_display, stars = rating_fields(rating)
+        SELLER_CACHE.set(seller_id, (cached[0], cached[1], rating_display, stars, True))
+
+
+def seller_enricher_loop():
+    while True:
+        time.sleep(SELLER_ENRICH_INTERVAL)
+        with SELLER_LOCK:
+            batch = [SELLER_PENDING.popitem(last=False)[0]
+                     for _ in range(min(SELLER_ENRICH_BATCH, len(SELLER_PENDING)))]
+        if not batch:
+            continue
+        try:
+            enrich_sellers(batch)
+        except Exception:
+            pass
+
+
+def start_seller_enricher():
+    """Démarre (une seule fois) le thread d'enrichissement des vendeurs."""
+    global SELLER_THREAD
+    with SELLER_LOCK:
+        if SELLER_THREAD is not None and SELLER_THREAD.is_alive():
+            return SELLER_THREAD
+        SELLER_THREAD = threading.Thread(
+            target=seller_enricher_loop, name="vinted-sellers", daemon=True
+        )
+        SELLER_THREAD.start()
+    return SELLER_THREAD
+
+
+def normalize_item(it, plan) -> Item:
+    """Normalise un item brut en suivant le plan ; chemin lent si le plan ne s'applique pas."""
+    (photo_get, numeric_key, currency_key, price_key, user_key, name_key, avatar_get,
+     rating_key, stats_key) = plan
+
+    # Marché d'origine, posé par fetch_pages_since
+    domain = it.get("_domain") or DOMAIN
+
+    photo_url = photo_get(it) if photo_get else None
+    if not photo_url or not isinstance(photo_url, str):
+        photo_url = extract_photo_url(it)
+
+    price_numeric = (
+        (it.get(numeric_key) if numeric_key else None)
+        or it.get("price_numeric") or it.get("price_amount") or None
+    )
+    currency = (
+        (it.get(currency_key) if currency_key else None)
+        or it.get("currency") or it.get("price_currency") or None
+    )
+    price_raw = (
+        (it.get(price_key) if price_key else None)
+        or it.get("price") or it.get("price_info") or None
+    )
+    price_amount, price_currency = parse_price(price_raw, price_numeric, currency)
+    if price_amount is None:
+        price = format_price(price_raw, domain=domain)
+    else:
+        price = price_display(price_amount, price_currency, domain)
+
+    user_info = it.get(user_key) if user_key else None
+    if not user_info or not isinstance(user_info, dict):
+        user_info = it.get("user") or it.get("seller") or it.get("owner") or {}
+
+    # Vendeur: champs repris du cache tant qu'ils sont frais; un profil sans note
+    # est reconstruit dès qu'une réponse apporte enfin la note
+    seller_id = user_info.get("id") if isinstance(user_info, dict) else None
+    seller = SELLER_CACHE.get(seller_id) if seller_id is not None else None
+    if seller is None or (
+        not seller[4] and item_rating(it, user_info, rating_key, stats_key) is not None
+    ):
+        seller = build_seller(it, user_info, name_key, avatar_get, rating_key, stats_key)
+        if seller_id is not None:
+            SELLER_CACHE.set(seller_id, seller)
+            if SELLER_ENRICH and not seller[4]:
+                queue_seller_enrichment(seller_id)
+    seller_name, seller_avatar, seller_rating_display, seller_stars, _ = seller
+
+    item_id = it.get("id")
+    return Item(
+        item_id,
+        it.get("title") or it.get("brand_title") or "Annonce",
+        intern(str(it.get("brand_id") or "")),
+        intern(it.get("brand_title") or ""),
+        price,
+        price_amount,
+        intern((price_currency or domain_currency(domain)).upper()),
+        intern(it.get("size_title") or ""),
+        f"https://{domain}/items/{item_id}",
+        normalize_photo_url(photo_url, domain),
+        seller_id,
+        seller_name,
+        seller_avatar,
+        seller_rating_display,
+        seller_stars,
+        domain,
+    )
+
+
+def normalize_items(items_raw):
+    """Convertit les items bruts de l'API Vinted en Items prêts pour le template."""
+    if not items_raw:
+        return []
+    started = time.perf_counter()
+    plan = resolve_plan(items_raw)
+    items = [normalize_item(it, plan) for it in items_raw]
+    NORMALIZE_SECONDS.observe(time.perf_counter() - started)
+    return items
+
+
+# ---------- STORE ----------
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    brand_id TEXT,
+    brand TEXT,
+    title TEXT,
+    price TEXT,
+    price_amount REAL,
+    currency TEXT,
+    size TEXT,
+    url TEXT,
+    photo TEXT,
+    seller_id INTEGER,
+    seller_name TEXT,
+    seller_avatar TEXT,
+    seller_rating_display TEXT,
+    seller_stars TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_brand ON items(brand_id, first_seen);
+CREATE INDEX IF NOT EXISTS idx_items_first_seen ON items(first_seen);
+CREATE INDEX IF NOT EXISTS idx_items_price ON items(price_amount);
+CREATE INDEX IF NOT EXISTS idx_items_size ON items(size);
+CREATE TABLE IF NOT EXISTS images (
+    digest TEXT PRIMARY KEY,
+    url TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    selection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    epoch TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    items TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watched (
+    selection TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen_buckets (
+    client TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    ids BLOB NOT NULL,
+    PRIMARY KEY (client, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_seen_buckets_bucket ON seen_buckets(bucket);
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    watcher TEXT NOT NULL,
+    name TEXT NOT NULL,
+    brands TEXT NOT NULL,
+    sizes TEXT NOT NULL,
+    price_from REAL,
+    price_to REAL,
+    search_text TEXT NOT NULL,
+    exclude_text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rules_watcher ON rules(watcher);
+CREATE TABLE IF NOT EXISTS rule_matches (
+    rule_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    watcher TEXT NOT NULL,
+    matched_at REAL NOT NULL,
+    PRIMARY KEY (rule_id, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rule_matches_watcher ON rule_matches(watcher, item_id);
+CREATE INDEX IF NOT EXISTS idx_rule_matches_matched_at ON rule_matches(matched_at);
+CREATE TABLE IF NOT EXISTS price_rollups (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (dimension, key, currency)
+) WITHOUT ROWID;
+"""
+
+# Index plein texte externe (le contenu reste dans items), tenu à jour par
+# triggers dans la transaction de store_items: seuls les items nouveaux ou
+# dont un champ indexé change sont réindexés
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, brand, size, seller_name,
+    content='items', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, title, brand, size, seller_name)
+    VALUES (new.id, new.title, new.brand, new.size, new.seller_name);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items
+WHEN old.title IS NOT new.title OR old.brand IS NOT new.brand
+    OR old.size IS NOT new.size OR old.seller_name IS NOT new.seller_name
+BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, brand, size, seller_name)
+    VALUES ('delete', old.id, old.title, old.brand, old.size, old.seller_name);
+    INSERT INTO items_fts (rowid, title, brand, size, seller_name)
+    VALUES (new.id, new.title, new.brand, new.size, new.seller_name);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, brand, size, seller_name)
+    VALUES ('delete', old.id, old.title, old.brand, old.size, old.seller_name);
+END;
+"""
+# Faux si SQLite est compilé sans FTS5: la recherche se rabat alors sur LIKE
+FTS_ENABLED = True
+
+STORE_COLUMNS = (
+    "id", "brand_id", "brand", "title", "price", "price_amount", "currency",
+    "size", "url", "photo", "seller_id", "seller_name", "seller_avatar",
+    "seller_rating_display", "seller_stars",
+)
+
+# first_seen n'est jamais écrasé: seuls les champs qui peuvent évoluer le sont
+STORE_UPSERT = (
+    f"INSERT INTO items ({', '.join(STORE_COLUMNS)}, first_seen, last_seen) "
+    f"VALUES ({', '.join('?' for _ in STORE_COLUMNS)}, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in STORE_COLUMNS if col != "id")
+    + ", last_seen = excluded.last_seen"
+)
+
+# Une connexion SQLite par thread (poller, shards, requêtes)
+_DB_LOCAL = threading.local()
+
+
+def get_db():
+    """Retourne la connexion SQLite du thread courant (WAL, créée à la demande)."""
+    conn = getattr(_DB_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            conn.executescript(STORE_SCHEMA)
+            init_fts(conn)
+        except sqlite3.Error:
+            # Base verrouillée par un autre worker...: nouvel essai au prochain appel
+            conn.close()
+            raise
+        _DB_LOCAL.conn = conn
+    return conn
+
+
+def init_fts(conn):
+    """Crée l'index plein texte; à sa création, il est construit depuis l'historique."""
+    global FTS_ENABLED
+    if not FTS_ENABLED:
+        return
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+        conn.executescript(FTS_SCHEMA)
+        if exists is None:
+            with conn:
+                conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        # Seule l'absence du module fts5 est définitive; le reste (verrou...) remonte
+        if "no such module" not in str(e):
+            raise
+        FTS_ENABLED = False
+
+
+def store_items(items):
+    """Upsert d'un lot d'items normalisés en une seule transaction (un seul commit)."""
+    if not items:
+        return
+    now = time.time()
+    rows = [
+        tuple(it.get(col) for col in STORE_COLUMNS) + (now, now)
+        for it in items
+        if it.get("id") is not None
+    ]
+    images = register_images(items)
+    try:
+        conn = get_db()
+        with conn:
+            conn.executemany(STORE_UPSERT, rows)
+            conn.executemany("INSERT OR IGNORE INTO images (digest, url) VALUES (?, ?)", images)
+    except sqlite3.Error:
+        # Le stockage est un bonus: une erreur disque ne bloque pas le feed
+        pass
+
+
+def query_items(brand_ids=None, since=None, min_price=None, max_price=None, size=None, limit=100):
+    """Recherche dans l'historique local, du plus récent au plus ancien.
+
+    `since` est un timestamp (secondes) sur la date de première observation.
+    """
+    clauses, params = [], []
+    if brand_ids:
+        clauses.append(f"brand_id IN ({', '.join('?' for _ in brand_ids)})")
+        params.extend(brand_ids)
+    if since is not None:
+        clauses.append("first_seen >= ?")
+        params.append(since)
+    if min_price is not None:
+        clauses.append("price_amount >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append("price_amount <= ?")
+        params.append(max_price)
+    if size:
+        clauses.append("size = ?")
+        params.append(size)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT * FROM items {where} ORDER BY first_seen DESC, id DESC LIMIT ?"
+    rows = get_db().execute(sql, params + [limit]).fetchall()
+    return [dict(row) for row in rows]
+
+
+def fts_query(text):
+    """Requête FTS5 d'une saisie libre: chaque mot doit apparaître, le dernier en préfixe.
+
+    Les mots sont cités, la syntaxe FTS5 (AND, NEAR, ^...) n'est donc jamais interprétée.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_items(text, hours=None, page=1, per_page=SEARCH_PER_PAGE):
+    """Items de l'historique correspondant à `text`, les plus pertinents d'abord.
+
+    Retourne (items, has_more). `hours` limite aux items vus pour la première
+    fois dans les dernières heures.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return [], False
+    clauses, params = [], []
+    if FTS_ENABLED:
+        clauses.append("items_fts MATCH ?")
+        params.append(fts_query(text))
+    else:
+        for word in words:
+            clauses.append("(title LIKE ? OR brand LIKE ? OR size LIKE ? OR seller_name LIKE ?)")
+            params.extend([f"%{word}%"] * 4)
+    if hours:
+        clauses.append("first_seen >= ?")
+        params.append(time.time() - hours * 3600)
+    if FTS_ENABLED:
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        if hours:
+            sql = (
+                "SELECT i.* FROM items_fts JOIN items i ON i.id = items_fts.rowid "
+                "WHERE items_fts MATCH ? AND i.first_seen >= ? "
+                f"ORDER BY bm25(items_fts, {weights}), i.id DESC LIMIT ? OFFSET ?"
+            )
+        else:
+            # Classement dans FTS5 sur les seuls rowid: les lignes d'items ne
+            # sont lues que pour la page retournée
+            sql = (
+                "SELECT i.* FROM ("
+                f"SELECT rowid, bm25(items_fts, {weights}) AS score FROM items_fts "
+                "WHERE items_fts MATCH ? ORDER BY score, rowid DESC LIMIT ? OFFSET ?"
+                ") AS hits JOIN items i ON i.id = hits.rowid ORDER BY hits.score, hits.rowid DESC"
+            )
+    else:
+        sql = f"SELECT * FROM items WHERE {' AND '.join(clauses)} ORDER BY first_seen DESC, id DESC LIMIT ? OFFSET ?"
+    # Une ligne de plus que la page pour savoir s'il y a une suite, sans COUNT(*)
+    rows = get_db().execute(sql, params + [per_page + 1, (page - 1) * per_page]).fetchall()
+    items = [dict(row) for row in rows[:per_page]]
+    return items, len(rows) > per_page
+
+
+# ---------- ANALYSE DES PRIX ----------
+class Dictionary:
+    """Encodage dictionnaire d'une colonne de chaînes (valeur <-> code entier)."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class PriceColumns:
+    """Prix observés en colonnes NumPy: id, date d'observation, montant, marque, taille, devise.
+
+    Les tableaux grandissent par doublement et les chaînes sont encodées en
+    entiers; `compact` retire les lignes sorties de la fenêtre d'analyse.
+    """
+
+    FIELDS = (
+        ("id", np.int64), ("seen", np.float64), ("price", np.float64),
+        ("brand", np.int32), ("size", np.int32), ("currency", np.int32),
+    )
+
+    def __init__(self, capacity=4096):
+        self.length = 0
+        self.data = {name: np.empty(capacity, dtype) for name, dtype in self.FIELDS}
+        self.ids = set()
+        self.brands = Dictionary()
+        self.sizes = Dictionary()
+        self.currencies = Dictionary()
+        self.brand_labels = {}
+
+    def column(self, name):
+        return self.data[name][:self.length]
+
+    def append(self, rows):
+        """Ajoute des lignes (id, vu le, montant, marque, libellé, taille, devise) encore inconnues.
+
+        Retourne les codes de marques et de tailles touchés.
+        """
+        rows = [row for row in rows if row[0] not in self.ids]
+        if not rows:
+            return set(), set()
+        end = self.length + len(rows)
+        capacity = len(self.data["id"])
+        if end > capacity:
+            while capacity < end:
+                capacity *= 2
+            for name, dtype in self.FIELDS:
+                grown = np.empty(capacity, dtype)
+                grown[:self.length] = self.data[name][:self.length]
+                self.data[name] = grown
+        brands = [self.brands.code(row[3]) for row in rows]
+        sizes = [self.sizes.code(row[5]) for row in rows]
+        batch = {
+            "id": [row[0] for row in rows],
+            "seen": [row[1] for row in rows],
+            "price": [row[2] for row in rows],
+            "brand": brands,
+            "size": sizes,
+            "currency": [self.currencies.code(row[6]) for row in rows],
+        }
+        for name, values in batch.items():
+            self.data[name][self.length:end] = values
+        for row in rows:
+            self.ids.add(row[0])
+            if row[4]:
+                self.brand_labels[row[3]] = row[4]
+        self.length = end
+        return set(brands), set(sizes)
+
+    def compact(self, cutoff):
+        keep = self.column("seen") >= cutoff
+        if keep.all():
+            return
+        for name, _ in self.FIELDS:
+            kept = self.column(name)[keep]
+            self.data[name][:len(kept)] = kept
+        self.length = int(keep.sum())
+        self.ids = set(self.column("id").tolist())
+
+
+def grouped_stats(keys, prices, seen, now):
+    """Quantiles, moyenne et annonces des dernières 24 h par clé de groupe, sans boucle Python.
+
+    Les prix sont triés par (groupe, prix) une seule fois; chaque quantile se
+    lit ensuite par interpolation linéaire dans sa tranche (comme np.percentile).
+    """
+    order = np.lexsort((prices, keys))
+    keys, prices, seen = keys[order], prices[order], seen[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    pos = starts[:, None] + (counts[:, None] - 1) * np.asarray(ANALYTICS_QUANTILES)[None, :]
+    low = np.floor(pos).astype(np.int64)
+    high = np.ceil(pos).astype(np.int64)
+    quantiles = prices[low] + (prices[high] - prices[low]) * (pos - low)
+    means = np.add.reduceat(prices, starts) / counts
+    recent = np.add.reduceat((seen >= now - 24 * 3600).astype(np.int64), starts)
+    return keys[starts], counts, quantiles, means, recent
+
+
+class PriceAnalytics:
+    """Statistiques de prix par marque et par taille sur une fenêtre glissante.
+
+    Chaque lot d'items ne recalcule que les groupes qu'il touche; toutes les
+    ANALYTICS_REFRESH_INTERVAL secondes, un recalcul complet fait glisser la
+    fenêtre. Les rollups sont servis tels quels à la page d'analyse (et
+    partagés en base avec les autres workers).
+    """
 
-        if seller_rating is None:
-            seller_rating_display = "—"
-            seller_stars = "—"
+    def __init__(self, window=ANALYTICS_WINDOW):
+        self.window = window
+        self.columns = PriceColumns()
+        self.rollups = {}
+        self.lock = threading.Lock()
+        self.refreshed_at = 0.0
+
+    def seed(self):
+        """Recharge la fenêtre depuis l'historique SQLite (prise de fonction du poller)."""
+        rows = get_db().execute(
+            "SELECT id, first_seen, price_amount, brand_id, brand, size, currency FROM items "
+            "WHERE first_seen >= ? AND price_amount IS NOT NULL ORDER BY first_seen",
+            (time.time() - self.window,),
+        ).fetchall()
+        with self.lock:
+            self.columns.append([
+                (row[0], row[1], row[2], row[3] or "", row[4] or "", row[5] or "", row[6] or "")
+                for row in rows
+            ])
+            self.recompute()
+        self.publish(full=True)
+
+    def ingest(self, items):
+        """Ajoute un lot d'items normalisés et met à jour les rollups concernés."""
+        now = time.time()
+        rows = [
+            (it.id, now, it.price_amount, it.brand_id or "", it.brand or "", str(it.size or ""),
+             it.currency or "")
+            for it in items
+            if it.price_amount is not None and it.id is not None
+        ]
+        with self.lock:
+            brands, sizes = self.columns.append(rows)
+            full = now - self.refreshed_at > ANALYTICS_REFRESH_INTERVAL
+            if full:
+                self.recompute()
+            elif brands:
+                self.recompute({"brand": brands, "size": sizes})
+            else:
+                return
+        self.publish(full)
+
+    def recompute(self, touched=None):
+        """Recalcule les rollups (tous, ou ceux des codes de `touched` par dimension)."""
+        started = time.perf_counter()
+        now = time.time()
+        cutoff = now - self.window
+        cols = self.columns
+        if touched is None:
+            cols.compact(cutoff)
+            rollups = {}
         else:
+            rollups = dict(self.rollups)
+        seen, price, currency = cols.column("seen"), cols.column("price"), cols.column("currency")
+        in_window = seen >= cutoff
+        # Moins d'un jour d'historique : pas d'extrapolation, le rythme est le compte observé
+        span_days = max((now - max(cutoff, float(seen.min()))) / 86400, 1.0) if len(seen) else 1.0
+        ncur = max(len(cols.currencies.values), 1)
+
+        for dimension, dictionary in (("brand", cols.brands), ("size", cols.sizes)):
+            codes = cols.column(dimension)
+            mask = in_window
+            if touched is not None:
+                mask = mask & np.isin(codes, np.fromiter(touched[dimension], np.int32))
+            if not mask.any():
+                continue
+            keys = codes[mask].astype(np.int64) * ncur + currency[mask]
+            groups, counts, quantiles, means, recent = grouped_stats(keys, price[mask], seen[mask], now)
+            for key, count, qs, mean, last_day in zip(
+                groups.tolist(), counts.tolist(), quantiles.tolist(), means.tolist(), recent.tolist()
+            ):
+                value = dictionary.values[key // ncur]
+                cur = cols.currencies.values[key % ncur]
+                label = cols.brand_labels.get(value, value) if dimension == "brand" else value
+                rollups[(dimension, value, cur)] = {
+                    "dimension": dimension,
+                    "key": value,
+                    "label": label or "—",
+                    "currency": cur,
+                    "count": count,
+                    "per_day": round(count / span_days, 2),
+                    "last_24h": last_day,
+                    **{name: round(q, 2) for name, q in zip(ANALYTICS_QUANTILE_NAMES, qs)},
+                    "mean": round(mean, 2),
+                }
+        self.rollups = rollups
+        if touched is None:
+            self.refreshed_at = now
+        ANALYTICS_SECONDS.observe(time.perf_counter() - started, "full" if touched is None else "batch")
+
+    def publish(self, full: bool):
+        """Écrit les rollups en base pour les workers non élus."""
+        if not SHARED_SNAPSHOTS:
+            return
+        now = time.time()
+        rows = [
+            (dimension, key, cur, json.dumps(stats, separators=(",", ":"), ensure_ascii=False), now)
+            for (dimension, key, cur), stats in self.rollups.items()
+        ]
+        try:
+            db = get_db()
+            with db:
+                if full:
+                    db.execute("DELETE FROM price_rollups")
+                db.executemany(
+                    "INSERT OR REPLACE INTO price_rollups (dimension, key, currency, stats, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error:
+            pass
+
+
+PRICE_ANALYTICS = PriceAnalytics()
+
+
+def price_rollups(dimension):
+    """Rollups d'une dimension ("brand" ou "size"), les plus actifs d'abord."""
+    if SHARED_SNAPSHOTS and LEADER_FILE is None:
+        # Worker non élu: rollups publiés par le poller
+        rows = get_db().execute(
+            "SELECT stats FROM price_rollups WHERE dimension = ?", (dimension,)
+        ).fetchall()
+        rollups = [json.loads(row[0]) for row in rows]
+    else:
+        rollups = [stats for key, stats in PRICE_ANALYTICS.rollups.items() if key[0] == dimension]
+    rollups.sort(key=lambda stats: (-stats["count"], stats["label"]))
+    return rollups
+
+
+# ---------- DÉJÀ VUS ----------
+CLIENT_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{16}$")
+
+
+class SeenTracker:
+    """Items déjà montrés à chaque navigateur, pour marquer les nouveaux côté serveur.
+
+    En mémoire, chaque client garde au plus `buckets` ensembles d'IDs d'une
+    tranche de `bucket_seconds`: la plus ancienne tranche est jetée d'un bloc,
+    et les clients inactifs sortent par LRU. Avec plusieurs workers, la table
+    SQLite `seen_buckets` joue ce rôle (un navigateur ne retombe pas toujours
+    sur le même process): une ligne par (client, tranche), IDs triés en int64
+    dans un blob, réécrite seulement si la page montre des IDs absents de la
+    tranche courante.
+    """
+
+    def __init__(self, max_clients=SEEN_MAX_CLIENTS, bucket_seconds=SEEN_BUCKET_SECONDS,
+                 buckets=SEEN_BUCKETS, shared=SHARED_SNAPSHOTS):
+        self.max_clients = max_clients
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.shared = shared
+        self.clients = OrderedDict()  # client -> deque[(tranche, set d'IDs)]
+        self.lock = threading.Lock()
+        self.purged_at = 0.0
+
+    def mark(self, client, ids):
+        """Enregistre `ids` comme vus par `client` et retourne ceux qu'il n'avait jamais vus.
+
+        Retourne None si le client n'a pas d'historique (première visite, ou
+        plus revenu depuis la rétention): rien n'est alors marqué nouveau.
+        """
+        ids = [i for i in ids if i is not None]
+        if self.shared:
             try:
-                sr = float(seller_rating)
+                return self.mark_shared(client, ids)
+            except sqlite3.Error:
+                return None
+        bucket = int(time.time() // self.bucket_seconds)
+        with self.lock:
+            history = self.clients.get(client)
+            if history is None:
+                history = self.clients[client] = deque()
+            else:
+                self.clients.move_to_end(client)
+            while history and history[0][0] <= bucket - self.buckets:
+                history.popleft()
+            fresh = None
+            if history:
+                fresh = {i for i in ids if not any(i in seen for _, seen in history)}
+            if not history or history[-1][0] != bucket:
+                history.append((bucket, set()))
+            # Un item toujours affiché reste vu: il rejoint la tranche courante
+            history[-1][1].update(ids)
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+        return fresh
+
+    def mark_shared(self, client, ids):
+        now = time.time()
+        bucket = int(now // self.bucket_seconds)
+        conn = get_db()
+        if now - self.purged_at > SEEN_PURGE_INTERVAL:
+            self.purged_at = now
+            with conn:
+                conn.execute("DELETE FROM seen_buckets WHERE bucket <= ?", (bucket - self.buckets,))
+        rows = conn.execute(
+            "SELECT bucket, ids FROM seen_buckets WHERE client = ? AND bucket > ?",
+            (client, bucket - self.buckets),
+        ).fetchall()
+        shown = np.unique(np.array(ids, dtype=np.int64))
+        fresh = None
+        if rows:
+            seen = np.concatenate([np.frombuffer(row["ids"], dtype=np.int64) for row in rows])
+            fresh = set(shown[~np.isin(shown, seen)].tolist())
+        current = next((np.frombuffer(row["ids"], dtype=np.int64) for row in rows if row["bucket"] == bucket), None)
+        # Un item toujours affiché reste vu: il rejoint la tranche courante
+        # (aucune écriture tant que la page ne montre rien de neuf pour la tranche)
+        if current is None or not np.isin(shown, current).all():
+            merged = shown if current is None else np.union1d(current, shown)
+            with conn:
+                conn.execute(
+                    "INSERT INTO seen_buckets (client, bucket, ids) VALUES (?, ?, ?) "
+                    "ON CONFLICT(client, bucket) DO UPDATE SET ids = excluded.ids",
+                    (client, bucket, merged.tobytes()),
+                )
+        return fresh
+
+
+SEEN = SeenTracker()
+
+
+def client_token():
+    """Jeton anonyme du navigateur (cookie) et s'il vient d'être créé."""
+    token = request.cookies.get(CLIENT_COOKIE, "")
+    if CLIENT_TOKEN_RE.match(token):
+        return token, False
+    return secrets.token_urlsafe(12), True
+
+
+def remember_client(response, token):
+    response.set_cookie(
+        CLIENT_COOKIE, token, max_age=CLIENT_COOKIE_MAX_AGE, httponly=True, samesite="Lax"
+    )
+
+
+def flag_new(card: str) -> str:
+    """Carte en cache marquée nouvelle (le fragment lui-même reste partagé)."""
+    return card.replace('class="item-card"', 'class="item-card new-item"', 1)
+
+
+# ---------- IMAGES ----------
+# Sources connues du proxy: empreinte -> URL du CDN (seules celles-ci sont servies);
+# au-delà de ce cache mémoire, la table SQLite `images` fait foi
+IMAGE_SOURCES = SelectionCache(max_entries=50000, max_bytes=32 * 1024 * 1024, ttl=float("inf"))
+IMAGE_DIGEST_RE = re.compile(r"^[0-9a-f]{20}$")
+# Une session requests par thread (requests.Session n'est pas sûre entre threads gthread)
+_IMAGE_LOCAL = threading.local()
+
+
+def image_session():
+    session = getattr(_IMAGE_LOCAL, "session", None)
+    if session is None:
+        session = _IMAGE_LOCAL.session = requests.Session()
+        session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; VintedWatch image proxy)"})
+    return session
+
+
+def image_digest(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+
+def image_url(source: str, width: int) -> str:
+    """URL du proxy pour une image du CDN à une largeur donnée ("" si pas d'image)."""
+    if not source:
+        return ""
+    return f"/img/{image_digest(source)}?w={width}"
+
+
+app.jinja_env.globals["image_url"] = image_url
+
+
+def register_images(items):
+    """Déclare au proxy les photos et avatars d'un lot d'items; retourne les lignes à stocker."""
+    rows = []
+    for it in items:
+        for source in (it.get("photo"), it.get("seller_avatar")):
+            if source:
+                digest = image_digest(source)
+                IMAGE_SOURCES.set(digest, source)
+                rows.append((digest, source))
+    return rows
+
+
+def image_source(digest: str):
+    source = IMAGE_SOURCES.get(digest)
+    if source is None:
+        try:
+            row = get_db().execute("SELECT url FROM images WHERE digest = ?", (digest,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is not None:
+            source = row["url"]
+            IMAGE_SOURCES.set(digest, source)
+    return source
+
+
+class DiskLRU:
+    """Fichiers d'un répertoire partagé entre workers, bornés en octets (LRU).
+
+    La récence d'un fichier est sa date de modification, remise à jour à
+    chaque lecture: tous les process voient le même ordre. Chaque process
+    estime l'occupation (dernier parcours + ses propres écritures); au-delà
+    de `max_bytes`, et périodiquement depuis le poller élu, sweep() parcourt
+    le répertoire et supprime les fichiers les moins récemment servis.
+    `sidecar(nom)` donne le fichier annexe d'une entrée (métadonnées .json):
+    il disparaît quand plus aucune entrée ne s'y rattache.
+    """
+
+    def __init__(self, directory, max_bytes, sidecar=None):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.sidecar = sidecar
+        self.bytes_used = 0
+        self.swept_at = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.sweep()
+
+    def _remove(self, name):
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+    def path(self, name) -> str:
+        return os.path.join(self.directory, name)
+
+    def touch(self, name):
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def write(self, name, data: bytes):
+        """Écrit un fichier atomiquement (fichier temporaire unique: sûr entre workers)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f"{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def add(self, name, data: bytes):
+        """Écrit une entrée puis, si le budget est dépassé, évince les moins récemment servies."""
+        self.write(name, data)
+        with self._lock:
+            self.bytes_used += len(data)
+            over = self.bytes_used > self.max_bytes
+        if over:
+            self.sweep()
+
+    def sweep(self):
+        """Recalcule l'occupation réelle du répertoire et le ramène sous le budget."""
+        entries = []
+        sidecars = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".webp"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, entry.name, st.st_size))
+                elif entry.name.endswith(".json"):
+                    sidecars.append(entry.name)
+                elif entry.name.endswith(".tmp"):
+                    # Écriture interrompue (process tué) depuis plus d'une heure
+                    try:
+                        if time.time() - entry.stat().st_mtime > 3600:
+                            self._remove(entry.name)
+                    except OSError:
+                        pass
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        evicted = 0
+        while len(entries) - evicted > 1 and total > self.max_bytes:
+            _, old_name, old_size = entries[evicted]
+            self._remove(old_name)
+            total -= old_size
+            evicted += 1
+        if self.sidecar is not None:
+            # Sans ses métadonnées, une vignette restante est retéléchargée au besoin
+            kept = {self.sidecar(name) for _, name, _ in entries[evicted:]}
+            for name in sidecars:
+                if name not in kept:
+                    self._remove(name)
+        with self._lock:
+            self.bytes_used = total
+            self.swept_at = time.monotonic()
+
+
+def image_meta_name(name) -> str:
+    """Fichier de métadonnées CDN (ETag...) commun aux vignettes d'une image."""
+    return f"{name.split('_', 1)[0]}.json"
+
+
+IMAGE_CACHE = DiskLRU(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, sidecar=image_meta_name)
+IMAGE_FLIGHTS = SingleFlight()
+
+
+def image_width_group(width: int):
+    for group in IMAGE_WIDTH_GROUPS:
+        if width in group:
+            return group
+    return None
+
+
+def make_thumbnail(data: bytes, width: int) -> bytes:
+    """Redimensionne (sans agrandir) et ré-encode une image en WebP."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=IMAGE_QUALITY, method=4)
+        return out.getvalue()
+
+
+def read_image_meta(digest):
+    try:
+        with open(os.path.join(IMAGE_CACHE_DIR, f"{digest}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_image_meta(digest, meta):
+    IMAGE_CACHE.write(f"{digest}.json", json.dumps(meta).encode("utf-8"))
+
+
+def fetch_image_variants(digest, source, group, meta):
+    """Télécharge l'image une fois et écrit toutes les vignettes de son groupe.
+
+    Si des vignettes existent déjà, la requête est conditionnelle: un 304
+    du CDN les prolonge sans retélécharger l'image.
+    """
+    names = [f"{digest}_{w}.webp" for w in group]
+    headers = {}
+    if meta and all(os.path.exists(IMAGE_CACHE.path(name)) for name in names):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = image_session().get(source, headers=headers, timeout=10)
+    if r.status_code == 304:
+        meta["checked_at"] = time.time()
+        write_image_meta(digest, meta)
+        return
+    r.raise_for_status()
+
+    for name, width in zip(names, group):
+        IMAGE_CACHE.add(name, make_thumbnail(r.content, width))
+    write_image_meta(digest, {
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "checked_at": time.time(),
+    })
+
+
+def get_image_variant(digest, source, width) -> str:
+    """Chemin de la vignette `width` d'une image, créée ou revalidée au besoin."""
+    name = f"{digest}_{width}.webp"
+    meta = read_image_meta(digest)
+    fresh = meta is not None and time.time() - meta.get("checked_at", 0) < IMAGE_REVALIDATE_AFTER
+    if not (fresh and os.path.exists(IMAGE_CACHE.path(name))):
+        group = image_width_group(width)
+        IMAGE_FLIGHTS.do(digest, lambda: fetch_image_variants(digest, source, group, meta))
+    IMAGE_CACHE.touch(name)
+    return IMAGE_CACHE.path(name)
+
+
+# ---------- WORKERS ----------
+def selection_token(key) -> str:
+    """Clé de sélection sérialisée pour la base partagée."""
+    return json.dumps(key, separators=(",", ":"))
+
+
+def parse_selection(token):
+    """Inverse de selection_token (les listes JSON redeviennent des tuples)."""
+    def as_tuple(value):
+        return tuple(as_tuple(v) for v in value) if isinstance(value, list) else value
+    return as_tuple(json.loads(token))
+
+
+def is_poller_leader() -> bool:
+    """Vrai si ce process est le poller élu (verrou de fichier exclusif, non bloquant).
+
+    Le verrou est libéré par le système à la mort du process: un autre worker
+    le prend alors au cycle suivant.
+    """
+    global LEADER_FILE
+    if not SHARED_SNAPSHOTS or LEADER_FILE is not None:
+        return True
+    f = open(POLLER_LOCK_PATH, "a+")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(f"{os.getpid()}\n")
+    f.flush()
+    LEADER_FILE = f
+    return True
+
+
+def become_leader():
+    """Prise de fonction du poller: versions dans la continuité, sessions chauffées,
+    statistiques de prix rechargées."""
+    global SNAPSHOT_VERSIONS
+    if SHARED_SNAPSHOTS:
+        row = get_db().execute("SELECT MAX(version) FROM snapshots").fetchone()
+        SNAPSHOT_VERSIONS = itertools.count((row[0] or 0) + 1)
+    FETCH_ENGINE.prewarm(sorted({upstream_base(domain) for domain in DOMAINS}))
+    PRICE_ANALYTICS.seed()
+
+
+def share_watch(key):
+    """Signale aux autres workers (et au poller élu) qu'une sélection est consultée."""
+    try:
+        db = get_db()
+        with db:
+            db.execute(
+                "INSERT INTO watched (selection, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(selection) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)",
+                (selection_token(key), time.time()),
+            )
+    except sqlite3.Error:
+        pass
+
+
+def share_snapshot(key, snapshot, changed: bool):
+    """Publie un snapshot dans la base partagée (items seulement s'ils ont changé)."""
+    token = selection_token(key)
+    fetched_at = snapshot["fetched_at"].timestamp()
+    try:
+        db = get_db()
+        with db:
+            if not changed:
+                db.execute(
+                    "UPDATE snapshots SET fetched_at = ? WHERE selection = ?", (fetched_at, token)
+                )
+                return
+            db.execute(
+                "INSERT INTO snapshots (selection, version, epoch, fetched_at, updated_at, items) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(selection) DO UPDATE SET "
+                "version = excluded.version, epoch = excluded.epoch, "
+                "fetched_at = excluded.fetched_at, updated_at = excluded.updated_at, "
+                "items = excluded.items",
+                (
+                    token,
+                    snapshot["version"],
+                    snapshot["epoch"],
+                    fetched_at,
+                    snapshot["updated_at"].timestamp(),
+                    json.dumps(
+                        [it.as_dict() for it in snapshot["items"]],
+                        separators=(",", ":"),
+                        ensure_ascii=False,
+                    ),
+                ),
+            )
+    except sqlite3.Error:
+        pass
+
+
+def merge_shared_watches():
+    """Poller élu: ajoute les sélections consultées via les autres workers.
+
+    Les sélections abandonnées (et leurs snapshots) sont purgées de la base.
+    """
+    db = get_db()
+    now = time.time()
+    with db:
+        db.execute("DELETE FROM watched WHERE last_seen < ?", (now - SELECTION_IDLE_TTL,))
+        db.execute("DELETE FROM snapshots WHERE selection NOT IN (SELECT selection FROM watched)")
+    rows = db.execute("SELECT selection, last_seen FROM watched").fetchall()
+
+    now_monotonic = time.monotonic()
+    with POLLER_LOCK:
+        for row in rows:
+            key = parse_selection(row["selection"])
+            last_seen = now_monotonic - max(0.0, now - row["last_seen"])
+            entry = WATCHED.get(key)
+            if entry is None:
+                WATCHED[key] = {"last_seen": last_seen, "next_poll": now_monotonic}
+            elif last_seen > entry["last_seen"]:
+                entry["last_seen"] = last_seen
+        trim_watched()
+
+
+def sync_snapshots():
+    """Workers non élus: recopie les snapshots publiés par le poller élu.
+
+    Seules les sélections dont la version a changé sont relues en entier;
+    les nouveautés sont poussées aux flux SSE de ce worker.
+    """
+    db = get_db()
+    rows = db.execute("SELECT selection, version, epoch, fetched_at FROM snapshots").fetchall()
+    current = set()
+    for row in rows:
+        key = parse_selection(row["selection"])
+        current.add(key)
+        with POLLER_LOCK:
+            local = SNAPSHOTS.get(key)
+            if local is not None and (local["epoch"], local["version"]) == (row["epoch"], row["version"]):
+                local["fetched_at"] = datetime.fromtimestamp(row["fetched_at"])
+                continue
+        full = db.execute(
+            "SELECT version, epoch, fetched_at, updated_at, items FROM snapshots WHERE selection = ?",
+            (row["selection"],),
+        ).fetchone()
+        if full is None:
+            continue
+        snapshot = {
+            "items": [Item(**fields) for fields in json.loads(full["items"])],
+            "fetched_at": datetime.fromtimestamp(full["fetched_at"]),
+            "updated_at": datetime.fromtimestamp(full["updated_at"]),
+            "version": full["version"],
+            "epoch": full["epoch"],
+        }
+        with POLLER_COND:
+            install_snapshot(key, snapshot, SNAPSHOTS.get(key))
+
+    now = time.monotonic()
+    with POLLER_LOCK:
+        for key in [key for key in SNAPSHOTS if key not in current]:
+            del SNAPSHOTS[key]
+        for key, entry in list(WATCHED.items()):
+            if now - entry["last_seen"] > SELECTION_IDLE_TTL:
+                del WATCHED[key]
+
+
+# ---------- POLLER ----------
+def watch_selection(selected_brands, filters=()):
+    """Déclare une sélection comme active pour le poller et retourne sa clé."""
+    key = selection_key(selected_brands, filters)
+    now = time.monotonic()
+    with POLLER_LOCK:
+        entry = WATCHED.get(key)
+        if entry is None:
+            entry = WATCHED[key] = {"last_seen": now, "next_poll": now, "shared_at": None}
+            trim_watched()
+            # Nouvelle sélection: on réveille le poller sans attendre son cycle
+            POLLER_WAKE.set()
+        else:
+            entry["last_seen"] = now
+        share = SHARED_SNAPSHOTS and (
+            entry.get("shared_at") is None or now - entry["shared_at"] > WATCH_SHARE_INTERVAL
+        )
+        if share:
+            entry["shared_at"] = now
+    if share:
+        share_watch(key)
+    return key
+
+
+def trim_watched():
+    """Borne WATCHED à WATCHED_MAX_SELECTIONS (appelé sous POLLER_LOCK).
+
+    Chaque URL distincte est une sélection interrogée en tâche de fond: sans
+    borne, un client pourrait multiplier la charge sur Vinted.
+    """
+    while len(WATCHED) > WATCHED_MAX_SELECTIONS:
+        oldest = min(WATCHED, key=lambda key: WATCHED[key]["last_seen"])
+        del WATCHED[oldest]
+        SNAPSHOTS.pop(oldest, None)
+
+
+def get_snapshot(selected_brands, wait: float = 0.0, filters=()):
+    """Retourne le dernier snapshot d'une sélection, sans jamais appeler Vinted.
+
+    Si la sélection est nouvelle, on attend au plus `wait` secondes que le
+    poller produise un premier snapshot. Retourne None s'il n'y en a pas encore.
+    """
+    key = watch_selection(selected_brands, filters)
+    with POLLER_COND:
+        POLLER_COND.wait_for(lambda: key in SNAPSHOTS, timeout=wait)
+        return SNAPSHOTS.get(key)
+
+
+def install_snapshot(key, snapshot, previous):
+    """Rend un snapshot visible et pousse ses nouveautés (appelé sous POLLER_COND)."""
+    SNAPSHOTS[key] = snapshot
+    POLLER_COND.notify_all()
+
+    mark = high_water_mark(previous["items"]) if previous else None
+    new_items = snapshot["items"] if mark is None else [
+        it for it in snapshot["items"] if item_sort_id(it) > mark
+    ]
+    if new_items:
+        broadcast_new_items(key, new_items)
+
+
+def publish_snapshot(key, items, previous):
+    """Enregistre le snapshot d'une sélection (appelé sous POLLER_COND).
+
+    La version ne change que si la liste d'items change, pour que l'ETag de
+    /api/items reste stable entre deux polls sans nouveauté.
+    """
+    now = datetime.now()
+    if previous is not None and [it.get("id") for it in items] == [it.get("id") for it in previous["items"]]:
+        previous["fetched_at"] = now
+        return previous
+    snapshot = {
+        "items": items,
+        "fetched_at": now,
+        "updated_at": now,
+        "version": next(SNAPSHOT_VERSIONS),
+        "epoch": SNAPSHOT_EPOCH,
+    }
+    install_snapshot(key, snapshot, previous)
+    return snapshot
+
+
+def poll_once():
+    """Rafraîchit les sélections arrivées à échéance.
+
+    Retourne le délai (secondes) avant la prochaine échéance.
+    """
+    if SHARED_SNAPSHOTS:
+        merge_shared_watches()
+    if time.monotonic() - IMAGE_CACHE.swept_at > IMAGE_SWEEP_INTERVAL:
+        try:
+            IMAGE_CACHE.sweep()
+        except OSError:
+            pass
+    subscriptions = watch_subscriptions()
+    now = time.monotonic()
+    with POLLER_LOCK:
+        for key, entry in list(WATCHED.items()):
+            if now - entry["last_seen"] > SELECTION_IDLE_TTL:
+                del WATCHED[key]
+                SNAPSHOTS.pop(key, None)
+        due = [key for key, entry in WATCHED.items() if entry["next_poll"] <= now]
+
+    for key in due:
+        try:
+            items = fetch_items(*key)
+        except Exception:
+            items = None
+
+        snapshot = None
+        with POLLER_COND:
+            previous = SNAPSHOTS.get(key)
+            # Un échec (ou une réponse vide) ne remplace pas un snapshot valide
+            if items or previous is None:
+                snapshot = publish_snapshot(key, items or [], previous)
+            entry = WATCHED.get(key)
+            if entry is not None:
+                entry["next_poll"] = time.monotonic() + POLL_INTERVAL
+        if snapshot is not None and SHARED_SNAPSHOTS:
+            share_snapshot(key, snapshot, changed=snapshot is not previous)
+        if snapshot is not None and key == subscriptions:
+            try:
+                SUBSCRIPTIONS.dispatch(snapshot["items"])
+            except sqlite3.Error:
+                pass
+
+    with POLLER_LOCK:
+        if not WATCHED:
+            return POLL_INTERVAL
+        next_poll = min(entry["next_poll"] for entry in WATCHED.values())
+    return max(0.0, next_poll - time.monotonic())
+
+
+def poller_loop():
+    leader = False
+    while True:
+        POLLER_WAKE.clear()
+        if not leader and is_poller_leader():
+            leader = True
+            try:
+                become_leader()
             except Exception:
-                sr = None
-            if sr is None:
-                seller_rating_display = str(seller_rating)
-                seller_stars = "—"
+                pass
+        try:
+            if leader:
+                delay = poll_once()
+                # Le poller élu relit aussi les sélections demandées aux autres workers
+                if SHARED_SNAPSHOTS:
+                    delay = min(delay, SHARED_SYNC_INTERVAL)
             else:
-                seller_rating_display = f"{sr:.1f}/5"
-                seller_stars = build_star_string(sr, max_stars=5)
-
-        items.append({
-            "title": title,
-            "price": price,
-            "size": size,
-            "url": url_item,
-            "photo": photo_url,
-            "seller_name": seller_name,
-            "seller_avatar": seller_avatar,
-            "seller_rating_display": seller_rating_display,
-            "seller_stars": seller_stars,
-        })
-
-    LAST_ITEMS = items
-    LAST_FETCH = datetime.now()
-    LAST_BRANDS = selected_brands
-    return items
+                sync_snapshots()
+                delay = SHARED_SYNC_INTERVAL
+        except Exception:
+            delay = POLL_INTERVAL if leader else SHARED_SYNC_INTERVAL
+        POLLER_WAKE.wait(timeout=delay)
+
+
+def start_poller():
+    """Démarre (une seule fois) le thread de polling en arrière-plan."""
+    global POLLER_THREAD
+    with POLLER_LOCK:
+        if POLLER_THREAD is not None and POLLER_THREAD.is_alive():
+            return POLLER_THREAD
+        POLLER_THREAD = threading.Thread(target=poller_loop, name="vinted-poller", daemon=True)
+        POLLER_THREAD.start()
+    return POLLER_THREAD
+
+
+# ---------- RECHERCHES ENREGISTRÉES ----------
+class Rule:
+    """Recherche enregistrée d'un client: marques, tailles, prix et mots-clés."""
+
+    __slots__ = (
+        "id", "watcher", "name", "brands", "sizes", "price_from", "price_to",
+        "words", "excluded",
+    )
+
+    def __init__(self, id, watcher, name, brands, sizes, price_from, price_to,
+                 search_text, exclude_text):
+        self.id = id
+        self.watcher = watcher
+        self.name = name
+        self.brands = frozenset(brands)
+        self.sizes = frozenset(sizes)
+        self.price_from = price_from
+        self.price_to = price_to
+        self.words = tuple(search_text.split())
+        self.excluded = tuple(exclude_text.split())
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            row["id"], row["watcher"], row["name"], json.loads(row["brands"]),
+            json.loads(row["sizes"]), row["price_from"], row["price_to"],
+            row["search_text"], row["exclude_text"],
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "brands": sorted(self.brands),
+            "sizes": sorted(self.sizes),
+            "price_from": self.price_from,
+            "price_to": self.price_to,
+            "search_text": " ".join(self.words),
+            "exclude_text": " ".join(self.excluded),
+        }
+
+    def text_ok(self, title: str) -> bool:
+        """Mots-clés: tous présents dans le titre, aucun mot exclu."""
+        return all(w in title for w in self.words) and not any(w in title for w in self.excluded)
+
+    def price_ok(self, amount) -> bool:
+        if self.price_from is None and self.price_to is None:
+            return True
+        return amount is not None and (
+            (self.price_from is None or amount >= self.price_from)
+            and (self.price_to is None or amount <= self.price_to)
+        )
+
+    def accepts(self, it) -> bool:
+        """Test complet, sans index (rattrapage d'une règle qui vient d'être créée)."""
+        if self.brands and it.brand_id not in self.brands:
+            return False
+        if self.sizes and str(it.size or "").lower() not in self.sizes:
+            return False
+        return self.price_ok(it.price_amount) and self.text_ok(str(it.title or "").lower())
+
+
+class IntervalTree:
+    """Arbre d'intervalles centré, statique: quelles valeurs ont un [low, high] contenant x.
+
+    Une requête coûte O(log n + k) pour k intervalles trouvés.
+    """
+
+    __slots__ = ("center", "by_low", "by_high", "left", "right")
+
+    def __init__(self, intervals):
+        """`intervals`: liste non vide de (low, high, valeur)."""
+        bounds = sorted(b for low, high, _ in intervals for b in (low, high))
+        self.center = center = bounds[len(bounds) // 2]
+        left = [iv for iv in intervals if iv[1] < center]
+        right = [iv for iv in intervals if iv[0] > center]
+        here = [iv for iv in intervals if iv[0] <= center <= iv[1]]
+        self.by_low = sorted(((low, value) for low, _, value in here), key=lambda p: p[0])
+        self.by_high = sorted(((high, value) for _, high, value in here), key=lambda p: -p[0])
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, x):
+        found = []
+        node = self
+        while node is not None:
+            if x < node.center:
+                for low, value in node.by_low:
+                    if low > x:
+                        break
+                    found.append(value)
+                node = node.left
+            elif x > node.center:
+                for high, value in node.by_high:
+                    if high < x:
+                        break
+                    found.append(value)
+                node = node.right
+            else:
+                found.extend(value for _, value in node.by_low)
+                break
+        return found
+
+
+EMPTY_RULES = frozenset()
+
+
+class RuleIndex:
+    """Index inversés des règles: marque -> règles, taille -> règles, arbre des prix.
+
+    Une règle sans contrainte sur un critère va dans l'ensemble "any" de ce
+    critère. Le coût d'un match suit le nombre de règles candidates, pas le
+    nombre total de règles.
+    """
+
+    def __init__(self, rules):
+        self.rules = {rule.id: rule for rule in rules}
+        self.by_brand, self.any_brand = {}, set()
+        self.by_size, self.any_size = {}, set()
+        self.any_price = set()
+        intervals = []
+        for rule in rules:
+            for brand in rule.brands:
+                self.by_brand.setdefault(brand, set()).add(rule.id)
+            if not rule.brands:
+                self.any_brand.add(rule.id)
+            for size in rule.sizes:
+                self.by_size.setdefault(size, set()).add(rule.id)
+            if not rule.sizes:
+                self.any_size.add(rule.id)
+            if rule.price_from is None and rule.price_to is None:
+                self.any_price.add(rule.id)
+            else:
+                low = rule.price_from if rule.price_from is not None else float("-inf")
+                high = rule.price_to if rule.price_to is not None else float("inf")
+                # Un intervalle vide ne contient aucun prix: la règle n'est jamais candidate
+                if low <= high:
+                    intervals.append((low, high, rule.id))
+        self.prices = IntervalTree(intervals) if intervals else None
+        self.priced = len(intervals)
+
+    def candidates(self, it):
+        """Règles compatibles avec la marque, la taille et le prix d'un item."""
+        dimensions = [
+            (self.by_brand.get(it.brand_id, EMPTY_RULES), self.any_brand),
+            (self.by_size.get(str(it.size or "").lower(), EMPTY_RULES), self.any_size),
+        ]
+        # On part du critère le plus sélectif, l'autre ne fait que filtrer
+        dimensions.sort(key=lambda d: len(d[0]) + len(d[1]))
+        (hits, wildcard), (other_hits, other_wildcard) = dimensions
+        found = {r for r in hits | wildcard if r in other_hits or r in other_wildcard}
+        if not found:
+            return found
+
+        amount = it.price_amount
+        if len(found) > self.priced:
+            # Beaucoup de candidates: l'arbre donne d'un coup les règles dont
+            # l'intervalle contient le prix (au plus `priced`)
+            inside = set(self.prices.stab(amount)) if amount is not None and self.prices else set()
+            return {r for r in found if r in self.any_price or r in inside}
+        rules = self.rules
+        return {r for r in found if rules[r].price_ok(amount)}
+
+    def match(self, it):
+        """IDs des règles qu'un item satisfait."""
+        found = self.candidates(it)
+        if not found:
+            return []
+        RULE_CANDIDATES.inc(amount=len(found))
+        title = str(it.title or "").lower()
+        return [r for r in found if self.rules[r].text_ok(title)]
+
+    def brands(self):
+        """Union des marques à récupérer (toutes si une règle n'en précise aucune)."""
+        if self.any_brand or not self.rules:
+            return set(AVAILABLE_BRANDS) if self.rules else set()
+        return set(self.by_brand)
+
+
+class SubscriptionEngine:
+    """Sert toutes les recherches enregistrées depuis le poller élu.
+
+    Les règles sont relues en base quand elles changent; l'union de leurs
+    marques est une sélection comme une autre, rafraîchie par le poller. Chaque
+    nouvel item de cette sélection passe une fois dans l'index, et ses règles
+    reçoivent l'item dans leur flux (table rule_matches).
+    """
+
+    def __init__(self):
+        self.index = RuleIndex([])
+        self.signature = None
+        self.key = None
+        self.mark = None
+        self.pending = set()  # règles créées depuis le dernier cycle: rattrapage
+        self.purged_at = 0.0
+
+    def reload(self):
+        """Relit les règles si la table a changé; retourne la clé de l'union (ou None)."""
+        db = get_db()
+        signature = tuple(db.execute("SELECT COUNT(*), MAX(id) FROM rules").fetchone())
+        if signature != self.signature:
+            rules = [Rule.from_row(row) for row in db.execute("SELECT * FROM rules")]
+            self.pending |= {rule.id for rule in rules} - set(self.index.rules)
+            self.index = RuleIndex(rules)
+            self.signature = signature
+            brands = self.index.brands()
+            key = selection_key(brands) if brands else None
+            # L'ancienne union n'est plus rafraîchie par watch_subscriptions: elle
+            # expire après SELECTION_IDLE_TTL, sauf si un visiteur la consulte
+            self.key = key
+        return self.key
+
+    def dispatch(self, items):
+        """Envoie les nouveaux items de l'union dans les flux des règles qu'ils satisfont."""
+        mark = self.mark
+        fresh = items if mark is None else [it for it in items if item_sort_id(it) > mark]
+        now = time.time()
+        matches = {}
+        for it in fresh:
+            for rule_id in self.index.match(it):
+                matches[(rule_id, it.id)] = self.index.rules[rule_id].watcher
+        for rule_id in self.pending & set(self.index.rules):
+            rule = self.index.rules[rule_id]
+            for it in items:
+                if rule.accepts(it):
+                    matches[(rule_id, it.id)] = rule.watcher
+        self.pending.clear()
+        if items:
+            self.mark = max(high_water_mark(items), mark or 0)
+
+        db = get_db()
+        with db:
+            if now - self.purged_at > RULE_MATCHES_PURGE_INTERVAL:
+                self.purged_at = now
+                db.execute("DELETE FROM rule_matches WHERE matched_at < ?", (now - RULE_MATCHES_MAX_AGE,))
+            db.executemany(
+                "INSERT OR IGNORE INTO rule_matches (rule_id, item_id, watcher, matched_at) VALUES (?, ?, ?, ?)",
+                [(rule_id, item_id, watcher, now) for (rule_id, item_id), watcher in matches.items()],
+            )
+        RULE_MATCHES.inc(amount=len(matches))
+        return matches
+
+
+SUBSCRIPTIONS = SubscriptionEngine()
+
+
+def watch_subscriptions():
+    """Poller élu: garde l'union des recherches enregistrées parmi les sélections actives."""
+    try:
+        key = SUBSCRIPTIONS.reload()
+    except sqlite3.Error:
+        return None
+    if key is not None:
+        watch_selection(*key)
+    return key
+
+
+def parse_rule(data):
+    """Valide le JSON d'une règle; lève ValueError avec un message lisible."""
+    if not isinstance(data, dict):
+        raise ValueError("objet JSON attendu")
+
+    def id_list(name):
+        value = data.get(name) or []
+        if isinstance(value, str):
+            value = value.split(",")
+        ids = {str(v).strip() for v in value if str(v).strip()}
+        if not all(i.isdigit() for i in ids):
+            raise ValueError(f"{name}: IDs numériques attendus")
+        return sorted(ids)
+
+    def price(name):
+        value = data.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            value = float(str(value).replace(",", "."))
+        except ValueError:
+            raise ValueError(f"{name}: nombre attendu") from None
+        if value < 0:
+            raise ValueError(f"{name}: doit être positif")
+        return value
+
+    def text(name):
+        return " ".join(str(data.get(name) or "").lower().split())
+
+    sizes = data.get("sizes") or []
+    if isinstance(sizes, str):
+        sizes = sizes.split(",")
+    rule = {
+        "name": str(data.get("name") or "").strip()[:80],
+        "brands": id_list("brands"),
+        "sizes": sorted({str(v).strip().lower() for v in sizes if str(v).strip()}),
+        "price_from": price("price_from"),
+        "price_to": price("price_to"),
+        "search_text": text("search_text"),
+        "exclude_text": text("exclude_text"),
+    }
+    if rule["price_from"] is not None and rule["price_to"] is not None and rule["price_from"] > rule["price_to"]:
+        raise ValueError("price_from > price_to")
+    if not (rule["brands"] or rule["sizes"] or rule["search_text"]
+            or rule["price_from"] is not None or rule["price_to"] is not None):
+        raise ValueError("règle vide: au moins une marque, taille, borne de prix ou mot-clé")
+    return rule
+
+
+def watcher_rules(watcher):
+    rows = get_db().execute("SELECT * FROM rules WHERE watcher = ? ORDER BY id", (watcher,)).fetchall()
+    return [Rule.from_row(row) for row in rows]
+
+
+def create_rule(watcher, rule) -> Rule:
+    db = get_db()
+    with db:
+        count = db.execute("SELECT COUNT(*) FROM rules WHERE watcher = ?", (watcher,)).fetchone()[0]
+        if count >= RULES_MAX_PER_WATCHER:
+            raise ValueError(f"au plus {RULES_MAX_PER_WATCHER} recherches enregistrées")
+        cur = db.execute(
+            "INSERT INTO rules (watcher, name, brands, sizes, price_from, price_to, search_text, "
+            "exclude_text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (watcher, rule["name"], json.dumps(rule["brands"]), json.dumps(rule["sizes"]),
+             rule["price_from"], rule["price_to"], rule["search_text"], rule["exclude_text"],
+             time.time()),
+        )
+    # Le poller de ce process (s'il est élu) prend la règle sans attendre son cycle
+    POLLER_WAKE.set()
+    return Rule(cur.lastrowid, watcher, rule["name"], rule["brands"], rule["sizes"],
+                rule["price_from"], rule["price_to"], rule["search_text"], rule["exclude_text"])
+
+
+def delete_rule(watcher, rule_id) -> bool:
+    db = get_db()
+    with db:
+        deleted = db.execute("DELETE FROM rules WHERE id = ? AND watcher = ?", (rule_id, watcher)).rowcount
+        if deleted:
+            db.execute("DELETE FROM rule_matches WHERE rule_id = ?", (rule_id,))
+    return bool(deleted)
+
+
+def watcher_feed(watcher, since_id=None, limit=50):
+    """Items trouvés pour un client, du plus récent au plus ancien, avec leurs règles."""
+    clauses, params = ["m.watcher = ?"], [watcher]
+    if since_id is not None:
+        clauses.append("m.item_id > ?")
+        params.append(since_id)
+    sql = (
+        "SELECT i.*, GROUP_CONCAT(m.rule_id) AS rule_ids, MIN(m.matched_at) AS matched_at "
+        "FROM rule_matches m JOIN items i ON i.id = m.item_id "
+        f"WHERE {' AND '.join(clauses)} GROUP BY m.item_id ORDER BY m.item_id DESC LIMIT ?"
+    )
+    feed = []
+    for row in get_db().execute(sql, params + [limit]).fetchall():
+        entry = dict(row)
+        entry["rules"] = [int(r) for r in entry.pop("rule_ids").split(",")]
+        feed.append(entry)
+    return feed
+
+
+# ---------- STREAM ----------
+def subscribe_stream(key):
+    q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with STREAMS_LOCK:
+        STREAMS.setdefault(key, set()).add(q)
+    return q
+
+
+def unsubscribe_stream(key, q):
+    with STREAMS_LOCK:
+        subscribers = STREAMS.get(key)
+        if subscribers is not None:
+            subscribers.discard(q)
+            if not subscribers:
+                del STREAMS[key]
+
+
+def broadcast_new_items(key, new_items):
+    """Pousse les nouveaux items d'une sélection vers ses clients SSE."""
+    with STREAMS_LOCK:
+        subscribers = list(STREAMS.get(key, ()))
+    for q in subscribers:
+        try:
+            q.put_nowait(new_items)
+        except queue.Full:
+            # Client trop lent: il rattrapera via Last-Event-ID à la reconnexion
+            pass
+
+
+def format_items_event(items) -> str:
+    """Événement SSE "items": cartes HTML (marquées nouvelles) prêtes à insérer, id = plus récent item."""
+    payload = {"items": [{"id": it.get("id"), "html": flag_new(render_item_card(it))} for it in items]}
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return f"event: items\nid: {high_water_mark(items)}\ndata: {data}\n\n"
+
+
+def card_cache_key(it):
+    """Clé du fragment HTML d'un item: son ID et un hash des champs affichés."""
+    return it.get("id"), hash(tuple(it.get(field) for field in CARD_FIELDS))
+
+
+def render_item_card(it) -> str:
+    """Carte HTML d'un item, rendue une seule fois tant que son contenu ne change pas."""
+    key = card_cache_key(it)
+    html = CARD_CACHE.get(key)
+    if html is None:
+        started = time.perf_counter()
+        html = CARD_TEMPLATE.render(it=it)
+        RENDER_SECONDS.observe(time.perf_counter() - started, "card")
+        CARD_CACHE.set(key, html)
+    return html
+
+
+def render_page(**context) -> str:
+    """Rend la page précompilée avec le contexte Flask habituel (request, config...)."""
+    app.update_template_context(context)
+    return PAGE_TEMPLATE.render(context)
+
+
+def requested_brands():
+    """Marques demandées en GET (?brands=a&brands=b ou ?brands=a,b), toutes par défaut."""
+    selected_brands = [
+        brand_id
+        for value in request.args.getlist('brands')
+        for brand_id in value.split(",")
+        if brand_id in AVAILABLE_BRANDS
+    ]
+    # Si aucune marque n'est sélectionnée, utiliser toutes les marques par défaut
+    return selected_brands or list(AVAILABLE_BRANDS.keys())
+
+
+def requested_filters():
+    """Filtres demandés en GET (prix, tailles, catégories, état, mots-clés)."""
+    return parse_filters(request.args)
 
 
 @app.route("/")
 def index():
     # Récupérer les marques sélectionnées depuis les paramètres GET
-    selected_brands = request.args.getlist('brands')
-    
-    # Si aucune marque n'est sélectionnée, utiliser toutes les marques par défaut
-    if not selected_brands:
-        selected_brands = list(AVAILABLE_BRANDS.keys())
-    
-    items = fetch_items(selected_brands)
-    refresh_time = datetime.now().strftime("%H:%M:%S")
+    selected_brands = requested_brands()
+    filters = requested_filters()
     
-    return render_template_string(
-        HTML_TEMPLATE, 
+    # On lit uniquement le snapshot du poller: la latence de Vinted
+    # (et ses pauses anti-403) ne retombe plus sur le visiteur
+    started = time.perf_counter()
+    snapshot = get_snapshot(selected_brands, wait=FIRST_SNAPSHOT_WAIT, filters=filters)
+    items = snapshot["items"] if snapshot else []
+    refresh_time = snapshot["fetched_at"].strftime("%H:%M:%S") if snapshot else "—"
+    snapshot_ms = (time.perf_counter() - started) * 1000
+
+    # Le serveur sait ce que ce navigateur a déjà vu: pas de diff côté client
+    # (rien n'est gardé pour un jeton tout neuf: il ne compte qu'une fois renvoyé par le cookie)
+    client, issued = client_token()
+    fresh = SEEN.mark(client, [it.get("id") for it in items]) if items and not issued else None
+
+    # Seules les cartes nouvelles ou modifiées sont rendues, les autres viennent du cache
+    started = time.perf_counter()
+    cards = [render_item_card(it) for it in items]
+    if fresh:
+        cards = [flag_new(card) if it.get("id") in fresh else card for it, card in zip(items, cards)]
+    html = render_page(
         items=items, 
+        cards=cards,
+        ready=snapshot is not None,
+        first_visit=bool(items) and fresh is None,
+        feed_limit=feed_limit(selection_key(selected_brands)[0]),
         refresh_time=refresh_time, 
         cache_ttl=CACHE_TTL,
         available_brands=AVAILABLE_BRANDS,
-        selected_brands=selected_brands
+        selected_brands=selected_brands,
+        filters=dict(filters),
+        status_choices=STATUS_CHOICES,
+    )
+    render_ms = (time.perf_counter() - started) * 1000
+    RENDER_SECONDS.observe(render_ms / 1000, "page")
+
+    response = Response(html, mimetype="text/html")
+    if issued:
+        remember_client(response, client)
+    response.headers["Server-Timing"] = f"snapshot;dur={snapshot_ms:.1f}, render;dur={render_ms:.1f}"
+    return response
+
+
+@app.route("/api/items")
+def api_items():
+    """Items normalisés du snapshot en JSON compact.
+
+    ETag fort dérivé de la version du snapshot (304 sur If-None-Match) et
+    paramètre `since_id` pour ne recevoir que les items plus récents.
+    """
+    selected_brands = requested_brands()
+    filters = requested_filters()
+    since_id = request.args.get("since_id", type=int)
+
+    snapshot = get_snapshot(selected_brands, wait=FIRST_SNAPSHOT_WAIT, filters=filters)
+    if snapshot is None:
+        body = json.dumps({"error": "snapshot pending"}, separators=(",", ":"))
+        return Response(body, status=503, mimetype="application/json", headers={"Retry-After": "2"})
+
+    etag = f"{snapshot['epoch']}-{snapshot['version']}"
+    if since_id is not None:
+        etag += f"-{since_id}"
+    # Le corps compressé porte l'ETag suffixé de son encodage (compress_response)
+    matched = next(
+        (tag for tag in (etag, f"{etag}-br", f"{etag}-gzip") if request.if_none_match.contains(tag)),
+        None,
+    )
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+        return response
+
+    items = snapshot["items"]
+    if since_id is not None:
+        items = [it for it in items if item_sort_id(it) > since_id]
+
+    body = json.dumps(
+        {
+            "version": snapshot["version"],
+            "updated_at": snapshot["updated_at"].isoformat(timespec="seconds"),
+            "items": [it.as_dict() for it in items],
+        },
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Le client doit toujours revalider (If-None-Match), la réponse change à chaque nouveauté
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/api/rules", methods=["GET", "POST"])
+def api_rules():
+    """Recherches enregistrées du navigateur (cookie client): liste, ou création en JSON."""
+    watcher, issued = client_token()
+    status = 200
+    if request.method == "POST":
+        try:
+            rule = create_rule(watcher, parse_rule(request.get_json(silent=True)))
+        except ValueError as exc:
+            body = json.dumps({"error": str(exc)}, separators=(",", ":"), ensure_ascii=False)
+            return Response(body, status=400, mimetype="application/json")
+        payload, status = rule.as_dict(), 201
+    else:
+        payload = {"rules": [rule.as_dict() for rule in watcher_rules(watcher)]}
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    response = Response(body, status=status, mimetype="application/json",
+                        headers={"Cache-Control": "no-store"})
+    if issued:
+        remember_client(response, watcher)
+    return response
+
+
+@app.route("/api/rules/<int:rule_id>", methods=["DELETE"])
+def api_delete_rule(rule_id):
+    watcher, _ = client_token()
+    if not delete_rule(watcher, rule_id):
+        abort(404)
+    return Response(status=204)
+
+
+@app.route("/api/feed")
+def api_feed():
+    """Items trouvés par les recherches enregistrées du navigateur (`since_id`, `limit`)."""
+    watcher, _ = client_token()
+    since_id = request.args.get("since_id", type=int)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), FEED_MAX_LIMIT)
+    body = json.dumps(
+        {"items": watcher_feed(watcher, since_id, limit)}, separators=(",", ":"), ensure_ascii=False
     )
+    return Response(body, mimetype="application/json", headers={"Cache-Control": "no-store"})
+
+
+def requested_search():
+    """Paramètres de recherche: (texte, heures ou None, page)."""
+    text = " ".join(request.args.get("q", "").split())[:200]
+    hours = request.args.get("hours", type=float)
+    page = max(request.args.get("page", 1, type=int), 1)
+    return text, hours if hours and hours > 0 else None, page
+
+
+@app.route("/search")
+def search_page():
+    """Recherche dans les annonces déjà vues, rendue avec les cartes du flux."""
+    text, hours, page = requested_search()
+    items, has_more = search_items(text, hours, page) if text else ([], False)
+    html = render_page(
+        items=items,
+        cards=[render_item_card(it) for it in items],
+        search={"query": text, "hours": hours and int(hours), "page": page, "has_more": has_more},
+        refresh_time="—",
+        cache_ttl=CACHE_TTL,
+        available_brands=AVAILABLE_BRANDS,
+        selected_brands=[],
+        filters={},
+        status_choices=STATUS_CHOICES,
+    )
+    return Response(html, mimetype="text/html")
+
+
+@app.route("/api/search")
+def api_search():
+    """Recherche plein texte paginée (`q`, `hours`, `page`, `per_page`), classée par pertinence."""
+    text, hours, page = requested_search()
+    per_page = min(max(request.args.get("per_page", SEARCH_PER_PAGE, type=int), 1), SEARCH_MAX_PER_PAGE)
+    items, has_more = search_items(text, hours, page, per_page)
+    body = json.dumps(
+        {"query": text, "page": page, "per_page": per_page, "has_more": has_more, "items": items},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return Response(body, mimetype="application/json", headers={"Cache-Control": "no-store"})
+
+
+def analytics_rows(dimension):
+    return [r for r in price_rollups(dimension) if r["count"] >= ANALYTICS_MIN_COUNT]
+
+
+@app.route("/analytics")
+def analytics_page():
+    """Statistiques de prix précalculées (quantiles, rythme de publication)."""
+    started = time.perf_counter()
+    context = {
+        "brands": analytics_rows("brand"),
+        "sizes": analytics_rows("size"),
+        "window_days": ANALYTICS_WINDOW // 86400,
+        "min_count": ANALYTICS_MIN_COUNT,
+        "format_amount": format_amount,
+    }
+    app.update_template_context(context)
+    html = ANALYTICS_PAGE_TEMPLATE.render(context)
+    RENDER_SECONDS.observe(time.perf_counter() - started, "analytics")
+    return Response(html, mimetype="text/html")
+
+
+@app.route("/api/analytics")
+def api_analytics():
+    """Rollups de prix par marque et par taille, en JSON."""
+    body = json.dumps(
+        {
+            "window_days": ANALYTICS_WINDOW // 86400,
+            "brands": price_rollups("brand"),
+            "sizes": price_rollups("size"),
+        },
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return Response(body, mimetype="application/json", headers={"Cache-Control": "no-store"})
+
+
+@app.route("/api/limiter")
+def api_limiter():
+    """État du limiteur sortant par hôte (débit courant, pauses, disjoncteur)."""
+    body = json.dumps({"hosts": FETCH_ENGINE.limiter_state()}, separators=(",", ":"))
+    return Response(body, mimetype="application/json", headers={"Cache-Control": "no-store"})
+
+
+@app.route("/api/sessions")
+def api_sessions():
+    """Pools de sessions par hôte: âge, prochain renouvellement et santé."""
+    body = json.dumps({"pools": FETCH_ENGINE.session_state()}, separators=(",", ":"))
+    return Response(body, mimetype="application/json", headers={"Cache-Control": "no-store"})
+
+
+@app.route("/metrics")
+def metrics():
+    """Métriques au format texte Prometheus (fetch, caches, normalisation, rendu)."""
+    return Response(
+        render_metrics(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@app.route("/assets/<filename>")
+def asset(filename):
+    """Assets versionnés: cache navigateur d'un an, variantes précompressées."""
+    entry = ASSETS_BY_FILENAME.get(filename)
+    if entry is None:
+        abort(404)
+    encoding = negotiate_encoding()
+    response = Response(entry[encoding or "identity"], mimetype=entry["mimetype"])
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.set_etag(entry["etag"] if encoding is None else f"{entry['etag']}-{encoding}")
+    return response.make_conditional(request)
+
+
+@app.after_request
+def compress_response(response):
+    """Compresse à la volée les réponses HTML et JSON (hors flux SSE)."""
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=5))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    # Un ETag fort désigne des octets précis: chaque encodage a le sien (comme /assets)
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+@app.route("/img/<digest>")
+def image_proxy(digest):
+    """Vignette locale d'une photo ou d'un avatar Vinted (?w= largeur servie)."""
+    width = request.args.get("w", type=int)
+    if not IMAGE_DIGEST_RE.match(digest) or image_width_group(width) is None:
+        abort(404)
+    source = image_source(digest)
+    if source is None:
+        abort(404)
+    try:
+        path = get_image_variant(digest, source, width)
+    except Exception:
+        # Mode dégradé: le navigateur charge l'image directement depuis le CDN
+        return redirect(source)
+    return send_file(path, mimetype="image/webp", max_age=IMAGE_MAX_AGE, conditional=True)
+
+
+@app.route("/stream")
+def stream():
+    """Flux Server-Sent Events des nouvelles annonces d'une sélection.
+
+    Remplace le rechargement complet de la page toutes les 25 s: seuls les
+    items découverts par le poller sont poussés, sous forme de cartes HTML.
+    Au-delà de STREAM_MAX_CLIENTS connexions sur ce worker, répond 204: le
+    navigateur cesse de se reconnecter et revient au rechargement périodique.
+    """
+    selected_brands = requested_brands()
+    filters = requested_filters()
+    key = watch_selection(selected_brands, filters)
+    client, anonymous = client_token()
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    if last_id is None:
+        last_id = request.args.get("since_id", type=int)
+    if not STREAM_SLOTS.acquire(blocking=False):
+        STREAMS_REJECTED.inc()
+        return Response(status=204)
+
+    def events():
+        q = subscribe_stream(key)
+        try:
+            yield "retry: 5000\n\n"
+            # Rattrapage des items publiés depuis le dernier reçu par le client
+            if last_id is not None:
+                with POLLER_LOCK:
+                    snapshot = SNAPSHOTS.get(key)
+                missed = [it for it in snapshot["items"] if item_sort_id(it) > last_id] if snapshot else []
+                if missed:
+                    if not anonymous:
+                        SEEN.mark(client, [it.get("id") for it in missed])
+                    yield format_items_event(missed)
+            while True:
+                try:
+                    new_items = q.get(timeout=STREAM_HEARTBEAT)
+                except queue.Empty:
+                    # Garde la sélection active côté poller tant que le client écoute
+                    watch_selection(selected_brands, filters)
+                    yield ": ping\n\n"
+                    continue
+                # Insérés en direct: nouveaux pour cette page, et déjà vus au prochain chargement
+                if not anonymous:
+                    SEEN.mark(client, [it.get("id") for it in new_items])
+                yield format_items_event(new_items)
+        finally:
+            unsubscribe_stream(key, q)
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Libéré à la fermeture de la réponse, même si le générateur n'a jamais démarré
+    response.call_on_close(STREAM_SLOTS.release)
+    return response
+
+
+# Le poller démarre avec l'application (import par gunicorn ou lancement direct)
+start_poller()
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 10000))
     app.run(host="0.0.0.0", port=port, debug=False)
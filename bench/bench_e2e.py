@@ -0,0 +1,136 @@
+"""Benchmark de bout en bout : `/` servi par l'app, Vinted remplacé par mock_vinted.
+
+Usage : python bench/bench_e2e.py [--duration 5] [--concurrency 8] [--scenario clean]
+
+Pour chaque scénario (Vinted sain, lent, 403, JSON invalide) :
+- fetch/<scénario>      : récupération complète d'une sélection (shards, retries)
+- first_page/<scénario> : premier affichage d'une sélection encore jamais vue
+- page/<scénario>       : latence de `/` sous charge, et page_rps/<scénario> le débit
+Les résultats sont écrits dans bench/results/e2e-<commit>.json.
+"""
+import argparse
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+
+import requests
+from werkzeug.serving import make_server
+
+import mock_vinted
+from common import prepare, print_results, save_results, summarize, unthrottle
+
+MOCK = mock_vinted.start(seed=1)
+prepare(MOCK.base_url)
+
+import app  # noqa: E402
+import corpus  # noqa: E402
+
+unthrottle(app)
+
+SCENARIOS = {
+    "clean": {},
+    "latency": {"latency": 0.15, "jitter": 0.1},
+    "forbidden": {"forbidden_rate": 0.2},
+    "bad_json": {"bad_json_rate": 0.2},
+}
+
+
+def selections():
+    """Sélections de marques toujours nouvelles : chaque scénario part à froid."""
+    brands = sorted(corpus.BRANDS)
+    for size in itertools.count(2):
+        for combo in itertools.combinations(brands, size):
+            yield list(combo)
+
+
+def page_url(base, brands):
+    return f"{base}/?" + "&".join(f"brands={b}" for b in brands)
+
+
+def load(url, duration, concurrency):
+    """`concurrency` clients en keep-alive pendant `duration` secondes."""
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        local, local_statuses = [], Counter()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            r = session.get(url, headers={"Accept-Encoding": "gzip, br"})
+            local.append(time.perf_counter() - started)
+            local_statuses[r.status_code] += 1
+        with lock:
+            latencies.extend(local)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_scenario(name, options, base, brands, args, results, meta):
+    MOCK.config.scenario(**options)
+    MOCK.config.statuses.clear()
+
+    samples = []
+    for _ in range(args.fetches):
+        started = time.perf_counter()
+        app.FETCH_ENGINE.run(app.fetch_raw_items(brands))
+        samples.append(time.perf_counter() - started)
+    results[f"fetch/{name}"] = summarize(samples)
+
+    started = time.perf_counter()
+    requests.get(page_url(base, brands))
+    results[f"first_page/{name}"] = summarize([time.perf_counter() - started])
+
+    latencies, statuses, elapsed = load(page_url(base, brands), args.duration, args.concurrency)
+    results[f"page/{name}"] = summarize(latencies)
+    results[f"page_rps/{name}"] = {
+        "unit": "req/s", "better": "higher", "value": len(latencies) / elapsed,
+        "n": len(latencies),
+    }
+    meta[name] = {
+        "options": options,
+        "page_statuses": dict(statuses),
+        "upstream_statuses": dict(MOCK.config.statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="charge par scénario (s)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fetches", type=int, default=10, help="récupérations par scénario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    results, meta = {}, {}
+    brand_sets = selections()
+    for name in args.scenario or SCENARIOS:
+        run_scenario(name, SCENARIOS[name], base, next(brand_sets), args, results, meta)
+    server.shutdown()
+    app.FETCH_ENGINE.close()
+
+    print_results(results)
+    if not args.no_save:
+        print("→", save_results(
+            "e2e", results, scenarios=meta,
+            duration=args.duration, concurrency=args.concurrency,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Micro-benchmarks : normalisation, formatage, rendu des cartes et de la page.
+
+Usage : python bench/bench_micro.py [--filter normalize] [--repeat 7] [--no-save]
+
+Chaque mesure est la durée médiane d'un appel ; les résultats sont écrits
+dans bench/results/micro-<commit>.json (voir compare.py).
+"""
+import argparse
+import json
+
+from common import prepare, print_results, save_results, time_call
+
+prepare()
+
+import app  # noqa: E402
+import corpus  # noqa: E402
+
+
+def clear_normalizer_caches():
+    app.SELLER_CACHE = app.SelectionCache(
+        app.SELLER_CACHE_MAX_ENTRIES, app.SELLER_CACHE_MAX_BYTES, app.SELLER_CACHE_TTL
+    )
+    app.rating_fields.cache_clear()
+    app.price_display.cache_clear()
+
+
+def benchmarks(fixtures):
+    """nom -> fonction sans argument à mesurer."""
+    cases = {}
+
+    for name, data in fixtures.items():
+        raw = data.get("items", [])
+        body = json.dumps(data)
+        cases[f"normalize/{name}"] = lambda raw=raw: app.normalize_items(raw)
+        cases[f"parse_json/{name}"] = lambda body=body: json.loads(body)
+
+    raw = fixtures["catalog_50"]["items"]
+
+    def normalize_cold():
+        clear_normalizer_caches()
+        app.normalize_items(raw)
+    cases["normalize_cold/catalog_50"] = normalize_cold
+
+    cases["format_price/dict"] = lambda: app.format_price({"amount": "25.0", "currency_code": "EUR"})
+    cases["format_price/str"] = lambda: app.format_price("1 234,50 €")
+    cases["format_price/numeric"] = lambda: app.format_price(None, "25.0", "EUR")
+    cases["format_price/invalid"] = lambda: app.format_price("prix libre")
+    cases["build_star_string/half"] = lambda: app.build_star_string(4.5)
+    cases["build_star_string/invalid"] = lambda: app.build_star_string("n/a")
+
+    items = app.normalize_items(corpus.all_items(fixtures))[:app.MERGED_LIMIT]
+    brands = sorted(corpus.BRANDS)
+    card = items[0]
+    cases["render_card/uncached"] = lambda: app.CARD_TEMPLATE.render(it=card)
+    cases["render_card/cached"] = lambda: app.render_item_card(card)
+
+    def render_page(cards):
+        with app.app.test_request_context("/"):
+            return app.render_page(
+                items=items,
+                cards=cards,
+                feed_limit=app.feed_limit(brands),
+                refresh_time="12:00:00",
+                cache_ttl=app.CACHE_TTL,
+                available_brands=app.AVAILABLE_BRANDS,
+                selected_brands=brands,
+                filters={},
+                status_choices=app.STATUS_CHOICES,
+            )
+
+    cards = [app.render_item_card(it) for it in items]
+    cases[f"render_page/{len(items)}_cached_cards"] = lambda: render_page(cards)
+    cases[f"render_page/{len(items)}_fresh_cards"] = lambda: render_page(
+        [app.CARD_TEMPLATE.render(it=it) for it in items]
+    )
+    cases[f"api_json/{len(items)}"] = lambda: json.dumps(
+        [it.as_dict() for it in items], separators=(",", ":"), ensure_ascii=False
+    )
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="ne mesure que les noms contenant ce texte")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    fixtures = corpus.load_fixtures()
+    results = {}
+    for name, fn in benchmarks(fixtures).items():
+        if args.filter in name:
+            results[name] = time_call(fn, repeat=args.repeat)
+    print_results(results)
+    if not args.no_save:
+        print("→", save_results("micro", results, fixtures=sorted(fixtures)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Benchmark du normaliseur : plan résolu par lot + Items à slots vs ancienne boucle.
+
+Usage : python bench/bench_normalizer.py [--items N] [--rounds N]
+
+Vérifie d'abord que les deux implémentations produisent les mêmes champs,
+puis mesure le débit (items/s) et les allocations (tracemalloc) de chacune.
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from common import prepare
+
+prepare()
+
+import app  # noqa: E402
+from corpus import load_fixtures, make_batches  # noqa: E402
+
+
+def legacy_normalize_items(items_raw):
+    """Copie figée de l'ancienne boucle (dicts), référence du benchmark."""
+    items = []
+    for it in items_raw:
+        photo_url = ""
+        if it.get("photo"):
+            p = it["photo"]
+            if isinstance(p, dict):
+                photo_url = p.get("url") or p.get("url_thumb") or ""
+            elif isinstance(p, str):
+                photo_url = p
+        elif it.get("photos"):
+            photos = it["photos"]
+            if isinstance(photos, list) and photos:
+                first = photos[0]
+                if isinstance(first, dict):
+                    photo_url = (
+                        first.get("url_fullxfull")
+                        or first.get("url")
+                        or first.get("url_300")
+                        or first.get("url_thumb")
+                        or ""
+                    )
+        photo_url = app.normalize_photo_url(photo_url)
+
+        title = it.get("title") or it.get("brand_title") or "Annonce"
+
+        price_numeric = it.get("price_numeric") or it.get("price_amount") or None
+        currency = it.get("currency") or it.get("price_currency") or None
+        price_raw = it.get("price") or it.get("price_info") or None
+        price_amount, price_currency = app.parse_price(price_raw, price_numeric, currency)
+        if price_amount is None:
+            price = app.format_price(price_raw)
+        else:
+            price = app.format_amount(price_amount, price_currency)
+
+        size = it.get("size_title") or ""
+        url_item = f"https://{app.DOMAIN}/items/{it.get('id')}"
+
+        user_info = it.get("user") or it.get("seller") or it.get("owner") or {}
+        seller_name = (
+            (user_info.get("display_name") if isinstance(user_info, dict) else None)
+            or (user_info.get("login") if isinstance(user_info, dict) else None)
+            or (user_info.get("username") if isinstance(user_info, dict) else None)
+            or (user_info.get("nickname") if isinstance(user_info, dict) else None)
+            or (user_info.get("title") if isinstance(user_info, dict) else None)
+            or "Utilisateur"
+        )
+
+        seller_avatar = ""
+        if isinstance(user_info, dict):
+            a = user_info.get("avatar") or user_info.get("photo") or user_info.get("thumb")
+            if isinstance(a, dict):
+                seller_avatar = a.get("url") or a.get("url_thumb") or a.get("thumb") or ""
+            elif isinstance(a, str):
+                seller_avatar = a
+        seller_avatar = app.normalize_photo_url(seller_avatar)
+
+        seller_rating = None
+        if isinstance(user_info, dict):
+            for key in ("rating_average", "avg_rating", "score", "rating", "rating_value"):
+                if key in user_info and user_info.get(key) is not None:
+                    seller_rating = user_info.get(key)
+                    break
+        if seller_rating is None and isinstance(it.get("user_stats"), dict):
+            us = it.get("user_stats")
+            for key in ("rating_average", "avg_rating", "rating"):
+                if key in us and us.get(key) is not None:
+                    seller_rating = us.get(key)
+                    break
+
+        if seller_rating is None:
+            seller_rating_display = "—"
+            seller_stars = "—"
+        else:
+            try:
+                sr = float(seller_rating)
+            except Exception:
+                sr = None
+            if sr is None:
+                seller_rating_display = str(seller_rating)
+                seller_stars = "—"
+            else:
+                seller_rating_display = f"{sr:.1f}/5"
+                seller_stars = app.build_star_string(sr, max_stars=5)
+
+        items.append({
+            "id": it.get("id"),
+            "title": title,
+            "brand_id": str(it.get("brand_id") or ""),
+            "brand": it.get("brand_title") or "",
+            "price": price,
+            "price_amount": price_amount,
+            "currency": (price_currency or "").upper(),
+            "size": size,
+            "url": url_item,
+            "photo": photo_url,
+            "seller_id": user_info.get("id") if isinstance(user_info, dict) else None,
+            "seller_name": seller_name,
+            "seller_avatar": seller_avatar,
+            "seller_rating_display": seller_rating_display,
+            "seller_stars": seller_stars,
+        })
+
+    return items
+
+
+
+def as_dicts(items):
+    return [it if isinstance(it, dict) else it.as_dict() for it in items]
+
+
+def comparable(old, new):
+    """Aligne les sorties sur ce que l'ancienne boucle savait faire.
+
+    Elle ne connaissait qu'un marché: pas de champ `domain`, et pas de devise
+    par défaut quand l'API n'en donne pas (celle du marché principal depuis).
+    """
+    new = dict(new)
+    domain = new.pop("domain", app.DOMAIN)
+    if not old["currency"]:
+        old = dict(old, currency=app.domain_currency(domain))
+    return old, new
+
+
+def run(fn, batches):
+    out = []
+    for batch in batches:
+        out.extend(fn(batch))
+    return out
+
+
+def measure(name, fn, batches, rounds):
+    run(fn, batches)  # chauffe (mémoïsations, interning)
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run(fn, batches)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = run(fn, batches)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    n = sum(len(b) for b in batches)
+    print(
+        f"{name:<10} {n / best:>12,.0f} items/s  {best * 1e3:>8.2f} ms"
+        f"  retenu {retained / n:>7.0f} o/item  pic {peak / 1024:>8.0f} Kio"
+    )
+    return best, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=30_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    batches = make_batches(args.items, app.PER_PAGE)
+
+    # Les fixtures (réponses enregistrées, schémas mélangés) servent aussi au contrôle
+    pages = batches + [data.get("items", []) for data in load_fixtures().values()]
+    mismatches = 0
+    for batch in pages:
+        for old, new in zip(legacy_normalize_items(batch), as_dicts(app.normalize_items(batch))):
+            old, new = comparable(old, new)
+            if old != new:
+                mismatches += 1
+    if mismatches:
+        sys.exit(f"{mismatches} items diffèrent entre les deux implémentations")
+    print(f"sorties identiques sur {sum(map(len, pages))} items ({len(pages)} lots)")
+
+    old_time, old_mem = measure("ancienne", legacy_normalize_items, batches, args.rounds)
+    new_time, new_mem = measure("plan", app.normalize_items, batches, args.rounds)
+    print(f"gain : x{old_time / new_time:.2f} en temps, x{old_mem / new_mem:.2f} en mémoire retenue")
+
+
+if __name__ == "__main__":
+    main()
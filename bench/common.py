@@ -0,0 +1,131 @@
+"""Outils communs des benchmarks : environnement de l'app, mesures, résultats.
+
+`prepare()` doit être appelé avant `import app` : l'app lit sa configuration
+(upstream, base SQLite) à l'import et démarre aussitôt poller et moteur HTTP.
+"""
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def prepare(upstream="http://127.0.0.1:9"):
+    """Isole l'app : upstream local (aucun appel à Vinted), base et images jetables."""
+    os.environ["VINTED_UPSTREAM_BASE"] = upstream
+    os.environ.setdefault("VINTED_DB_PATH", ":memory:")
+    os.environ.setdefault(
+        "VINTED_IMAGE_CACHE", os.path.join(tempfile.gettempdir(), "vinted-bench-images")
+    )
+
+
+def unthrottle(app):
+    """Lève les limites du moteur : on mesure l'app, pas la politesse envers Vinted.
+
+    À appeler avant la première requête (les limiteurs lisent ces valeurs à leur création).
+    """
+    app.RATE_INITIAL = app.RATE_MAX = 1000.0
+    app.BUCKET_CAPACITY = 1000
+    app.BACKOFF_BASE = 0.01
+    app.BACKOFF_MAX = 0.05
+    app.BREAKER_COOLDOWN = 0.5
+
+
+def summarize(samples, unit="s") -> dict:
+    """Statistiques d'une série de durées ; `value` (médiane) sert aux comparaisons."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "unit": unit,
+        "better": "lower",
+        "value": statistics.median(ordered),
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "min": ordered[0],
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": ordered[-1],
+    }
+
+
+def time_call(fn, repeat=7, number=None, budget=0.2) -> dict:
+    """Durée par appel de `fn`, sur `repeat` séries de `number` appels.
+
+    Sans `number`, il est calibré pour qu'une série dure environ `budget` secondes.
+    """
+    fn()  # chauffe
+    if number is None:
+        number, elapsed = 1, 0.0
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget / 10 or number >= 1_000_000:
+                break
+            number *= 10
+        number = max(1, int(number * budget / max(elapsed, 1e-9)))
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    result = summarize(samples)
+    result["number"] = number
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(suite, results, **meta) -> str:
+    """Écrit bench/results/<suite>-<commit>.json (écrase la mesure du même commit)."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    commit = git_commit()
+    document = {
+        "suite": suite,
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        **meta,
+        "results": results,
+    }
+    path = os.path.join(RESULTS_DIR, f"{suite}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return path
+
+
+def print_results(results):
+    for name, r in results.items():
+        value = r["value"]
+        if r["unit"] == "s":
+            shown = f"{value * 1e6:>12.1f} µs" if value < 1e-2 else f"{value * 1e3:>12.1f} ms"
+        else:
+            shown = f"{value:>12.1f} {r['unit']}"
+        print(f"{name:<40} {shown}")
@@ -0,0 +1,94 @@
+"""Compare deux résultats de benchmark (ex. avant/après un commit).
+
+Usage :
+    python bench/compare.py bench/results/micro-abc1234.json bench/results/micro-def5678.json
+    python bench/compare.py --suite micro      # les deux derniers résultats de la suite
+
+Code de sortie 1 si une mesure régresse au-delà du seuil (--threshold, 10 % par défaut).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def latest(suite, count=2):
+    paths = glob.glob(os.path.join(RESULTS_DIR, f"{suite}-*.json"))
+    paths.sort(key=os.path.getmtime)
+    if len(paths) < count:
+        sys.exit(f"moins de {count} résultats pour la suite {suite!r} dans {RESULTS_DIR}")
+    return paths[-count:]
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold):
+    """Lignes (nom, ancien, nouveau, variation, verdict) et nombre de régressions.
+
+    La variation est positive quand la mesure s'améliore, quel que soit le sens
+    de la métrique (durée ou débit).
+    """
+    rows, regressions = [], 0
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        a, b = old["results"].get(name), new["results"].get(name)
+        if a is None or b is None:
+            rows.append((name, a and a["value"], b and b["value"], None, "absent"))
+            continue
+        if not a["value"]:
+            rows.append((name, a["value"], b["value"], None, ""))
+            continue
+        change = (b["value"] - a["value"]) / a["value"]
+        if a.get("better", "lower") == "lower":
+            change = -change
+        verdict = ""
+        if change < -threshold:
+            verdict = "RÉGRESSION"
+            regressions += 1
+        elif change > threshold:
+            verdict = "mieux"
+        rows.append((name, a["value"], b["value"], change, verdict))
+    return rows, regressions
+
+
+def fmt(value, unit):
+    if value is None:
+        return "—"
+    if unit == "s":
+        return f"{value * 1e6:.1f} µs" if value < 1e-2 else f"{value * 1e3:.1f} ms"
+    return f"{value:.1f} {unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="ancien puis nouveau résultat")
+    parser.add_argument("--suite", help="compare les deux derniers résultats de cette suite")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.suite:
+        paths = latest(args.suite)
+    elif len(args.paths) == 2:
+        paths = args.paths
+    else:
+        parser.error("donner deux fichiers de résultats ou --suite")
+    old, new = load(paths[0]), load(paths[1])
+
+    print(f"{old['suite']} : {old['commit']} ({old['date']}) → {new['commit']} ({new['date']})")
+    rows, regressions = compare(old, new, args.threshold)
+    units = {name: r["unit"] for doc in (old, new) for name, r in doc["results"].items()}
+    for name, a, b, change, verdict in rows:
+        shown = "" if change is None else f"{change * 100:+6.1f} %"
+        print(f"{name:<40} {fmt(a, units[name]):>12} {fmt(b, units[name]):>12} {shown:>9}  {verdict}")
+    if regressions:
+        print(f"{regressions} régression(s) au-delà de {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Corpus de réponses /api/v2/catalog/items pour les benchmarks.
+
+Les fixtures (bench/fixtures/*.json) ont la forme des réponses Vinted :
+{"items": [...], "pagination": {...}}. `record_fixtures.py` en enregistre de
+vraies ; `python bench/corpus.py` régénère le corpus synthétique (anonymisé,
+déterministe) fourni avec le dépôt. Toutes les fixtures du dossier sont
+chargées, enregistrées ou synthétiques.
+"""
+import glob
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Marques du catalogue (sous-ensemble de AVAILABLE_BRANDS, sans importer l'app)
+BRANDS = {
+    "441": "Stussy", "14969": "Supreme", "218132": "Our Legacy", "139960": "Palace",
+    "165016": "Noah", "56974": "Comme des Garçons", "235040": "Junya Watanabe",
+    "596562": "Nanamica", "369700": "Sacai", "257216": "Fucking Awesome",
+}
+SIZES = ("XS", "S", "M", "L", "XL", "38", "40", "42", "Taille unique")
+SELLERS = [f"vendeur{i}" for i in range(300)]
+STATUSES = ("Neuf avec étiquette", "Très bon état", "Bon état", "Satisfaisant")
+
+# Formes de réponse rencontrées : catalogue actuel, anciennes clés (photos,
+# seller, user_stats), et réponses dégradées (prix texte, owner, champs absents)
+SHAPES = ("catalog", "legacy", "mixed")
+
+# nom -> (forme, nombre d'items) ; "drift" mélange les formes dans une même page
+CORPUS = (
+    ("catalog_10", "catalog", 10),
+    ("catalog_50", "catalog", 50),
+    ("catalog_96", "catalog", 96),
+    ("legacy_50", "legacy", 50),
+    ("mixed_50", "mixed", 50),
+    ("drift_50", "drift", 50),
+    ("empty", "catalog", 0),
+)
+
+
+def raw_item(i, shape, rng=random):
+    """Item brut façon API Vinted ; `shape` fait varier le schéma comme en production.
+
+    Un vendeur a toujours le même profil (nom, avatar, note), comme sur Vinted :
+    chaque forme de réponse a ses propres IDs de vendeurs.
+    """
+    brand_id, brand = rng.choice(list(BRANDS.items()))
+    seller = rng.randrange(len(SELLERS))
+    seller_id = SHAPES.index(shape) * 1_000_000 + seller
+    item_id = 5_000_000_000 + i
+    it = {
+        "id": item_id,
+        "title": f"Article {i}",
+        "brand_id": int(brand_id),
+        "brand_title": brand,
+        "size_title": rng.choice(SIZES),
+        "status": rng.choice(STATUSES),
+        "favourite_count": rng.randrange(40),
+        "is_visible": True,
+        "promoted": False,
+        "path": f"/items/{item_id}-article-{i}",
+    }
+    amount = f"{rng.randint(5, 300)}.{rng.choice(('0', '5', '99'))}"
+    if shape == "catalog":
+        it["price"] = {"amount": amount, "currency_code": "EUR"}
+        it["total_item_price"] = {"amount": amount, "currency_code": "EUR"}
+        it["photo"] = {
+            "id": item_id * 10,
+            "url": f"https://images1.vinted.net/t/{item_id}/f800/{i}.jpeg",
+            "dominant_color": "#8A8C8E",
+            "is_main": True,
+            "thumbnails": [
+                {"type": t, "url": f"https://images1.vinted.net/t/{item_id}/{t}/{i}.jpeg"}
+                for t in ("thumb70x100", "thumb150x210", "thumb310x430")
+            ],
+        }
+        it["user"] = {
+            "id": seller_id,
+            "login": SELLERS[seller],
+            "business": False,
+            "profile_url": f"https://www.vinted.fr/member/{seller_id}",
+            "photo": {"url": f"https://images1.vinted.net/a/{seller}.jpeg"},
+            "rating_average": round(3 + (seller % 21) / 10, 1),
+        }
+    elif shape == "legacy":
+        it["price_numeric"] = amount
+        it["currency"] = "EUR"
+        it["photos"] = [{"url_fullxfull": f"//images1.vinted.net/t/{i}/full.jpeg"}]
+        it["seller"] = {"id": seller_id, "username": SELLERS[seller], "avatar": f"/a/{seller}.jpeg"}
+        it["user_stats"] = {"rating": (4, 4.5, 5, None)[seller % 4]}
+    else:  # mixte : prix texte, champs parfois absents
+        it["price"] = f"{amount.replace('.', ',')} €"
+        if i % 3:
+            it["photo"] = f"https://images1.vinted.net/t/{i}.jpeg"
+        it["owner"] = {"id": seller_id, "display_name": SELLERS[seller] if seller % 5 else ""}
+    return it
+
+
+def make_page(start, count, shape, rng=random):
+    """Items d'une page, du plus récent au plus ancien comme le tri newest_first."""
+    items = []
+    for i in range(start + count - 1, start - 1, -1):
+        item_shape = SHAPES[i % len(SHAPES)] if shape == "drift" else shape
+        items.append(raw_item(i, item_shape, rng))
+    return items
+
+
+def make_batches(n_items, per_page, rng=random):
+    """Lots de `per_page` items, en alternant les formes de réponse."""
+    batches = []
+    for start in range(0, n_items, per_page):
+        shape = SHAPES[(start // per_page) % len(SHAPES)]
+        batches.append(make_page(start, per_page, shape, rng))
+    return batches
+
+
+def payload(items, page=1, per_page=None):
+    """Réponse complète du catalogue, pagination comprise."""
+    per_page = per_page or max(len(items), 1)
+    return {
+        "items": items,
+        "pagination": {
+            "current_page": page,
+            "total_pages": page,
+            "total_entries": len(items),
+            "per_page": per_page,
+        },
+    }
+
+
+def load_fixtures() -> dict:
+    """nom -> réponse, pour toutes les fixtures du dossier."""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return fixtures
+
+
+def all_items(fixtures=None) -> list:
+    """Tous les items du corpus, dédoublonnés par ID, du plus récent au plus ancien."""
+    seen = {}
+    for data in (fixtures or load_fixtures()).values():
+        for it in data.get("items", []):
+            seen.setdefault(it.get("id"), it)
+    return sorted(seen.values(), key=lambda it: -int(it.get("id") or 0))
+
+
+def write_corpus(seed=17):
+    """Régénère les fixtures synthétiques (mêmes fichiers à chaque exécution)."""
+    rng = random.Random(seed)
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    offset = 0
+    for name, shape, count in CORPUS:
+        path = os.path.join(FIXTURES_DIR, f"{name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload(make_page(offset, count, shape, rng)), f, ensure_ascii=False)
+        offset += count
+        print(f"{path} ({count} items)")
+
+
+if __name__ == "__main__":
+    write_corpus()
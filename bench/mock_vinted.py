@@ -0,0 +1,176 @@
+"""Faux serveur Vinted : catalogue servi depuis le corpus, pannes injectables.
+
+Sert aux benchmarks de bout en bout et au développement hors ligne :
+
+    python bench/mock_vinted.py --port 8999 --latency 0.2 --forbidden-rate 0.05
+    VINTED_UPSTREAM_BASE=http://127.0.0.1:8999 python app.py
+
+Routes : / (pose le cookie de session), /api/v2/catalog/items (filtre
+brand_ids, pagination page/per_page, tri newest_first) et /api/v2/users/<id>.
+Pannes : latence (+ gigue), 403 avec Retry-After, JSON invalide (page HTML,
+comme un captcha), tirées au hasard par requête.
+"""
+import argparse
+import http.server
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+import corpus
+
+
+class MockConfig:
+    """Réglages modifiables à chaud (les benchmarks changent de scénario en cours de route)."""
+
+    def __init__(self, latency=0.0, jitter=0.0, forbidden_rate=0.0, bad_json_rate=0.0,
+                 retry_after=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.forbidden_rate = forbidden_rate
+        self.bad_json_rate = bad_json_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.statuses = Counter()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def scenario(self, latency=0.0, jitter=0.0, forbidden_rate=0.0, bad_json_rate=0.0,
+                 retry_after=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.forbidden_rate = forbidden_rate
+        self.bad_json_rate = bad_json_rate
+        self.retry_after = retry_after
+
+    def draw(self):
+        """Panne à injecter pour une requête : (délai, "403" | "bad_json" | None)."""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if roll < self.forbidden_rate:
+            return delay, "403"
+        if roll < self.forbidden_rate + self.bad_json_rate:
+            return delay, "bad_json"
+        return delay, None
+
+    def count(self, status):
+        with self.lock:
+            self.statuses[status] += 1
+
+
+class MockVinted(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, items, config):
+        super().__init__(address, Handler)
+        # marque -> items du plus récent au plus ancien
+        self.by_brand = {}
+        for it in items:
+            self.by_brand.setdefault(str(it.get("brand_id")), []).append(it)
+        self.config = config
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def catalog(self, brand_ids, page, per_page):
+        items = []
+        for brand_id in brand_ids:
+            items.extend(self.by_brand.get(brand_id, ()))
+        items.sort(key=lambda it: -int(it["id"]))
+        start = (page - 1) * per_page
+        return corpus.payload(items[start:start + per_page], page=page, per_page=per_page)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        config = self.server.config
+        delay, fault = config.draw()
+        if delay:
+            time.sleep(delay)
+        url = urlsplit(self.path)
+
+        if url.path == "/":
+            self.send_body(200, b"<html><body>Vinted</body></html>", "text/html",
+                           {"Set-Cookie": "anon_id=bench; Path=/; Max-Age=3600"})
+            return
+        if fault == "403":
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after else {}
+            self.send_body(403, b"<html>Forbidden</html>", "text/html", headers)
+            return
+        if fault == "bad_json":
+            self.send_body(200, b"<html><title>Just a moment...</title></html>", "text/html")
+            return
+
+        if url.path == "/api/v2/catalog/items":
+            query = parse_qs(url.query)
+            brand_ids = [b for b in query.get("brand_ids", [""])[0].split(",") if b]
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["50"])[0])
+            data = self.server.catalog(brand_ids, page, per_page)
+        elif url.path.startswith("/api/v2/users/"):
+            user_id = url.path.rsplit("/", 1)[1]
+            data = {"user": {"id": int(user_id), "login": f"vendeur{user_id}",
+                             "feedback_reputation": 0.9, "feedback_count": 12}}
+        else:
+            self.send_body(404, b"{}", "application/json")
+            return
+        self.send_body(200, json.dumps(data).encode(), "application/json")
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.server.config.count(status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(host="127.0.0.1", port=0, items=None, **options) -> MockVinted:
+    """Démarre le serveur dans un thread ; `server.base_url` est l'upstream à utiliser."""
+    server = MockVinted((host, port), items or corpus.all_items(), MockConfig(**options))
+    threading.Thread(target=server.serve_forever, name="mock-vinted", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", type=float, default=0.0, help="délai fixe (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="délai aléatoire en plus (s)")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="part de 403")
+    parser.add_argument("--bad-json-rate", type=float, default=0.0, help="part de JSON invalide")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After des 403")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockVinted(
+        (args.host, args.port),
+        corpus.all_items(),
+        MockConfig(args.latency, args.jitter, args.forbidden_rate, args.bad_json_rate,
+                   args.retry_after, args.seed),
+    )
+    print(f"faux Vinted sur {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(server.config.statuses))
+
+
+if __name__ == "__main__":
+    main()
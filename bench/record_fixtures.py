@@ -0,0 +1,69 @@
+"""Enregistre de vraies réponses /api/v2/catalog/items comme fixtures de benchmark.
+
+Usage : python bench/record_fixtures.py --brands 441,14969 --pages 2 [--per-page 96]
+
+Passe par le moteur de l'app (sessions chauffées, limiteur), donc au rythme
+toléré par Vinted. Les vendeurs sont anonymisés (login, avatar) sauf avec
+--keep-sellers : les fixtures sont faites pour être commitées.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from common import BENCH_DIR
+
+os.environ.setdefault("VINTED_DB_PATH", ":memory:")
+
+import app  # noqa: E402
+from corpus import FIXTURES_DIR  # noqa: E402
+
+SELLER_KEYS = ("user", "seller", "owner")
+
+
+def anonymize(item):
+    """Remplace login et avatar du vendeur par des valeurs stables mais anonymes."""
+    for key in SELLER_KEYS:
+        user = item.get(key)
+        if not isinstance(user, dict):
+            continue
+        alias = "vendeur" + hashlib.sha1(str(user.get("id")).encode()).hexdigest()[:8]
+        for name_key in ("login", "display_name", "username", "nickname"):
+            if user.get(name_key):
+                user[name_key] = alias
+        for photo_key in ("photo", "avatar"):
+            if user.get(photo_key):
+                user[photo_key] = {"url": f"https://images1.vinted.net/a/{alias}.jpeg"}
+        user.pop("profile_url", None)
+    return item
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--brands", required=True, help="IDs de marques, séparés par des virgules")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--per-page", type=int, default=app.PER_PAGE)
+    parser.add_argument("--name", default="recorded", help="préfixe des fichiers écrits")
+    parser.add_argument("--keep-sellers", action="store_true")
+    args = parser.parse_args()
+
+    app.PER_PAGE = args.per_page
+    brands = [b for b in args.brands.split(",") if b]
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for page in range(1, args.pages + 1):
+        url = app.build_url(brands, page=page)
+        data = app.FETCH_ENGINE.run(app.fetch_json(app.FETCH_ENGINE, url))
+        if not isinstance(data, dict) or not data.get("items"):
+            sys.exit(f"page {page} : pas de réponse exploitable (voir /api/limiter)")
+        if not args.keep_sellers:
+            data["items"] = [anonymize(it) for it in data["items"]]
+        path = os.path.join(FIXTURES_DIR, f"{args.name}_{'-'.join(brands)}_p{page}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        print(f"{os.path.relpath(path, BENCH_DIR)} : {len(data['items'])} items")
+    app.FETCH_ENGINE.close()
+
+
+if __name__ == "__main__":
+    main()
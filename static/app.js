@@ -0,0 +1,298 @@
+// Gestion du thème
+function toggleTheme() {
+    const html = document.documentElement;
+    const sunIcon = document.querySelector('.sun-icon');
+    const moonIcon = document.querySelector('.moon-icon');
+
+    const currentTheme = html.getAttribute('data-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+
+    html.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+
+    if (newTheme === 'dark') {
+        sunIcon.style.display = 'none';
+        moonIcon.style.display = 'block';
+    } else {
+        sunIcon.style.display = 'block';
+        moonIcon.style.display = 'none';
+    }
+}
+
+// Gestion du plein écran
+function toggleFullscreen() {
+    const expandIcon = document.querySelector('.expand-icon');
+    const compressIcon = document.querySelector('.compress-icon');
+
+    if (!document.fullscreenElement) {
+        // Entrer en plein écran
+        document.documentElement.requestFullscreen().then(() => {
+            expandIcon.style.display = 'none';
+            compressIcon.style.display = 'block';
+            // Sauvegarder l'état plein écran
+            localStorage.setItem('fullscreenMode', 'true');
+        }).catch(err => {
+            console.log('Erreur plein écran:', err);
+        });
+    } else {
+        // Quitter le plein écran
+        document.exitFullscreen().then(() => {
+            expandIcon.style.display = 'block';
+            compressIcon.style.display = 'none';
+            // Supprimer l'état plein écran
+            localStorage.removeItem('fullscreenMode');
+        }).catch(err => {
+            console.log('Erreur sortie plein écran:', err);
+        });
+    }
+}
+
+// Écouter les changements de plein écran (pour gérer les raccourcis clavier)
+document.addEventListener('fullscreenchange', function() {
+    const expandIcon = document.querySelector('.expand-icon');
+    const compressIcon = document.querySelector('.compress-icon');
+
+    if (document.fullscreenElement) {
+        expandIcon.style.display = 'none';
+        compressIcon.style.display = 'block';
+        localStorage.setItem('fullscreenMode', 'true');
+    } else {
+        expandIcon.style.display = 'block';
+        compressIcon.style.display = 'none';
+        localStorage.removeItem('fullscreenMode');
+    }
+});
+
+// Restaurer le plein écran au chargement de la page
+function initFullscreen() {
+    const fullscreenSaved = localStorage.getItem('fullscreenMode');
+    if (fullscreenSaved === 'true' && !document.fullscreenElement) {
+        // Petit délai pour éviter les problèmes de timing
+        setTimeout(() => {
+            document.documentElement.requestFullscreen().catch(err => {
+                console.log('Impossible de restaurer le plein écran:', err);
+                localStorage.removeItem('fullscreenMode');
+            });
+        }, 100);
+    }
+}
+
+// Initialisation du thème au chargement
+function initTheme() {
+    const savedTheme = localStorage.getItem('theme');
+    const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+    const theme = savedTheme || (prefersDark ? 'dark' : 'light');
+
+    const html = document.documentElement;
+    const sunIcon = document.querySelector('.sun-icon');
+    const moonIcon = document.querySelector('.moon-icon');
+
+    html.setAttribute('data-theme', theme);
+
+    if (theme === 'dark') {
+        sunIcon.style.display = 'none';
+        moonIcon.style.display = 'block';
+    } else {
+        sunIcon.style.display = 'block';
+        moonIcon.style.display = 'none';
+    }
+}
+
+// Gestion de la modal
+function openBrandModal() {
+    document.getElementById('brandModal').classList.add('show');
+    document.body.style.overflow = 'hidden';
+    // Désactiver le refresh automatique pendant que la modal est ouverte
+    disableAutoRefresh();
+}
+
+function closeBrandModal() {
+    document.getElementById('brandModal').classList.remove('show');
+    document.body.style.overflow = 'auto';
+    // Réactiver le refresh automatique
+    enableAutoRefresh();
+}
+
+// Gestion du refresh automatique (uniquement sans EventSource)
+let autoRefreshPaused = false;
+
+function disableAutoRefresh() {
+    autoRefreshPaused = true;
+}
+
+function enableAutoRefresh() {
+    autoRefreshPaused = false;
+}
+
+// Flux SSE: les nouvelles annonces sont insérées sans recharger la page
+function initItemStream() {
+    // Pas de flux sur les pages sans sélection (recherche)
+    if (!document.body.dataset.refresh) {
+        return;
+    }
+    const refreshSeconds = parseInt(document.body.dataset.refresh, 10);
+    if (!window.EventSource) {
+        startAutoRefresh(refreshSeconds);
+        return;
+    }
+
+    const params = new URLSearchParams(window.location.search);
+    const ids = Array.from(document.querySelectorAll('.item-card'))
+        .map(card => parseInt(card.dataset.itemId, 10))
+        .filter(id => !isNaN(id));
+    // Sans carte (chargement), since_id=0 rejoue un snapshot publié avant l'abonnement
+    params.set('since_id', ids.length ? Math.max(...ids) : 0);
+
+    const source = new EventSource('/stream?' + params.toString());
+    source.addEventListener('items', function(event) {
+        insertNewItems(JSON.parse(event.data).items);
+    });
+    source.addEventListener('error', function() {
+        // Flux refusé (serveur plein) ou fermé définitivement: rechargement périodique
+        if (source.readyState === EventSource.CLOSED) {
+            startAutoRefresh(refreshSeconds);
+        }
+    });
+}
+
+function startAutoRefresh(refreshSeconds) {
+    setInterval(() => {
+        if (!autoRefreshPaused) {
+            window.location.reload();
+        }
+    }, refreshSeconds * 1000);
+}
+
+function insertNewItems(items) {
+    const grid = document.querySelector('.items-grid');
+    if (!grid) {
+        // Écran de chargement: on affiche directement la page complète
+        window.location.reload();
+        return;
+    }
+
+    const empty = document.querySelector('.feed-empty');
+    if (empty && items.length) {
+        empty.remove();
+    }
+
+    // Les items arrivent du plus récent au plus ancien
+    for (let i = items.length - 1; i >= 0; i--) {
+        if (grid.querySelector(`[data-item-id="${items[i].id}"]`)) {
+            continue;
+        }
+        // Les cartes arrivent déjà marquées nouvelles par le serveur
+        grid.insertAdjacentHTML('afterbegin', items[i].html);
+        const card = grid.firstElementChild;
+        card.style.animation = 'slideInFromTop 0.8s ease forwards';
+    }
+
+    const limit = parseInt(grid.dataset.limit || '0', 10);
+    while (limit && grid.children.length > limit) {
+        grid.lastElementChild.remove();
+    }
+
+    document.getElementById('items-count').textContent = grid.children.length;
+    document.getElementById('refresh-time').textContent = new Date().toLocaleTimeString('fr-FR');
+}
+
+// Fermer la modal en cliquant à l'extérieur
+window.onclick = function(event) {
+    const modal = document.getElementById('brandModal');
+    if (event.target === modal) {
+        closeBrandModal();
+    }
+}
+
+// Fermer avec Escape
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') {
+        const modal = document.getElementById('brandModal');
+        if (modal && modal.classList.contains('show')) {
+            closeBrandModal();
+        }
+    }
+});
+
+// Gestion des filtres de marques
+function updateBrandSelection(checkbox) {
+    const label = checkbox.closest('.brand-checkbox');
+    if (checkbox.checked) {
+        label.classList.add('checked');
+    } else {
+        label.classList.remove('checked');
+    }
+}
+
+function selectAllBrands() {
+    const checkboxes = document.querySelectorAll('input[name="brands"]');
+    checkboxes.forEach(checkbox => {
+        checkbox.checked = true;
+        checkbox.closest('.brand-checkbox').classList.add('checked');
+    });
+}
+
+function clearAllBrands() {
+    const checkboxes = document.querySelectorAll('input[name="brands"]');
+    checkboxes.forEach(checkbox => {
+        checkbox.checked = false;
+        checkbox.closest('.brand-checkbox').classList.remove('checked');
+    });
+}
+
+// Les champs de filtre vides ne sont pas envoyés (URL et clé de sélection plus courtes)
+function initFilterForm() {
+    const form = document.getElementById('brand-filter-form');
+    if (!form) {
+        return;
+    }
+    form.addEventListener('submit', function() {
+        form.querySelectorAll('input[type="text"], input[type="number"]').forEach(input => {
+            input.disabled = !input.value.trim();
+        });
+    });
+}
+
+// Animation des cartes: le serveur a déjà marqué les nouvelles (classe new-item)
+function animateCards() {
+    const grid = document.querySelector('.items-grid');
+    if (!grid) {
+        return;
+    }
+    const cards = Array.from(grid.querySelectorAll('.item-card'));
+
+    if (grid.dataset.firstVisit) {
+        // Animation d'apparition normale à la première visite
+        cards.forEach((card, index) => {
+            card.style.animationDelay = `${index * 0.1}s`;
+            card.style.animation = 'fadeInUp 0.6s ease forwards';
+        });
+    } else if (grid.querySelector('.new-item')) {
+        cards.forEach(card => {
+            if (card.classList.contains('new-item')) {
+                // Nouveau item - animation depuis le haut
+                card.style.animation = 'slideInFromTop 0.8s ease forwards';
+            } else {
+                // Item existant - animation de glissement vers le bas
+                card.classList.add('existing-item');
+                card.style.animation = 'slideDown 0.8s ease forwards';
+            }
+        });
+    }
+}
+
+// Amélioration de l'expérience utilisateur
+document.addEventListener('DOMContentLoaded', function() {
+    // Initialiser le thème
+    initTheme();
+
+    // Initialiser le plein écran
+    initFullscreen();
+
+    // Recevoir les nouvelles annonces en direct
+    initItemStream();
+
+    initFilterForm();
+
+    animateCards();
+});